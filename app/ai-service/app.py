@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 import time
 import json
 import os
@@ -6,7 +7,11 @@ from core.ollama_client import _ping_ollama as _ping, _model_present, ensure_oll
 from routes.ask import router as ask_router
 from routes.evaluate import router as evaluate_router
 from routes.indexing import router as indexing_router
+from routes.products import router as products_router
 from rag.vectorstore_manager import VectorStoreManager
+from core.cache import cache_stats
+from rag.embeddings import query_embedding_stats
+from rag.model_registry import EMBEDDING_MODELS, EmbeddingProviderMismatchError
 
 app = FastAPI(title="GreenScore AI Service")
 
@@ -23,7 +28,12 @@ def log_event(event: str, **fields):
 def preload_vectordb():
     if os.getenv("PRELOAD_VECTORSTORE", "true").lower() == "true":
         log_event("vectordb_preload_start")
-        VectorStoreManager().get_vectordb()
+        try:
+            VectorStoreManager().get_vectordb()
+        except EmbeddingProviderMismatchError as e:
+            # Le service démarre quand même: /api/reindex reste disponible, les recherches répondent 503
+            log_event("vectordb_preload_failed", error=str(e))
+            return
         log_event("vectordb_preload_done")
     else:
         log_event("vectordb_preload_skipped")
@@ -38,10 +48,16 @@ async def timing_middleware(request: Request, call_next):
     log_event("http_request", path=request.url.path, method=request.method, status=response.status_code, ms=round(dur_ms,2))
     return response
 
+@app.exception_handler(EmbeddingProviderMismatchError)
+async def provider_mismatch_handler(request: Request, exc: EmbeddingProviderMismatchError):
+    # Index persistant incompatible avec le provider d'embeddings du runtime: l'opérateur doit relancer un reindex
+    return JSONResponse(status_code=503, content={"detail": f"{exc}. Lancer POST /api/reindex."})
+
 # Routes
 app.include_router(ask_router, prefix="/api")
 app.include_router(evaluate_router, prefix="/api")
 app.include_router(indexing_router, prefix="/api")
+app.include_router(products_router, prefix="/api")
 
 @app.get("/")
 def root():
@@ -53,7 +69,8 @@ _started_at = time.time()
 def health():
     warmed = ensure_ollama_warm()
     # Soft check vectordb: ne force pas chargement complet si désactivé
-    vs_loaded = VectorStoreManager()._initialized  # type: ignore
+    vsm = VectorStoreManager()
+    vs_loaded = vsm._initialized  # type: ignore
     return {
         "status": "ok",
         "uptime_seconds": round(time.time() - _started_at, 2),
@@ -63,8 +80,14 @@ def health():
             "warmed": warmed,
         },
         "vector_index_loaded": vs_loaded,
+        "index_version": vsm.get_version(),
     }
 
 @app.get('/api/metrics')
 def metrics():
-    return METRICS
+    # Compteurs cache publiés par l'LRU (hits/miss/évictions/expirations)
+    stats = cache_stats()
+    METRICS["cache_hits"] = stats["hits"]
+    METRICS["cache_miss"] = stats["misses"]
+    return {**METRICS, "cache": stats, "query_embeddings": query_embedding_stats(),
+            "embedding_models": EMBEDDING_MODELS.stats()}
@@ -1,63 +1,567 @@
+import os
+import sys
+import json
 import time
+import pickle
+import sqlite3
 import hashlib
 import threading
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .config import settings
+
+
+def _parse_namespace_limits(raw: str) -> Dict[str, int]:
+    """Parse "ask=33554432,evaluate=8388608" into {"ask": 33554432, ...}."""
+    limits: Dict[str, int] = {}
+    for part in (raw or "").split(','):
+        if '=' not in part:
+            continue
+        ns, val = part.split('=', 1)
+        try:
+            limits[ns.strip()] = int(val.strip())
+        except ValueError:
+            continue
+    return limits
+
+
+def estimate_size(value: Any, _seen: Optional[set] = None) -> int:
+    """Approximate deep size in bytes (dict/list/str/Document-like objects).
+
+    Not exact, but proportional: a `/ask` result with its `source_documents`
+    weighs much more than a short string, which is what the budget needs.
+    """
+    if _seen is None:
+        _seen = set()
+    oid = id(value)
+    if oid in _seen:
+        return 0
+    _seen.add(oid)
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k, _seen) + estimate_size(v, _seen)
+        return size
+    if isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _seen)
+        return size
+    # LangChain Documents & co: page_content + metadata
+    attrs = getattr(value, '__dict__', None)
+    if isinstance(attrs, dict):
+        size += estimate_size(attrs, _seen)
+    return size
+
 
 class LRUCacheEntry:
-    __slots__ = ("value", "ts")
-    def __init__(self, value: Any):
+    __slots__ = ("key", "namespace", "value", "ts", "size")
+
+    def __init__(self, key: str, namespace: str, value: Any, size: int):
+        self.key = key
+        self.namespace = namespace
         self.value = value
         self.ts = time.time()
+        self.size = size
+
 
 class LRUCache:
-    def __init__(self, max_size: int = 128, ttl_seconds: int = 300):
+    """Thread-safe LRU cache with a byte budget, per-namespace limits and TTL.
+
+    - O(1) get/set/evict: recency is kept in an OrderedDict (global) plus one
+      OrderedDict per namespace, both updated with move_to_end/popitem.
+    - Namespace = key prefix before ':' (e.g. 'ask:<hash>').
+    - TTL is idle-based (a hit refreshes the entry), so the least recently used
+      entries are also the oldest: expired entries sit at the head of the
+      global order and are swept lazily on each set / get.
+    """
+
+    def __init__(self, max_size: int = 128, ttl_seconds: int = 300, max_bytes: int = 0,
+                 namespace_limits: Optional[Dict[str, int]] = None):
         self.max_size = max_size
         self.ttl = ttl_seconds
-        self._data: Dict[str, LRUCacheEntry] = {}
+        self.max_bytes = max_bytes  # 0 = pas de limite mémoire
+        self.namespace_limits: Dict[str, int] = dict(namespace_limits or {})
+        self._data: "OrderedDict[str, LRUCacheEntry]" = OrderedDict()
+        self._ns_order: Dict[str, "OrderedDict[str, None]"] = {}
+        self._ns_bytes: Dict[str, int] = {}
+        self._bytes = 0
         self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
 
-    def _evict_if_needed(self):
-        if len(self._data) <= self.max_size:
-            return
-        # Evict oldest
-        oldest_key = min(self._data.items(), key=lambda kv: kv[1].ts)[0]
-        self._data.pop(oldest_key, None)
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(':', 1)[0] if ':' in key else ''
 
-    def _expired(self, entry: LRUCacheEntry) -> bool:
-        return (time.time() - entry.ts) > self.ttl
+    def _expired(self, entry: LRUCacheEntry, now: Optional[float] = None) -> bool:
+        return ((now or time.time()) - entry.ts) > self.ttl
+
+    def _remove(self, entry: LRUCacheEntry):
+        self._data.pop(entry.key, None)
+        order = self._ns_order.get(entry.namespace)
+        if order is not None:
+            order.pop(entry.key, None)
+            if not order:
+                self._ns_order.pop(entry.namespace, None)
+        self._ns_bytes[entry.namespace] = self._ns_bytes.get(entry.namespace, 0) - entry.size
+        if self._ns_bytes[entry.namespace] <= 0:
+            self._ns_bytes.pop(entry.namespace, None)
+        self._bytes -= entry.size
+
+    def _purge_expired(self) -> int:
+        now = time.time()
+        purged = 0
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if not self._expired(oldest, now):
+                break
+            self._remove(oldest)
+            purged += 1
+        self.expirations += purged
+        return purged
+
+    def _evict_if_needed(self, namespace: str):
+        ns_limit = self.namespace_limits.get(namespace, 0)
+        if ns_limit:
+            order = self._ns_order.get(namespace)
+            while order and self._ns_bytes.get(namespace, 0) > ns_limit and len(order) > 1:
+                oldest_key = next(iter(order))
+                self._remove(self._data[oldest_key])
+                self.evictions += 1
+        while self._data and (
+            len(self._data) > self.max_size
+            or (self.max_bytes and self._bytes > self.max_bytes and len(self._data) > 1)
+        ):
+            oldest = next(iter(self._data.values()))
+            self._remove(oldest)
+            self.evictions += 1
 
     def get(self, key: str) -> Optional[Any]:
         with self._lock:
             entry = self._data.get(key)
-            if not entry:
+            if entry is None:
+                self.misses += 1
                 return None
             if self._expired(entry):
-                self._data.pop(key, None)
+                self._remove(entry)
+                self.expirations += 1
+                self.misses += 1
                 return None
             # touch
             entry.ts = time.time()
+            self._data.move_to_end(key)
+            self._ns_order[entry.namespace].move_to_end(key)
+            self.hits += 1
             return entry.value
 
     def set(self, key: str, value: Any):
+        size = estimate_size(value)
+        namespace = self._namespace(key)
+        with self._lock:
+            previous = self._data.get(key)
+            if previous is not None:
+                self._remove(previous)
+            entry = LRUCacheEntry(key, namespace, value, size)
+            self._data[key] = entry
+            self._ns_order.setdefault(namespace, OrderedDict())[key] = None
+            self._ns_bytes[namespace] = self._ns_bytes.get(namespace, 0) + size
+            self._bytes += size
+            self._purge_expired()
+            self._evict_if_needed(namespace)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False
+            self._remove(entry)
+            return True
+
+    def clear(self, namespace: Optional[str] = None):
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+                self._ns_order.clear()
+                self._ns_bytes.clear()
+                self._bytes = 0
+                return
+            for key in list(self._ns_order.get(namespace, ())):
+                self._remove(self._data[key])
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge_expired()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_size,
+                "namespaces": {
+                    ns: {"entries": len(order), "bytes": self._ns_bytes.get(ns, 0),
+                         "limit_bytes": self.namespace_limits.get(ns, 0)}
+                    for ns, order in self._ns_order.items()
+                },
+            }
+
+
+class SemanticCache:
+    """Second cache tier: near-duplicate questions matched by embedding cosine.
+
+    Question vectors (same model as the FAISS index) are L2-normalised and kept
+    in a fixed-size float32 matrix used as a ring buffer; a lookup is a single
+    matrix-vector product over the few hundred cached questions, which is
+    cheaper than any ANN structure at this size.
+    """
+
+    def __init__(self, max_entries: int = 512, threshold: float = 0.92, ttl_seconds: int = 600):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self._matrix: Optional[np.ndarray] = None
+        self._slots: List[Optional[Tuple[str, str, Any, float]]] = [None] * max_entries
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        v = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(v))
+        if norm == 0.0:
+            return None
+        return v / norm
+
+    def lookup(self, vector, prompt_version: str) -> Optional[Tuple[Any, float, str]]:
+        """Return (value, similarity, cached_question) for the best match above threshold."""
+        v = self._normalize(vector)
+        with self._lock:
+            if v is None or self._matrix is None or self._matrix.shape[1] != v.shape[0]:
+                self.misses += 1
+                return None
+            sims = self._matrix @ v
+            now = time.time()
+            for idx in np.argsort(-sims):
+                score = float(sims[idx])
+                if score < self.threshold:
+                    break
+                slot = self._slots[idx]
+                if slot is None:
+                    continue
+                question, version, value, ts = slot
+                if version != prompt_version:
+                    continue
+                if (now - ts) > self.ttl:
+                    self._slots[idx] = None
+                    self._matrix[idx] = 0.0
+                    continue
+                self.hits += 1
+                return value, score, question
+            self.misses += 1
+            return None
+
+    def add(self, vector, prompt_version: str, question: str, value: Any):
+        v = self._normalize(vector)
+        if v is None:
+            return
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != v.shape[0]:
+                # Premier ajout (ou changement de modèle): (ré)alloue la matrice
+                self._matrix = np.zeros((self.max_entries, v.shape[0]), dtype=np.float32)
+                self._slots = [None] * self.max_entries
+                self._next = 0
+            idx = self._next
+            self._matrix[idx] = v
+            self._slots[idx] = (question, prompt_version, value, time.time())
+            self._next = (idx + 1) % self.max_entries
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self._slots = [None] * self.max_entries
+            self._next = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": sum(1 for s in self._slots if s is not None),
+                "threshold": self.threshold,
+            }
+
+
+class PersistentCache:
+    """Disk tier (SQLite, WAL mode) shared by all workers and surviving restarts.
+
+    Values are pickled: they are produced locally by the service (trusted), like
+    the FAISS docstore. One connection per thread; WAL lets concurrent uvicorn
+    workers read while another one writes.
+    """
+
+    PRUNE_EVERY = 64  # nettoyage TTL toutes les N écritures
+
+    def __init__(self, path: str, ttl_seconds: int = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            row = self._conn().execute(
+                "SELECT value, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ Persistent cache read failed: {e}")
+            return None
+        if row is None or (time.time() - row[1]) > self.ttl:
+            self.misses += 1
+            return None
+        try:
+            value = pickle.loads(row[0])
+        except Exception:
+            self.errors += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, value, created) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(blob), time.time()),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+            conn.commit()
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ Persistent cache write failed: {e}")
+
+    def clear(self):
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM answers")
+            conn.commit()
+        except Exception as e:
+            print(f"⚠️ Persistent cache clear failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            rows = self._conn().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        except Exception:
+            rows = None
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "entries": rows,
+        }
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls sharing a key: one caller computes, the others wait.
+
+    `do(key, fn)` returns (value, shared). Errors are re-raised to every waiter
+    and nothing is remembered once the call completes (no error caching): the
+    next caller with the same key starts a fresh computation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Flight] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
         with self._lock:
-            self._data[key] = LRUCacheEntry(value)
-            self._evict_if_needed()
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._calls[key] = flight
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+        try:
+            flight.value = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            flight.event.set()
+        return flight.value, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+_global_cache = LRUCache(
+    max_size=settings.CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+    max_bytes=settings.CACHE_MAX_BYTES,
+    namespace_limits=_parse_namespace_limits(settings.CACHE_NAMESPACE_LIMITS),
+)
+
+
+_semantic_cache = SemanticCache(
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+)
+
+
+_persistent_cache: Optional[PersistentCache] = (
+    PersistentCache(settings.CACHE_DB_PATH, ttl_seconds=settings.CACHE_PERSIST_TTL_SECONDS)
+    if settings.CACHE_PERSIST_ENABLED else None
+)
 
-_global_cache = LRUCache(max_size=200, ttl_seconds=600)
+
+_answer_flight = SingleFlight()
+
+
+def cache_stats() -> Dict[str, Any]:
+    stats = _global_cache.stats()
+    stats["coalesced"] = _answer_flight.coalesced
+    stats["semantic"] = _semantic_cache.stats()
+    stats["persistent"] = _persistent_cache.stats() if _persistent_cache is not None else None
+    return stats
+
+
+_index_sig_cache: Dict[str, Any] = {"mtime": None, "path": None, "signature": ""}
+
+
+def index_signature() -> str:
+    """`signature` of the loaded index (embedding_meta.json), re-read when the file changes."""
+    from rag.index_versions import active_index_dir
+    meta_path = os.path.join(active_index_dir(), 'embedding_meta.json')
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return ""
+    if _index_sig_cache["mtime"] != mtime or _index_sig_cache.get("path") != meta_path:
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as fh:
+                _index_sig_cache["signature"] = json.load(fh).get('signature', '') or ''
+        except Exception:
+            _index_sig_cache["signature"] = ""
+        _index_sig_cache["mtime"] = mtime
+        _index_sig_cache["path"] = meta_path
+    return _index_sig_cache["signature"]
 
 
 def _hash_key(prefix: str, *parts: str) -> str:
     h = hashlib.sha256()
     for p in parts:
         h.update(p.encode('utf-8'))
+        h.update(b'\x00')
     return prefix + ':' + h.hexdigest()[:24]
 
 
-def cached_answer(question: str, prompt_version: str, generator_fn):
-    key = _hash_key('ask', question.strip(), prompt_version)
+def cached_answer(question: str, prompt_version: str, generator_fn,
+                  embed_fn: Optional[Callable[[str], List[float]]] = None, store: bool = True):
+    """Return (value, hit_type) with hit_type in (None, 'exact', 'semantic', 'coalesced').
+
+    Tiers, in order: in-memory LRU, SQLite on disk (both exact), then the
+    semantic tier (optional, needs `embed_fn`). Keys include the LLM model and
+    the index signature so a model or index change never serves stale answers.
+    Concurrent misses on the same key share a single `generator_fn` call.
+    `store=False` serves existing entries but never writes the computed value (degraded answers).
+    """
+    q = question.strip()
+    version = '|'.join((prompt_version, settings.MODEL_NAME, index_signature()))
+    key = _hash_key('ask', q, version)
     cached = _global_cache.get(key)
     if cached is not None:
-        return cached, True
-    value = generator_fn()
-    _global_cache.set(key, value)
-    return value, False
+        return cached, 'exact'
+    if _persistent_cache is not None:
+        cached = _persistent_cache.get(key)
+        if cached is not None:
+            _global_cache.set(key, cached)
+            return cached, 'exact'
+    vector = None
+    if embed_fn is not None and settings.SEMANTIC_CACHE_ENABLED:
+        try:
+            vector = embed_fn(q)
+        except Exception as e:
+            print(f"⚠️ Semantic cache embedding failed: {e}")
+            vector = None
+        if vector is not None:
+            hit = _semantic_cache.lookup(vector, version)
+            if hit is not None:
+                value, score, matched = hit
+                print(f"🧠 Semantic cache hit ({score:.3f}) : '{matched[:80]}'")
+                _global_cache.set(key, value)
+                return value, 'semantic'
+
+    def _compute():
+        value = generator_fn()
+        if not store:
+            return value
+        _global_cache.set(key, value)
+        if _persistent_cache is not None:
+            _persistent_cache.set(key, value)
+        if vector is not None:
+            _semantic_cache.add(vector, version, q, value)
+        return value
+
+    value, shared = _answer_flight.do(key, _compute)
+    return value, ('coalesced' if shared else None)
@@ -24,13 +24,99 @@ class Settings:
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
     USE_OLLAMA_EMBEDDINGS: bool = os.getenv("USE_OLLAMA_EMBEDDINGS", "false").lower() == "true"
     OLLAMA_EMBEDDING_MODEL: str = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+    # Embeddings Ollama: textes par requête /api/embed, requêtes simultanées au reindex
+    OLLAMA_EMBED_BATCH_SIZE: int = int(os.getenv("OLLAMA_EMBED_BATCH_SIZE", "64"))
+    OLLAMA_EMBED_CONCURRENCY: int = int(os.getenv("OLLAMA_EMBED_CONCURRENCY", "2"))
+    OLLAMA_EMBED_TIMEOUT: float = float(os.getenv("OLLAMA_EMBED_TIMEOUT", "120"))
+    # Registre des modèles d'embeddings: déchargement après inactivité (0 = jamais)
+    EMBED_MODEL_IDLE_SECONDS: int = int(os.getenv("EMBED_MODEL_IDLE_SECONDS", "0"))
+    # Backend d'embeddings: "torch" (HuggingFaceEmbeddings) ou "onnx" (onnxruntime, int8 optionnel)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    ONNX_MODEL_DIR: str = os.getenv("ONNX_MODEL_DIR", "./data/models/onnx")
+    ONNX_QUANTIZE: bool = os.getenv("ONNX_QUANTIZE", "true").lower() == "true"
+    ONNX_THREADS: int = int(os.getenv("ONNX_THREADS", "0"))  # 0 = défaut onnxruntime
+    ONNX_PARITY_MIN_COSINE: float = float(os.getenv("ONNX_PARITY_MIN_COSINE", "0.98"))
+    # Cache des embeddings de requêtes (partagé search / ask / evaluate / rerank)
+    QUERY_EMBEDDING_CACHE_SIZE: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+    QUERY_EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
     
+    # Rerank: signaux additionnels au cosine (vecteurs relus depuis l'index)
+    RERANK_LEXICAL_WEIGHT: float = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.15"))
+    RERANK_SYNTHETIC_BOOST: float = float(os.getenv("RERANK_SYNTHETIC_BOOST", "0.25"))
+    # Poids additifs par type de source ex: "text=0.05,csv=0.02"
+    RERANK_SOURCE_WEIGHTS: str = os.getenv("RERANK_SOURCE_WEIGHTS", "")
+    # Backend rerank: "bi_encoder" (cosine + signaux) ou "cross_encoder"
+    RERANK_BACKEND: str = os.getenv("RERANK_BACKEND", "bi_encoder").lower()
+    RERANK_CE_MODEL: str = os.getenv("RERANK_CE_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_CE_MAX_LENGTH: int = int(os.getenv("RERANK_CE_MAX_LENGTH", "256"))
+    RERANK_CE_BATCH_SIZE: int = int(os.getenv("RERANK_CE_BATCH_SIZE", "16"))
+    RERANK_CE_BUDGET_MS: float = float(os.getenv("RERANK_CE_BUDGET_MS", "400"))
+
+    # Chargement des fichiers au reindex: pool de processus (0 = séquentiel), gros PDF découpés par plages de pages
+    LOAD_WORKERS: int = int(os.getenv("LOAD_WORKERS", "0"))
+    LOAD_PDF_PAGES_PER_TASK: int = int(os.getenv("LOAD_PDF_PAGES_PER_TASK", "16"))
+
+    # Pipeline d'embedding des reindex (lots d'encodage, threads torch, pool de processus)
+    EMBED_BATCH_SIZE: int = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    EMBED_TORCH_THREADS: int = int(os.getenv("EMBED_TORCH_THREADS", "0"))  # 0 = défaut torch
+    EMBED_WORKERS: int = int(os.getenv("EMBED_WORKERS", "0"))  # 0 = encodage dans le processus courant
+    EMBED_CORE_BUDGET: int = int(os.getenv("EMBED_CORE_BUDGET", "0"))  # 0 = tous les cœurs disponibles
+
+    # Type d'index FAISS (flat | hnsw | ivf | ivfpq | sq8), entraîné au reindex
+    FAISS_INDEX_TYPE: str = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+    FAISS_HNSW_M: int = int(os.getenv("FAISS_HNSW_M", "32"))
+    FAISS_HNSW_EF_CONSTRUCTION: int = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+    FAISS_HNSW_EF_SEARCH: int = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+    FAISS_IVF_NLIST: int = int(os.getenv("FAISS_IVF_NLIST", "0"))  # 0 = auto (4*sqrt(n))
+    FAISS_IVF_NPROBE: int = int(os.getenv("FAISS_IVF_NPROBE", "8"))
+    FAISS_PQ_M: int = int(os.getenv("FAISS_PQ_M", "16"))
+    FAISS_PQ_NBITS: int = int(os.getenv("FAISS_PQ_NBITS", "8"))
+
+    # Chargement mmap de index.faiss + docstore SQLite lu à la demande (LRU de Documents)
+    FAISS_MMAP: bool = os.getenv("FAISS_MMAP", "true").lower() == "true"
+    DOCSTORE_CACHE_SIZE: int = int(os.getenv("DOCSTORE_CACHE_SIZE", "2048"))
+
+    # Versions d'index conservées pour rollback (main_index/<version>/ + CURRENT)
+    INDEX_KEEP_VERSIONS: int = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+
+    # Recherche hybride BM25 + dense (fusion RRF)
+    HYBRID_SEARCH_ENABLED: bool = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_FETCH_K: int = int(os.getenv("HYBRID_FETCH_K", "20"))
+    HYBRID_RRF_K: int = int(os.getenv("HYBRID_RRF_K", "60"))
+    # Recherche fédérée sur plusieurs index nommés de FAISS_DIR ("nom=poids,..."), quotas "nom=min"
+    FEDERATED_INDEXES: str = os.getenv("FEDERATED_INDEXES", "main_index=1.0,synthetic_index=1.0")
+    FEDERATED_QUOTAS: str = os.getenv("FEDERATED_QUOTAS", "")  # /search, /ask
+    EVAL_FEDERATED_QUOTAS: str = os.getenv("EVAL_FEDERATED_QUOTAS", "synthetic_index=2")  # /evaluate: profils produits
+    FEDERATED_QUOTA_MAX_DISTANCE: float = float(os.getenv("FEDERATED_QUOTA_MAX_DISTANCE", "0"))  # 0 = sans seuil
+    # /evaluate: score minimal (somme IDF normalisée, 1.0 = un jeton propre au produit) pour injecter un profil
+    EVAL_PRODUCT_MIN_SCORE: float = float(os.getenv("EVAL_PRODUCT_MIN_SCORE", "0.8"))
+    # /evaluate: "llm" (génération + régénérations), "template" (phrases déterministes si le produit a des
+    # métriques structurées: profil synthétique / ligne Agribalyse) ou "mixed" (faits gabarit + 1 phrase LLM)
+    EVAL_GENERATION_MODE: str = os.getenv("EVAL_GENERATION_MODE", "llm")
+    # Part minimale des jetons de la description retrouvés dans un nom Agribalyse pour utiliser sa ligne
+    EVAL_TEMPLATE_MIN_COVERAGE: float = float(os.getenv("EVAL_TEMPLATE_MIN_COVERAGE", "0.8"))
+
     # Configuration LLM
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.1"))
     # Séparer fenêtre de contexte et longueur de génération
     MAX_CONTEXT_TOKENS: int = int(os.getenv("MAX_CONTEXT_TOKENS", "4096"))
     MAX_GENERATION_TOKENS: int = int(os.getenv("MAX_GENERATION_TOKENS", os.getenv("MAX_TOKENS", "220")))
     
+    # Cache réponses (LRU en mémoire, budget en octets)
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "200"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_TTL_SECONDS: int = int(os.getenv("CACHE_TTL_SECONDS", "600"))
+    # Limites par namespace (préfixe de clé) ex: "ask=33554432,evaluate=16777216"
+    CACHE_NAMESPACE_LIMITS: str = os.getenv("CACHE_NAMESPACE_LIMITS", "")
+    # Cache persistant (SQLite WAL, partagé entre workers, survit aux redémarrages)
+    CACHE_PERSIST_ENABLED: bool = os.getenv("CACHE_PERSIST_ENABLED", "true").lower() == "true"
+    CACHE_DB_PATH: str = os.getenv("CACHE_DB_PATH", os.path.join(os.getenv("DATA_DIR", "./data"), "cache", "answers.sqlite"))
+    CACHE_PERSIST_TTL_SECONDS: int = int(os.getenv("CACHE_PERSIST_TTL_SECONDS", str(7 * 24 * 3600)))
+    # Cache sémantique (questions quasi-identiques, cosine sur embeddings)
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+
     # Debug
     DEBUG_MODE: bool = os.getenv("DEBUG_MODE", "true").lower() == "true"
     # Scraper defaults
@@ -45,7 +131,7 @@ if settings.DEBUG_MODE:
     print(f"   Ollama: {settings.OLLAMA_HOST}")
     print(f"   Modèle: {settings.MODEL_NAME}")
     print(f"   Chunks: {settings.CHUNK_SIZE} chars, overlap {settings.CHUNK_OVERLAP}")
-    print(f"   Embeddings: {settings.EMBEDDING_MODEL}")
+    print(f"   Embeddings: {settings.OLLAMA_EMBEDDING_MODEL + ' (ollama)' if settings.USE_OLLAMA_EMBEDDINGS else settings.EMBEDDING_MODEL}")
     print(f"   Température: {settings.TEMPERATURE}")
     print(f"   Context tokens (LLM): {settings.MAX_CONTEXT_TOKENS}")
     print(f"   Generation tokens (LLM): {settings.MAX_GENERATION_TOKENS}")
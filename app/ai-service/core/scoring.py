@@ -0,0 +1,123 @@
+"""Vectorized scoring primitives shared by rerank, /ask and /evaluate.
+
+- `batched_cosine`: cosine of one query against N candidate vectors as a single
+  float32 matrix-vector product (replaces the per-candidate Python loop).
+- `top_k`: top-k indices with `argpartition` (O(N)) then a sort of k items.
+- `overlap_ratio`: share of distinct answer tokens present in the sources,
+  computed on sorted int64 token hashes with `searchsorted`. Each source chunk
+  is tokenised/hashed once per process (`source_token_hashes`, LRU keyed on the
+  text hash), so the full-chunk tokenisation that dominated the old set-based
+  version is not repeated for the strict regeneration pass nor across requests
+  hitting the same chunks.
+
+Token hashes use Python's `hash()`: stable within a process, which is all an
+in-request comparison needs (never persist them).
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .cache import LRUCache
+
+_NON_ALNUM = re.compile(r"[^a-z0-9\s]+")
+
+
+def fold_text(text: str) -> str:
+    """Accent folding + lowercase (NFKD -> ascii), applied once to a whole text."""
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("utf-8").lower()
+
+
+def norm_tokens(text: str, min_len: int = 3, stop: Optional[set] = None) -> List[str]:
+    """Whitespace tokens with accents folded and non-alphanumerics removed inside each token.
+
+    Equivalent to normalising every token separately, but folds the text in one pass.
+    """
+    tokens = _NON_ALNUM.sub("", fold_text(text or "")).split()
+    stop = stop or set()
+    return [t for t in tokens if len(t) >= min_len and t not in stop]
+
+
+def token_hashes(tokens: Sequence[str]) -> np.ndarray:
+    """Distinct int64 hashes of `tokens` (sorted, as returned by np.unique)."""
+    if not tokens:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.fromiter(map(hash, tokens), dtype=np.int64, count=len(tokens)))
+
+
+_chunk_hashes = LRUCache(max_size=4096, ttl_seconds=24 * 3600, max_bytes=64 * 1024 * 1024)
+
+
+def source_token_hashes(text: str, normalize: bool = False, min_len: int = 1,
+                        stop: Optional[set] = None) -> np.ndarray:
+    """Sorted distinct token hashes of a source chunk, memoized per process.
+
+    normalize=False: `text.lower().split()`; normalize=True: `norm_tokens(text, min_len, stop)`.
+    """
+    text = text or ""
+    stop_key = hash(frozenset(stop)) if stop else 0
+    key = f"tok:{hash(text)}:{len(text)}:{int(normalize)}:{min_len}:{stop_key}"
+    cached = _chunk_hashes.get(key)
+    if cached is not None:
+        return cached
+    if normalize:
+        tokens = norm_tokens(text, min_len=min_len, stop=stop)
+    else:
+        tokens = [t for t in text.lower().split() if len(t) >= min_len]
+    hashes = token_hashes(tokens)
+    _chunk_hashes.set(key, hashes)
+    return hashes
+
+
+def overlap_ratio(answer_tokens: Sequence[str], source_hashes: Iterable[np.ndarray]) -> float:
+    """Fraction of distinct answer tokens found in any source (sorted hash arrays)."""
+    answer = token_hashes(answer_tokens)
+    if answer.size == 0:
+        return 0.0
+    found = np.zeros(answer.shape[0], dtype=bool)
+    for src in source_hashes:
+        if src.size == 0:
+            continue
+        idx = np.searchsorted(src, answer)
+        idx[idx == src.shape[0]] = 0
+        found |= src[idx] == answer
+    return round(float(found.mean()), 4)
+
+
+def batched_cosine(query, matrix) -> np.ndarray:
+    """Cosine similarity of `query` (D,) against every row of `matrix` (N, D)."""
+    q = np.asarray(query, dtype=np.float32).reshape(-1)
+    m = np.asarray(matrix, dtype=np.float32)
+    if m.ndim != 2 or m.shape[0] == 0 or m.shape[1] != q.shape[0]:
+        return np.zeros(m.shape[0] if m.ndim >= 1 else 0, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=1) * np.linalg.norm(q)
+    dots = m @ q
+    out = np.zeros_like(dots)
+    np.divide(dots, norms, out=out, where=norms > 0)
+    return out
+
+
+def top_k(scores, k: int) -> np.ndarray:
+    """Indices of the k highest scores, in descending score order."""
+    s = np.asarray(scores)
+    n = s.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-s, kind="stable")
+    part = np.argpartition(-s, k - 1)[:k]
+    return part[np.argsort(-s[part], kind="stable")]
+
+
+__all__ = [
+    'fold_text',
+    'norm_tokens',
+    'token_hashes',
+    'source_token_hashes',
+    'overlap_ratio',
+    'batched_cosine',
+    'top_k',
+]
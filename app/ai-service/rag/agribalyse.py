@@ -0,0 +1,384 @@
+"""Columnar Agribalyse metrics engine (exact lookups without embedding / LLM).
+
+`load_csv` turns every Agribalyse row into a flat "col: value. ..." chunk, so a
+question about one product's "Changement climatique" value depends on vector
+recall over dozens of numeric columns. `AgribalyseEngine` loads the three CSVs
+of CSV_DIR once into typed NumPy columns (float64 for indicators, object for
+labels):
+
+- `agribalyse_synthese.csv`: one row per product (keyed by Code AGB / Code CIQUAL),
+- `agribalyse_etapes.csv`: per life-cycle stage values ("<indicator> - <stage>"),
+- `agribalyse_ingredients.csv`: per ingredient values (several rows per product).
+
+Indexes: codes -> row, accent-folded name tokens (sorted vocabulary for prefix
+lookups + character trigrams for typos), food group / subgroup -> rows.
+Aggregations are vectorized (per-subgroup medians with one lexsort). Files are
+reloaded when their mtime changes. Served by `routes/products.py`.
+"""
+from __future__ import annotations
+
+import bisect
+import csv
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.scoring import fold_text
+from .hybrid import analyze
+
+SYNTHESE_FILE = 'agribalyse_synthese.csv'
+ETAPES_FILE = 'agribalyse_etapes.csv'
+INGREDIENTS_FILE = 'agribalyse_ingredients.csv'
+
+CODE_AGB = 'Code AGB'
+CODE_CIQUAL = 'Code CIQUAL'
+NAME = 'Nom du Produit en Français'
+GROUP = "Groupe d'aliment"
+SUBGROUP = "Sous-groupe d'aliment"
+DEFAULT_INDICATOR = 'Changement climatique'
+STAGES = ('Agriculture', 'Transformation', 'Emballage', 'Transport',
+          'Supermarché et distribution', 'Consommation')
+
+# Colonnes identifiant (jamais converties en nombres)
+_TEXT_COLUMNS = {CODE_AGB, CODE_CIQUAL, 'Ciqual AGB', 'Ciqual code', 'code saison', 'code avion'}
+TRIGRAM_MIN_SIMILARITY = 0.4
+
+
+def _header(name: str) -> str:
+    # En-têtes Agribalyse: BOM, guillemets, espaces doublés ("Ciqual  AGB", "Approche emballage ")
+    return ' '.join(name.replace('\ufeff', '').strip().strip('"').split())
+
+
+def _trigrams(token: str) -> set:
+    padded = f"#{token}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _number(value) -> Optional[float]:
+    if value is None:
+        return None
+    v = float(value)
+    return None if math.isnan(v) else v
+
+
+class ColumnTable:
+    """One CSV as typed columns: float64 arrays (NaN when empty) or object arrays."""
+
+    def __init__(self, columns: Dict[str, np.ndarray], order: List[str]):
+        self.columns = columns
+        self.order = order
+        self.n = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_csv(cls, path: str) -> "ColumnTable":
+        with open(path, newline='', encoding='utf-8-sig') as fh:
+            reader = csv.reader(fh)
+            try:
+                header = [_header(h) for h in next(reader)]
+            except StopIteration:
+                return cls({}, [])
+            rows = [r for r in reader if r]
+        columns: Dict[str, np.ndarray] = {}
+        for j, name in enumerate(header):
+            raw = [r[j].strip() if j < len(r) else '' for r in rows]
+            columns[name] = cls._typed(name, raw)
+        return cls(columns, header)
+
+    @staticmethod
+    def _typed(name: str, raw: List[str]) -> np.ndarray:
+        if name not in _TEXT_COLUMNS:
+            try:
+                return np.array([float(v) if v else np.nan for v in raw], dtype=np.float64)
+            except ValueError:
+                pass
+        return np.array(raw, dtype=object)
+
+    def numeric_columns(self) -> List[str]:
+        return [c for c in self.order if self.columns[c].dtype == np.float64]
+
+    def get(self, name: str) -> Optional[np.ndarray]:
+        return self.columns.get(name)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        out = {}
+        for c in self.order:
+            v = self.columns[c][i]
+            out[c] = _number(v) if self.columns[c].dtype == np.float64 else v
+        return out
+
+
+class AgribalyseEngine:
+    """Agribalyse tables + code / name / group indexes and vectorized aggregations."""
+
+    def __init__(self, synthese: ColumnTable, etapes: Optional[ColumnTable] = None,
+                 ingredients: Optional[ColumnTable] = None):
+        self.synthese = synthese
+        self.etapes = etapes
+        self.ingredients = ingredients
+        self.by_code = self._code_index(synthese, (CODE_AGB, CODE_CIQUAL))
+        self.etapes_by_code = self._code_index(etapes, (CODE_AGB, CODE_CIQUAL)) if etapes else {}
+        self.ingredient_rows: Dict[str, List[int]] = {}
+        if ingredients is not None and ingredients.n:
+            codes = ingredients.get('Ciqual AGB')
+            if codes is None:
+                codes = ingredients.get('Ciqual code')
+            for i, code in enumerate(codes if codes is not None else []):
+                self.ingredient_rows.setdefault(str(code), []).append(i)
+        self._build_text_indexes()
+        self._medians: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_dir(cls, csv_dir: str) -> "AgribalyseEngine":
+        def _table(fname):
+            path = os.path.join(csv_dir, fname)
+            return ColumnTable.from_csv(path) if os.path.isfile(path) else None
+        synthese = _table(SYNTHESE_FILE)
+        if synthese is None:
+            raise FileNotFoundError(os.path.join(csv_dir, SYNTHESE_FILE))
+        return cls(synthese, _table(ETAPES_FILE), _table(INGREDIENTS_FILE))
+
+    @staticmethod
+    def _code_index(table: ColumnTable, keys: Tuple[str, ...]) -> Dict[str, int]:
+        index: Dict[str, int] = {}
+        for key in keys:
+            col = table.get(key)
+            if col is None:
+                continue
+            for i, code in enumerate(col):
+                if code:
+                    index.setdefault(str(code), i)
+        return index
+
+    def _build_text_indexes(self):
+        names = self.synthese.get(NAME)
+        names = names if names is not None else np.array([''] * self.synthese.n, dtype=object)
+        postings: Dict[str, List[int]] = {}
+        for i, name in enumerate(names):
+            for tok in set(analyze(name)):
+                postings.setdefault(tok, []).append(i)
+        self.name_postings = {t: np.asarray(rows, dtype=np.int64) for t, rows in postings.items()}
+        self.vocabulary = sorted(self.name_postings)
+        self.trigrams: Dict[str, set] = {}
+        for tok in self.vocabulary:
+            for g in _trigrams(tok):
+                self.trigrams.setdefault(g, set()).add(tok)
+        self.group_rows: Dict[str, np.ndarray] = {}
+        self.subgroup_rows: Dict[str, np.ndarray] = {}
+        for col, target in ((GROUP, self.group_rows), (SUBGROUP, self.subgroup_rows)):
+            values = self.synthese.get(col)
+            if values is None:
+                continue
+            folded = np.array([fold_text(str(v)).strip() for v in values], dtype=object)
+            for key in set(folded):
+                target[key] = np.flatnonzero(folded == key)
+
+    def __len__(self) -> int:
+        return self.synthese.n
+
+    # --- Recherche ---
+
+    def _token_matches(self, token: str) -> List[Tuple[str, float]]:
+        """Vocabulary tokens matching `token`: prefix (1.0) else trigram similarity."""
+        out = []
+        i = bisect.bisect_left(self.vocabulary, token)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(token):
+            out.append((self.vocabulary[i], 1.0))
+            i += 1
+        if out:
+            return out
+        grams = _trigrams(token)
+        counts: Dict[str, int] = {}
+        for g in grams:
+            for cand in self.trigrams.get(g, ()):
+                counts[cand] = counts.get(cand, 0) + 1
+        for cand, inter in counts.items():
+            sim = inter / float(len(grams) + len(_trigrams(cand)) - inter)
+            if sim >= TRIGRAM_MIN_SIMILARITY:
+                out.append((cand, sim))
+        return out
+
+    def _group_mask(self, index: Dict[str, np.ndarray], value: Optional[str]) -> Optional[np.ndarray]:
+        if not value:
+            return None
+        wanted = fold_text(value).strip()
+        mask = np.zeros(self.synthese.n, dtype=bool)
+        for key, rows in index.items():
+            if key.startswith(wanted):
+                mask[rows] = True
+        return mask
+
+    def search(self, query: str = '', group: str = None, subgroup: str = None,
+               limit: int = 10) -> List[Dict[str, Any]]:
+        """Products whose name matches `query` (prefix / trigram), optionally within a group / subgroup."""
+        n = self.synthese.n
+        scores = np.zeros(n, dtype=np.float64)
+        tokens = set(analyze(query or ''))
+        for tok in tokens:
+            best = np.zeros(n, dtype=np.float64)
+            for known, sim in self._token_matches(tok):
+                rows = self.name_postings[known]
+                best[rows] = np.maximum(best[rows], sim)
+            scores += best
+        eligible = scores > 0 if tokens else np.ones(n, dtype=bool)
+        for mask in (self._group_mask(self.group_rows, group), self._group_mask(self.subgroup_rows, subgroup)):
+            if mask is not None:
+                eligible &= mask
+        rows = np.flatnonzero(eligible)
+        if not rows.size:
+            return []
+        names = self.synthese.get(NAME)
+        name_len = np.array([len(str(names[r])) for r in rows]) if names is not None else np.zeros(rows.size)
+        # Score décroissant, puis nom le plus court (produit générique avant variantes)
+        order = np.lexsort((name_len, -scores[rows]))[:max(1, int(limit))]
+        return [{**self.summary(int(rows[i])), "score": round(float(scores[rows[i]]), 3)} for i in order]
+
+    # --- Fiches produit ---
+
+    def _cell(self, column: str, row: int):
+        col = self.synthese.get(column)
+        if col is None:
+            return None
+        return _number(col[row]) if col.dtype == np.float64 else col[row]
+
+    def summary(self, row: int) -> Dict[str, Any]:
+        return {
+            "code_agb": self._cell(CODE_AGB, row),
+            "code_ciqual": self._cell(CODE_CIQUAL, row),
+            "name": self._cell(NAME, row),
+            "group": self._cell(GROUP, row),
+            "subgroup": self._cell(SUBGROUP, row),
+            "score_ef": self._cell('Score unique EF', row),
+            "climate_change": self._cell(DEFAULT_INDICATOR, row),
+        }
+
+    def resolve_indicator(self, indicator: str = None) -> str:
+        """Numeric synthese column matching `indicator` (accent / case insensitive); ValueError otherwise."""
+        wanted = fold_text(indicator or DEFAULT_INDICATOR).strip()
+        for name in self.synthese.numeric_columns():
+            if fold_text(name) == wanted:
+                return name
+        raise ValueError(f"Unknown indicator: {indicator}")
+
+    def stage_breakdown(self, code: str, indicator: str = None) -> Optional[Dict[str, Any]]:
+        """Per life-cycle stage values of `indicator` for one product (from _etapes), with shares."""
+        indicator = self.resolve_indicator(indicator)
+        row = self.etapes_by_code.get(str(code))
+        if row is None or self.etapes is None:
+            return None
+        values = {}
+        for stage in STAGES:
+            col = self.etapes.get(f"{indicator} - {stage}")
+            if col is not None and col.dtype == np.float64:
+                values[stage] = col[row]
+        if not values:
+            return None
+        arr = np.array(list(values.values()), dtype=np.float64)
+        total = float(np.nansum(arr))
+        shares = arr / total if total else np.full(arr.shape, np.nan)
+        return {
+            "indicator": indicator,
+            "total": total,
+            "stages": [
+                {"stage": stage, "value": _number(v), "share": _number(round(s, 4))}
+                for stage, v, s in zip(values, arr, shares)
+            ],
+        }
+
+    def subgroup_medians(self, indicator: str = None) -> Dict[str, Any]:
+        """{subgroup: {median, count}} of `indicator`, computed once with a single lexsort."""
+        indicator = self.resolve_indicator(indicator)
+        cached = self._medians.get(indicator)
+        if cached is not None:
+            return cached
+        values = self.synthese.get(indicator)
+        groups = self.synthese.get(SUBGROUP)
+        result: Dict[str, Any] = {}
+        if values is not None and groups is not None:
+            valid = ~np.isnan(values)
+            labels, codes = np.unique(groups[valid].astype(str), return_inverse=True)
+            vals = values[valid]
+            order = np.lexsort((vals, codes))
+            sorted_vals, sorted_codes = vals[order], codes[order]
+            starts = np.searchsorted(sorted_codes, np.arange(len(labels)), side='left')
+            counts = np.bincount(sorted_codes, minlength=len(labels))
+            lo = sorted_vals[starts + (counts - 1) // 2]
+            hi = sorted_vals[starts + counts // 2]
+            medians = (lo + hi) / 2.0
+            result = {str(lbl): {"median": float(m), "count": int(c)}
+                      for lbl, m, c in zip(labels, medians, counts)}
+        self._medians[indicator] = result
+        return result
+
+    def product(self, code: str, indicator: str = None) -> Optional[Dict[str, Any]]:
+        """Full product card: indicators, subgroup comparison, stage breakdown and ingredients."""
+        row = self.by_code.get(str(code))
+        if row is None:
+            return None
+        indicator = self.resolve_indicator(indicator)
+        card = self.summary(row)
+        data = self.synthese.row(row)
+        card["indicators"] = {c: data[c] for c in self.synthese.numeric_columns()}
+        card["attributes"] = {c: data[c] for c in self.synthese.order
+                              if c not in card["indicators"] and c not in (CODE_AGB, CODE_CIQUAL, NAME, GROUP, SUBGROUP)}
+        value = card["indicators"].get(indicator)
+        peer = self.subgroup_medians(indicator).get(str(card["subgroup"]))
+        if peer is not None:
+            card["subgroup_comparison"] = {
+                "indicator": indicator,
+                "value": value,
+                "subgroup_median": peer["median"],
+                "subgroup_count": peer["count"],
+                "ratio_to_median": round(value / peer["median"], 3) if value is not None and peer["median"] else None,
+            }
+        card["stages"] = self.stage_breakdown(card["code_agb"] or code, indicator)
+        ingredients = []
+        if self.ingredients is not None:
+            names = self.ingredients.get('Ingredients')
+            col = self.ingredients.get(indicator)
+            for i in self.ingredient_rows.get(str(card["code_agb"]), []):
+                ingredients.append({
+                    "ingredient": names[i] if names is not None else None,
+                    "value": _number(col[i]) if col is not None and col.dtype == np.float64 else None,
+                })
+        card["ingredients"] = ingredients
+        return card
+
+
+_engine: Optional[AgribalyseEngine] = None
+_engine_sig: Optional[tuple] = None
+_lock = threading.Lock()
+
+
+def _signature(csv_dir: str) -> tuple:
+    sig = []
+    for fname in (SYNTHESE_FILE, ETAPES_FILE, INGREDIENTS_FILE):
+        path = os.path.join(csv_dir, fname)
+        sig.append(os.path.getmtime(path) if os.path.isfile(path) else None)
+    return tuple(sig)
+
+
+def get_engine(csv_dir: str = None) -> AgribalyseEngine:
+    """Process-wide engine over CSV_DIR, reloaded when the CSV files change."""
+    global _engine, _engine_sig
+    csv_dir = csv_dir or settings.CSV_DIR
+    sig = (csv_dir,) + _signature(csv_dir)
+    if _engine is not None and _engine_sig == sig:
+        return _engine
+    with _lock:
+        if _engine is None or _engine_sig != sig:
+            engine = AgribalyseEngine.from_dir(csv_dir)
+            print(f"🥕 Agribalyse chargé: {len(engine)} produits ({csv_dir})")
+            _engine, _engine_sig = engine, sig
+    return _engine
+
+
+__all__ = [
+    'AgribalyseEngine',
+    'ColumnTable',
+    'DEFAULT_INDICATOR',
+    'get_engine',
+]
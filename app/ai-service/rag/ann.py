@@ -0,0 +1,217 @@
+"""Configurable FAISS ANN index types for the vector store.
+
+LangChain's FAISS wrapper always builds an exact `IndexFlatL2` (brute-force
+scan, 4 bytes x dim per chunk). The index is still built flat (exact vectors,
+supports add/remove), then converted at save time to the type selected by
+FAISS_INDEX_TYPE:
+
+- flat:  exact search (default)
+- hnsw:  graph index, FAISS_HNSW_M / FAISS_HNSW_EF_CONSTRUCTION / FAISS_HNSW_EF_SEARCH
+- ivf:   inverted lists, FAISS_IVF_NLIST (0 = auto) / FAISS_IVF_NPROBE
+- ivfpq: IVF + product quantization, FAISS_PQ_M sub-quantizers x FAISS_PQ_NBITS
+- sq8:   8-bit scalar quantization (4x smaller, exact scan)
+
+Training (IVF centroids, PQ/SQ codebooks) happens during reindex. The type and
+parameters are recorded in `embedding_meta.json["ann"]`; LangChain's loader
+reads any FAISS index type, and `apply_search_params` re-applies the query-time
+knobs (efSearch / nprobe) after loading. When the index is not flat, the exact
+vectors are kept next to it as `flat.faiss` so incremental reindexes can delete
+and re-add chunks and so the recall report has a ground truth.
+"""
+from __future__ import annotations
+
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.config import settings
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    faiss = None  # type: ignore
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivf', 'ivfpq', 'sq8')
+FLAT_SIDECAR = 'flat.faiss'
+
+# Paramètres de recherche modifiables au chargement sans reconstruire l'index
+_RUNTIME_ENV = {'ef_search': 'FAISS_HNSW_EF_SEARCH', 'nprobe': 'FAISS_IVF_NPROBE'}
+
+
+def index_params() -> Dict[str, Any]:
+    """ANN configuration from settings (what a reindex will build)."""
+    kind = (getattr(settings, 'FAISS_INDEX_TYPE', 'flat') or 'flat').lower()
+    if kind not in INDEX_TYPES:
+        print(f"⚠️ FAISS_INDEX_TYPE inconnu '{kind}', utilisation de 'flat'")
+        kind = 'flat'
+    params: Dict[str, Any] = {'type': kind}
+    if kind == 'hnsw':
+        params.update(m=settings.FAISS_HNSW_M, ef_construction=settings.FAISS_HNSW_EF_CONSTRUCTION,
+                      ef_search=settings.FAISS_HNSW_EF_SEARCH)
+    elif kind in ('ivf', 'ivfpq'):
+        params.update(nlist=settings.FAISS_IVF_NLIST, nprobe=settings.FAISS_IVF_NPROBE)
+        if kind == 'ivfpq':
+            params.update(pq_m=settings.FAISS_PQ_M, pq_nbits=settings.FAISS_PQ_NBITS)
+    return params
+
+
+def _resolve(params: Dict[str, Any], n: int, dim: int) -> Dict[str, Any]:
+    """Clamp training-dependent parameters to the corpus size (small indexes)."""
+    p = dict(params)
+    if p['type'] in ('ivf', 'ivfpq'):
+        nlist = int(p.get('nlist') or 0) or int(4 * math.sqrt(max(n, 1)))
+        # FAISS veut >= 39 points d'entraînement par centroïde
+        p['nlist'] = max(1, min(nlist, n // 39 or 1))
+        p['nprobe'] = max(1, min(int(p.get('nprobe') or 1), p['nlist']))
+    if p['type'] == 'ivfpq':
+        pq_m = int(p.get('pq_m') or 16)
+        while pq_m > 1 and dim % pq_m:
+            pq_m -= 1
+        p['pq_m'] = pq_m
+        nbits = int(p.get('pq_nbits') or 8)
+        p['pq_nbits'] = max(1, min(nbits, int(math.log2(max(n, 2)))))
+    return p
+
+
+def _factory_string(p: Dict[str, Any]) -> str:
+    kind = p['type']
+    if kind == 'hnsw':
+        return f"HNSW{int(p.get('m') or 32)}"
+    if kind == 'ivf':
+        return f"IVF{p['nlist']},Flat"
+    if kind == 'ivfpq':
+        return f"IVF{p['nlist']},PQ{p['pq_m']}x{p['pq_nbits']}"
+    if kind == 'sq8':
+        return "SQ8"
+    return "Flat"
+
+
+def apply_search_params(index, params: Dict[str, Any], runtime_env: bool = True):
+    """Set efSearch / nprobe on a (loaded) index; env vars override recorded values."""
+    if faiss is None or index is None or not params:
+        return index
+    p = dict(params)
+    if runtime_env:
+        for key, env in _RUNTIME_ENV.items():
+            if os.getenv(env):
+                p[key] = int(os.getenv(env))
+    if p.get('type') == 'hnsw' and hasattr(index, 'hnsw') and p.get('ef_search'):
+        index.hnsw.efSearch = int(p['ef_search'])
+    if p.get('type') in ('ivf', 'ivfpq'):
+        try:
+            ivf = faiss.extract_index_ivf(index)
+            if p.get('nprobe'):
+                ivf.nprobe = int(p['nprobe'])
+            # reconstruct() (rerank sur vecteurs stockés) nécessite la direct map
+            if ivf.direct_map.type == faiss.DirectMap.NoMap:
+                ivf.make_direct_map()
+        except Exception as e:
+            print(f"⚠️ Paramètres IVF non appliqués: {e}")
+    return index
+
+
+def build_index(vectors: np.ndarray, params: Dict[str, Any]):
+    """Train (if needed) and fill an index of type `params['type']` -> (index, resolved params)."""
+    if faiss is None:
+        raise ImportError("faiss is required to build ANN indexes")
+    x = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = x.shape
+    p = _resolve(params, n, dim)
+    index = faiss.index_factory(dim, _factory_string(p), faiss.METRIC_L2)
+    if p['type'] == 'hnsw':
+        index.hnsw.efConstruction = int(p.get('ef_construction') or 40)
+    if not index.is_trained:
+        t0 = time.perf_counter()
+        index.train(x)
+        p['train_seconds'] = round(time.perf_counter() - t0, 3)
+    if n:
+        index.add(x)
+    apply_search_params(index, p, runtime_env=False)
+    return index, p
+
+
+def flat_vectors(index) -> np.ndarray:
+    """All vectors of a flat (exactly reconstructable) index."""
+    n = index.ntotal
+    if n == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, n)
+
+
+def convert_vectorstore(vectordb, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Replace `vectordb.index` (flat) by the configured ANN index; returns the recorded params.
+
+    Positions are preserved, so `index_to_docstore_id` stays valid.
+    """
+    params = params or index_params()
+    if params['type'] == 'flat':
+        return {'type': 'flat'}
+    index, resolved = build_index(flat_vectors(vectordb.index), params)
+    vectordb.index = index
+    return resolved
+
+
+def save_flat_sidecar(flat_index, index_path: str):
+    faiss.write_index(flat_index, os.path.join(index_path, FLAT_SIDECAR))
+
+
+def load_flat_sidecar(index_path: str):
+    """Exact flat index saved next to an ANN index (None if the index itself is flat)."""
+    path = os.path.join(index_path, FLAT_SIDECAR)
+    if faiss is None or not os.path.isfile(path):
+        return None
+    return faiss.read_index(path)
+
+
+def recall_report(vectors: np.ndarray, queries: np.ndarray, k: int = 5,
+                  configs: Sequence[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """recall@k and latency of each config against exact flat search."""
+    x = np.ascontiguousarray(vectors, dtype=np.float32)
+    q = np.ascontiguousarray(queries, dtype=np.float32)
+    flat = faiss.IndexFlatL2(x.shape[1])
+    flat.add(x)
+    _, truth = flat.search(q, k)
+    configs = configs or [{'type': t} for t in INDEX_TYPES]
+    rows = []
+    for cfg in configs:
+        t0 = time.perf_counter()
+        index, resolved = build_index(x, {**_defaults(cfg['type']), **cfg})
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for i in range(q.shape[0]):  # une requête à la fois, comme en production
+            index.search(q[i:i + 1], k)
+        latency_ms = (time.perf_counter() - t0) * 1000 / max(1, q.shape[0])
+        _, found = index.search(q, k)
+        hits = sum(len(set(found[i]) & set(truth[i])) for i in range(q.shape[0]))
+        rows.append({
+            'config': resolved,
+            'recall_at_k': round(hits / float(q.shape[0] * k), 4),
+            'latency_ms': round(latency_ms, 4),
+            'build_seconds': round(build_s, 3),
+            'bytes': int(faiss.serialize_index(index).nbytes),
+        })
+    return rows
+
+
+def _defaults(kind: str) -> Dict[str, Any]:
+    return {
+        'hnsw': {'m': 32, 'ef_construction': 80, 'ef_search': 64},
+        'ivf': {'nlist': 0, 'nprobe': 8},
+        'ivfpq': {'nlist': 0, 'nprobe': 8, 'pq_m': 16, 'pq_nbits': 8},
+    }.get(kind, {})
+
+
+__all__ = [
+    'INDEX_TYPES',
+    'index_params',
+    'build_index',
+    'apply_search_params',
+    'convert_vectorstore',
+    'save_flat_sidecar',
+    'load_flat_sidecar',
+    'flat_vectors',
+    'recall_report',
+]
@@ -0,0 +1,116 @@
+"""Cross-encoder reranking stage (CPU, latency-budgeted).
+
+A cross-encoder reads (question, chunk) together and gives a much sharper
+relevance score than the bi-encoder cosine, which lets `/ask` and `/evaluate`
+keep a smaller `top_n` (shorter prompt, faster phi3 prefill).
+
+- Without a budget, pairs are scored in as few batches as possible
+  (RERANK_CE_BATCH_SIZE, one batch for the usual <= 16 candidates), truncated
+  to RERANK_CE_MAX_LENGTH tokens.
+- With a per-request budget in ms, batches are sized from the measured
+  per-pair latency (a small probe batch until one is known) so that each one
+  fits in the remaining budget; the deadline is checked before every batch,
+  the first included. Candidates left over are unscored (None) and keep their
+  FAISS order behind the scored ones.
+
+The model (sentence-transformers `CrossEncoder`) is optional and lazy-loaded;
+when it is missing `CROSS_ENCODER` reports `available() == False` and callers
+fall back to the bi-encoder rerank.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from core.config import settings
+
+try:
+    from sentence_transformers import CrossEncoder  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    CrossEncoder = None  # type: ignore
+
+# Pré-troncature en caractères avant tokenisation (le modèle tronque ensuite en tokens)
+_MAX_CHARS = 2000
+# Sous budget: premier batch de mesure tant que la latence par paire est inconnue
+_PROBE_BATCH = 4
+# Sous budget: un batch ne consomme pas plus de 1/_BUDGET_SLICES du budget (points de contrôle réguliers)
+_BUDGET_SLICES = 4
+# Lissage exponentiel de la latence mesurée par paire
+_PAIR_MS_ALPHA = 0.3
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str, max_length: int = 256, batch_size: int = 16):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = max(1, batch_size)
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+        self.pair_ms: Optional[float] = None  # latence moyenne mesurée par paire (ms)
+
+    def _get_model(self):
+        if self._model is not None or self._failed:
+            return self._model
+        with self._lock:
+            if self._model is None and not self._failed:
+                if CrossEncoder is None:
+                    self._failed = True
+                    return None
+                try:
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device='cpu')
+                except Exception as e:
+                    print(f"⚠️ Cross-encoder init failed ({self.model_name}): {e}")
+                    self._failed = True
+        return self._model
+
+    def available(self) -> bool:
+        return self._get_model() is not None
+
+    def _observe(self, pair_ms: float):
+        prev = self.pair_ms
+        self.pair_ms = pair_ms if prev is None else prev + _PAIR_MS_ALPHA * (pair_ms - prev)
+
+    def score(self, question: str, texts: Sequence[str],
+              budget_ms: Optional[float] = None) -> Tuple[List[Optional[float]], bool]:
+        """Return (scores, budget_exhausted); unscored candidates get None."""
+        model = self._get_model()
+        scores: List[Optional[float]] = [None] * len(texts)
+        if model is None or not texts:
+            return scores, False
+        pairs = [(question, (t or '')[:_MAX_CHARS]) for t in texts]
+        start = time.perf_counter()
+        exhausted = False
+        lo = 0
+        while lo < len(pairs):
+            size = self.batch_size
+            if budget_ms is not None:
+                remaining_ms = budget_ms - (time.perf_counter() - start) * 1000
+                if self.pair_ms is None:
+                    size = min(size, _PROBE_BATCH)
+                else:
+                    # Batch borné par une tranche du budget et par ce qui tient encore avant l'échéance
+                    pair_ms = max(self.pair_ms, 1e-3)
+                    size = min(size, max(1, int(budget_ms / _BUDGET_SLICES / pair_ms)), int(remaining_ms / pair_ms))
+                if remaining_ms <= 0 or size < 1:
+                    exhausted = True
+                    break
+            batch = pairs[lo:lo + size]
+            t0 = time.perf_counter()
+            out = model.predict(batch, batch_size=len(batch), show_progress_bar=False)
+            self._observe((time.perf_counter() - t0) * 1000 / len(batch))
+            for i, sc in enumerate(out):
+                scores[lo + i] = float(sc)
+            lo += len(batch)
+        return scores, exhausted
+
+
+CROSS_ENCODER = CrossEncoderReranker(
+    getattr(settings, 'RERANK_CE_MODEL', ''),
+    max_length=getattr(settings, 'RERANK_CE_MAX_LENGTH', 256),
+    batch_size=getattr(settings, 'RERANK_CE_BATCH_SIZE', 16),
+)
+
+
+__all__ = ['CrossEncoderReranker', 'CROSS_ENCODER']
@@ -0,0 +1,272 @@
+"""Parallel, batched embedding pipeline for index builds.
+
+`FAISS.from_documents` / `add_documents` encode serially and nothing overlaps:
+loading + splitting, encoding and FAISS insertion run one after the other.
+`EmbeddingPipeline.build` runs them as three overlapping stages connected by
+bounded queues:
+
+1. producer thread: consumes the caller's batch generator (which loads and
+   splits lazily) -> (chunks, ids) batches;
+2. encoder: in-process on the build model (EMBED_TORCH_THREADS torch threads),
+   or a process pool of EMBED_WORKERS processes, one model per worker, each
+   pinned to its share of the EMBED_CORE_BUDGET cores; up to `workers` batches
+   are in flight, results are consumed in submission order;
+3. caller thread: inserts vectors with `add_embeddings` (no re-encoding).
+
+Encode batches are EMBED_BATCH_SIZE texts. The build reports chunks/second.
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import multiprocessing
+
+from core.config import settings
+
+try:
+    from langchain_community.vectorstores import FAISS
+except Exception:
+    from langchain.vectorstores import FAISS
+
+_DONE = object()
+
+# --- État des processus workers (un modèle par processus) ---
+_worker_model = None
+
+
+def default_embedder_factory():
+    """Build model used by pool workers (same as the in-process one)."""
+    from .vectorstore import get_embeddings
+    return get_embeddings()
+
+
+def _set_torch_threads(n: int) -> Optional[int]:
+    """Set torch intra-op threads; returns the previous count (None when unchanged / torch missing)."""
+    if n <= 0:
+        return None
+    try:
+        import torch  # type: ignore
+        previous = torch.get_num_threads()
+        torch.set_num_threads(n)
+        return previous
+    except Exception:
+        return None
+
+
+def _init_worker(factory: Callable[[], Any], threads: int, cores: Optional[List[List[int]]], counter):
+    global _worker_model
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    if cores and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, cores[slot % len(cores)])
+        except OSError:
+            pass
+    _set_torch_threads(threads)
+    _worker_model = factory()
+
+
+def _worker_encode(texts: List[str]) -> List[List[float]]:
+    return _worker_model.embed_documents(texts)
+
+
+def _core_slices(workers: int, budget: int) -> Tuple[int, Optional[List[List[int]]]]:
+    """Threads per worker and the CPU set of each worker (None when affinity is unavailable)."""
+    try:
+        available = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        available = list(range(os.cpu_count() or 1))
+    budget = min(budget or len(available), len(available))
+    per_worker = max(1, budget // max(1, workers))
+    if not hasattr(os, 'sched_setaffinity'):
+        return per_worker, None
+    slices = [available[(i * per_worker) % budget:(i * per_worker) % budget + per_worker] for i in range(workers)]
+    return per_worker, slices
+
+
+class EmbeddingPipeline:
+    def __init__(self, embeddings=None, batch_size: int = None, workers: int = None,
+                 torch_threads: int = None, core_budget: int = None,
+                 embedder_factory: Callable[[], Any] = None, queue_depth: int = 2,
+                 mp_context: str = 'spawn'):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size or getattr(settings, 'EMBED_BATCH_SIZE', 64))
+        self.workers = max(0, workers if workers is not None else getattr(settings, 'EMBED_WORKERS', 0))
+        self.torch_threads = torch_threads if torch_threads is not None else getattr(settings, 'EMBED_TORCH_THREADS', 0)
+        self.core_budget = core_budget if core_budget is not None else getattr(settings, 'EMBED_CORE_BUDGET', 0)
+        self.embedder_factory = embedder_factory or default_embedder_factory
+        self.queue_depth = max(1, queue_depth)
+        self.mp_context = mp_context
+        self.stats: Dict[str, Any] = {}
+
+    def _encode_local(self, texts: List[str]) -> List[List[float]]:
+        if getattr(self.embeddings, 'handles_batching', False):
+            # Provider distant (Ollama): découpage en requêtes et concurrence bornée gérés par le provider
+            return self.embeddings.embed_documents(texts)
+        out: List[List[float]] = []
+        for lo in range(0, len(texts), self.batch_size):
+            out.extend(self.embeddings.embed_documents(texts[lo:lo + self.batch_size]))
+        return out
+
+    def _run_stage(self, target, *args):
+        errors: List[BaseException] = []
+
+        def _wrapped():
+            try:
+                target(*args)
+            except BaseException as e:  # propagé au thread appelant
+                errors.append(e)
+                # Débloque l'étage suivant
+                args[-1].put(_DONE)
+        t = threading.Thread(target=_wrapped, daemon=True)
+        t.start()
+        return t, errors
+
+    def build(self, batches: Iterable[Tuple[Sequence[Any], Sequence[str]]], vectordb=None):
+        """Encode and insert every (chunks, ids) batch; returns the (possibly new) FAISS store."""
+        start = time.perf_counter()
+        previous_threads = None
+        if self.workers == 0:
+            if self.embeddings is None:
+                self.embeddings = self.embedder_factory()
+            # Réglage global au processus (serveur API): rétabli en fin de build
+            previous_threads = _set_torch_threads(self.torch_threads)
+        # Arrêt anticipé des étages amont si l'insertion échoue
+        stop = threading.Event()
+        split_q: "queue.Queue" = queue.Queue(maxsize=self.queue_depth)
+        encoded_q: "queue.Queue" = queue.Queue(maxsize=self.queue_depth + self.workers)
+        timings = {"encode_seconds": 0.0, "insert_seconds": 0.0}
+
+        def _produce(out_q):
+            for chunks, ids in batches:
+                if stop.is_set():
+                    break
+                if chunks:
+                    out_q.put((list(chunks), list(ids)))
+            out_q.put(_DONE)
+
+        pool = None
+        if self.workers > 0:
+            threads, cores = _core_slices(self.workers, self.core_budget)
+            ctx = multiprocessing.get_context(self.mp_context)
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=ctx, initializer=_init_worker,
+                initargs=(self.embedder_factory, self.torch_threads or threads, cores, ctx.Value('i', 0)),
+            )
+
+        def _encode(in_q, out_q):
+            while True:
+                # Attente bornée: le vidage final peut consommer le _DONE du producteur
+                try:
+                    item = in_q.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():
+                        break
+                    continue
+                if item is _DONE or stop.is_set():
+                    break
+                chunks, ids = item
+                texts = [c.page_content for c in chunks]
+                if pool is not None:
+                    # Sous-lots répartis sur les workers; l'ordre est conservé via les futures
+                    futures = [pool.submit(_worker_encode, texts[lo:lo + self.batch_size])
+                               for lo in range(0, len(texts), self.batch_size)]
+                    out_q.put((chunks, ids, futures))
+                else:
+                    t0 = time.perf_counter()
+                    vectors = self._encode_local(texts)
+                    timings["encode_seconds"] += time.perf_counter() - t0
+                    out_q.put((chunks, ids, vectors))
+            out_q.put(_DONE)
+
+        producer, produce_errors = self._run_stage(_produce, split_q)
+        encoder, encode_errors = self._run_stage(_encode, split_q, encoded_q)
+        total = 0
+        try:
+            while True:
+                item = encoded_q.get()
+                if item is _DONE:
+                    break
+                chunks, ids, vectors = item
+                if vectors and isinstance(vectors[0], Future):
+                    t0 = time.perf_counter()
+                    vectors = [v for f in vectors for v in f.result()]
+                    timings["encode_seconds"] += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                pairs = list(zip([c.page_content for c in chunks], vectors))
+                metadatas = [c.metadata for c in chunks]
+                if vectordb is None:
+                    vectordb = FAISS.from_embeddings(pairs, self.embeddings or _NoQueryEmbeddings(),
+                                                     metadatas=metadatas, ids=list(ids))
+                else:
+                    vectordb.add_embeddings(pairs, metadatas=metadatas, ids=list(ids))
+                timings["insert_seconds"] += time.perf_counter() - t0
+                total += len(chunks)
+        finally:
+            # En cas d'erreur d'insertion: arrêter les étages amont, puis vider les files pour les débloquer
+            stop.set()
+            while producer.is_alive() or encoder.is_alive():
+                for q in (split_q, encoded_q):
+                    try:
+                        q.get(timeout=0.05)
+                    except queue.Empty:
+                        pass
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            if previous_threads is not None:
+                _set_torch_threads(previous_threads)
+        for errors in (produce_errors, encode_errors):
+            if errors:
+                raise errors[0]
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "chunks": total,
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            **{k: round(v, 3) for k, v in timings.items()},
+        }
+        if total:
+            print(f"⚡ {total} chunks encodés/indexés en {elapsed:.1f}s "
+                  f"({self.stats['chunks_per_second']} chunks/s, workers={self.workers})")
+        return vectordb
+
+
+class _NoQueryEmbeddings:
+    """Placeholder embedding function when encoding ran only in pool workers.
+
+    The built store is saved then reloaded with the serving model; it never embeds queries itself.
+    """
+
+    def embed_query(self, text):
+        raise RuntimeError("index built by pool workers: reload it with an embedding model to query")
+
+    def embed_documents(self, texts):
+        raise RuntimeError("index built by pool workers: reload it with an embedding model")
+
+    def __call__(self, text):
+        return self.embed_query(text)
+
+
+def chunk_batches(chunks: Iterable[Any], ids: Iterable[str], batch_size: int):
+    """Group an iterable of chunks (and their ids) into insertion batches."""
+    pending, pending_ids = [], []
+    for chunk, cid in zip(chunks, ids):
+        pending.append(chunk)
+        pending_ids.append(cid)
+        if len(pending) >= batch_size:
+            yield pending, pending_ids
+            pending, pending_ids = [], []
+    if pending:
+        yield pending, pending_ids
+
+
+__all__ = ['EmbeddingPipeline', 'chunk_batches', 'default_embedder_factory']
@@ -0,0 +1,75 @@
+"""Process-wide query embedding cache.
+
+Every retrieval path (FAISS similarity search, retriever, rerank, evaluate
+fallback searches, semantic answer cache) ends up calling `embed_query` on the
+index embedding model. `CachedQueryEmbeddings` wraps that model and memoizes
+query vectors in a shared LRU keyed by (model name, whitespace-normalised text),
+so a given string is encoded at most once per process while it stays in cache.
+
+Document embedding (`embed_documents`, used at index build time) is passed
+through untouched.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+try:
+    from langchain_core.embeddings import Embeddings
+except Exception:  # pragma: no cover - older langchain
+    from langchain.embeddings.base import Embeddings  # type: ignore
+
+from core.cache import LRUCache, _hash_key
+from core.config import settings
+
+_query_cache = LRUCache(
+    max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    ttl_seconds=24 * 3600,
+    max_bytes=settings.QUERY_EMBEDDING_CACHE_MAX_BYTES,
+)
+
+
+def _normalize_query(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper memoizing `embed_query` in the shared query LRU."""
+
+    def __init__(self, base: Any, model_name: str = None):
+        self.base = base
+        self.model_name = model_name or getattr(base, 'model_name', None) or getattr(settings, 'EMBEDDING_MODEL', '')
+
+    def embed_query(self, text: str) -> List[float]:
+        key = _hash_key('qemb', self.model_name, _normalize_query(text))
+        vector = _query_cache.get(key)
+        if vector is None:
+            vector = self.base.embed_query(text)
+            _query_cache.set(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def __getattr__(self, name):
+        # Délègue le reste (client, model_kwargs...) au modèle sous-jacent
+        if name == 'base':
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+
+def with_query_cache(embeddings: Any) -> Any:
+    """Wrap `embeddings` (idempotent); None stays None."""
+    if embeddings is None or isinstance(embeddings, CachedQueryEmbeddings):
+        return embeddings
+    return CachedQueryEmbeddings(embeddings)
+
+
+def query_embedding_stats() -> Dict[str, Any]:
+    return _query_cache.stats()
+
+
+__all__ = [
+    'CachedQueryEmbeddings',
+    'with_query_cache',
+    'query_embedding_stats',
+]
@@ -0,0 +1,282 @@
+"""Deterministic evaluation paragraphs for products with structured metrics.
+
+`/evaluate` asks the LLM to turn retrieved chunks into a short French
+paragraph, then often regenerates it (strict / grounding passes). When the
+product is known with structured data, the facts are already there:
+
+- synthetic profiles: `synthetic_products_env_metrics.json` (carbon footprint,
+  impact breakdown, packaging, water, energy, transport, recommendations),
+- Agribalyse rows: `AgribalyseEngine.product()` (climate change, EF score,
+  subgroup median, life-cycle stages, ingredients).
+
+`structured_evaluation(description, product_match)` resolves one of them and
+renders the sentences with parameterized templates (generation mode
+"template"). In "mixed" mode the route adds one LLM sentence built from
+`narrative_prompt()`; the facts always come from the templates.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+from .agribalyse import DEFAULT_INDICATOR, SYNTHESE_FILE, get_engine
+from .hybrid import analyze
+from .metadata_filter import matches
+from .product_index import PRODUCT_METRICS_FILE
+
+GENERATION_MODES = ('llm', 'template', 'mixed')
+
+# Libellés des étapes Agribalyse dans une phrase
+_STAGE_LABELS = {
+    'Agriculture': "l'agriculture",
+    'Transformation': 'la transformation',
+    'Emballage': "l'emballage",
+    'Transport': 'le transport',
+    'Supermarché et distribution': 'la distribution',
+    'Consommation': 'la consommation',
+}
+
+
+def parse_generation_mode(mode: Optional[str]) -> str:
+    """Requested mode (None -> EVAL_GENERATION_MODE); ValueError if unknown."""
+    value = (mode or getattr(settings, 'EVAL_GENERATION_MODE', 'llm') or 'llm').strip().lower()
+    if value not in GENERATION_MODES:
+        raise ValueError(f"Unknown generation_mode '{value}' (allowed: {', '.join(GENERATION_MODES)})")
+    return value
+
+
+def fmt_number(value: Any, decimals: int = 2) -> str:
+    """French number: decimal comma, trailing zeros dropped (310 -> '310', 0.85 -> '0,85')."""
+    text = f"{float(value):.{decimals}f}".rstrip('0').rstrip('.')
+    return text.replace('.', ',') if text not in ('', '-0') else '0'
+
+
+def _percent(share: float) -> str:
+    return fmt_number(share * 100.0, 1)
+
+
+def _enumerate(parts: List[str]) -> str:
+    if len(parts) <= 1:
+        return ''.join(parts)
+    return ', '.join(parts[:-1]) + ' et ' + parts[-1]
+
+
+# --- Profils synthétiques ---
+
+_metrics: Dict[str, dict] = {}
+_metrics_sig: Optional[tuple] = None
+_lock = threading.Lock()
+
+
+def product_metrics(json_dir: str = None) -> Dict[str, dict]:
+    """product_id -> metrics of synthetic_products_env_metrics.json, reloaded when the file changes."""
+    global _metrics, _metrics_sig
+    path = os.path.join(json_dir or settings.JSON_DIR, PRODUCT_METRICS_FILE)
+    sig = (path, os.path.getmtime(path) if os.path.isfile(path) else None)
+    if sig == _metrics_sig:
+        return _metrics
+    with _lock:
+        if sig != _metrics_sig:
+            data = {}
+            if sig[1] is not None:
+                try:
+                    with open(path, 'r', encoding='utf-8') as fh:
+                        data = {p['id']: p for p in json.load(fh).get('products', []) if p.get('id')}
+                except Exception as e:
+                    print(f"⚠️ Lecture {PRODUCT_METRICS_FILE} échouée: {e}")
+            _metrics, _metrics_sig = data, sig
+    return _metrics
+
+
+def render_synthetic(product: dict) -> List[str]:
+    """Sentences for a synthetic profile (fields absent from the profile are skipped)."""
+    name = product.get('name') or product.get('id')
+    unit = product.get('functional_unit')
+    category = f", de catégorie {product['category']}," if product.get('category') else ''
+    sentences = []
+    carbon = product.get('carbon_footprint_g_co2e')
+    if carbon is not None:
+        per_unit = f" par unité fonctionnelle ({unit})" if unit else ''
+        sentences.append(f"{name}{category} a une empreinte carbone de {fmt_number(carbon)} g CO2e{per_unit}.")
+    else:
+        sentences.append(f"L'empreinte carbone de {name} n'est pas disponible.")
+
+    breakdown = product.get('impact_breakdown_percent') or {}
+    top = sorted(((k, v) for k, v in breakdown.items() if v is not None), key=lambda kv: -kv[1])[:3]
+    if top:
+        parts = [f"{k.replace('_', ' ')} ({fmt_number(v)} %)" for k, v in top]
+        head = "Le principal poste d'impact est" if len(parts) == 1 else "Les principaux postes d'impact sont"
+        sentences.append(f"{head} {_enumerate(parts)}.")
+
+    resources = []
+    if product.get('water_use_l') is not None:
+        resources.append(f"{fmt_number(product['water_use_l'])} L d'eau")
+    if product.get('energy_processing_kwh_per_kg') is not None:
+        resources.append(f"{fmt_number(product['energy_processing_kwh_per_kg'])} kWh/kg d'énergie de transformation")
+    if resources:
+        sentences.append(f"Sa production mobilise {_enumerate(resources)}.")
+
+    packaging = product.get('packaging') or {}
+    if packaging.get('primary'):
+        weight = f" de {fmt_number(packaging['weight_g'])} g" if packaging.get('weight_g') is not None else ''
+        sentence = f"L'emballage ({packaging['primary']}{weight})"
+        if packaging.get('recyclability') is not None:
+            sentence += f" est recyclable à {_percent(packaging['recyclability'])} %."
+        else:
+            sentence += " n'a pas de taux de recyclabilité disponible."
+        sentences.append(sentence)
+
+    origin = product.get('sourcing_region')
+    transport = product.get('transport_mode')
+    # Champs libres: cités tels quels plutôt qu'insérés dans une phrase
+    logistics = [f"{label} : {value}" for label, value in (("origine", origin), ("transport", transport)) if value]
+    if logistics:
+        sentences.append(f"{logistics[0][0].upper()}{' ; '.join(logistics)[1:]}.")
+
+    recommendations = product.get('improvement_recommendations') or []
+    if recommendations:
+        sentences.append(f"Piste d'amélioration : {recommendations[0].rstrip('.')}.")
+    return sentences
+
+
+# --- Agribalyse ---
+
+def render_agribalyse(card: dict) -> List[str]:
+    """Sentences for an Agribalyse product card (`AgribalyseEngine.product`)."""
+    name = card.get('name') or card.get('code_agb')
+    subgroup = card.get('subgroup')
+    label = f" ({subgroup})" if subgroup else ''
+    sentences = []
+    climate = card.get('climate_change')
+    if climate is not None:
+        sentences.append(f"{name}{label} a un impact sur le changement climatique de "
+                         f"{fmt_number(climate)} kg CO2e par kg de produit selon Agribalyse.")
+    else:
+        sentences.append(f"L'impact sur le changement climatique de {name}{label} n'est pas disponible dans Agribalyse.")
+    if card.get('score_ef') is not None:
+        sentences.append(f"Son score unique EF est de {fmt_number(card['score_ef'])} mPt/kg.")
+
+    peer = card.get('subgroup_comparison') or {}
+    ratio = peer.get('ratio_to_median')
+    if ratio is not None and peer.get('subgroup_count', 0) > 1:
+        median = f"{fmt_number(peer['subgroup_median'])} kg CO2e/kg"
+        gap = abs(ratio - 1.0)
+        if gap < 0.05:
+            position = "proche de la médiane"
+        else:
+            position = f"{_percent(gap)} % {'au-dessus' if ratio > 1 else 'en dessous'} de la médiane"
+        sentences.append(f"C'est {position} des {peer['subgroup_count']} produits du sous-groupe {subgroup} ({median}).")
+
+    stages = [s for s in ((card.get('stages') or {}).get('stages') or []) if s.get('share') is not None]
+    if stages:
+        ranked = sorted(stages, key=lambda s: -s['share'])
+        top = [f"{_STAGE_LABELS.get(s['stage'], s['stage'])} ({_percent(s['share'])} %)" for s in ranked[:2]]
+        sentences.append(f"L'étape la plus contributrice est {_enumerate(top[:1])}"
+                         + (f", suivie de {top[1]}." if len(top) > 1 else "."))
+        shown = {s['stage'] for s in ranked[:2]}
+        # Emballage / transport toujours cités (comme demandé au LLM) s'ils ne sont pas déjà en tête
+        rest = [(_STAGE_LABELS[s['stage']], _percent(s['share'])) for s in stages
+                if s['stage'] in ('Emballage', 'Transport') and s['stage'] not in shown]
+        if rest:
+            label, share = rest[0]
+            sentence = f"{label[0].upper()}{label[1:]} représente {share} % de l'impact"
+            if len(rest) > 1:
+                sentence += f" et {rest[1][0]} {rest[1][1]} %"
+            sentences.append(sentence + ".")
+
+    ingredients = [i for i in card.get('ingredients') or [] if i.get('value') is not None]
+    if ingredients:
+        main = max(ingredients, key=lambda i: i['value'])
+        sentences.append(f"L'ingrédient le plus contributeur est {str(main['ingredient']).lower()} "
+                         f"({fmt_number(main['value'])} kg CO2e/kg).")
+    return sentences
+
+
+class StructuredEvaluation:
+    """Template-rendered evaluation of one product with structured data."""
+
+    def __init__(self, kind: str, product_id: str, name: str, sentences: List[str], metadata: dict,
+                 record: str):
+        self.kind = kind  # 'synthetic' | 'agribalyse'
+        self.product_id = product_id
+        self.name = name
+        self.sentences = sentences
+        self.metadata = metadata
+        self.record = record  # données sources (renvoyées comme source_documents)
+
+    def text(self, max_sentences: int = None) -> str:
+        return ' '.join(self.sentences[:max_sentences] if max_sentences else self.sentences)
+
+    def as_dict(self) -> dict:
+        return {"kind": self.kind, "product_id": self.product_id, "name": self.name,
+                "sentences": len(self.sentences)}
+
+
+def _agribalyse_match(description: str, where: dict = None) -> Optional[StructuredEvaluation]:
+    metadata = {"source": SYNTHESE_FILE, "type": "csv"}
+    if where and not matches(metadata, where):
+        return None
+    tokens = set(analyze(description))
+    if not tokens:
+        return None
+    try:
+        engine = get_engine()
+    except FileNotFoundError:
+        return None
+    hits = engine.search(description, limit=1)
+    # Couverture: part des jetons de la description retrouvés dans le nom du produit
+    if not hits or hits[0]["score"] / len(tokens) < settings.EVAL_TEMPLATE_MIN_COVERAGE:
+        return None
+    code = hits[0]["code_agb"] or hits[0]["code_ciqual"]
+    card = engine.product(code, DEFAULT_INDICATOR)
+    if card is None:
+        return None
+    record = '. '.join(f"{k}: {card[k]}" for k in ('code_agb', 'name', 'group', 'subgroup', 'climate_change', 'score_ef')
+                       if card.get(k) is not None)
+    return StructuredEvaluation('agribalyse', str(code), card.get('name'), render_agribalyse(card),
+                                {**metadata, "code_agb": code}, record)
+
+
+def structured_evaluation(description: str, product_match=None, where: dict = None) -> Optional[StructuredEvaluation]:
+    """Structured data of the described product: synthetic profile first, then Agribalyse.
+
+    `product_match` is the resolved synthetic profile (the caller checks its chunks against `where`).
+    """
+    if product_match is not None:
+        product = product_metrics().get(product_match.product_id)
+        if product:
+            metadata = {"source": PRODUCT_METRICS_FILE, "type": "json", "synthetic": True,
+                        "product_id": product_match.product_id}
+            return StructuredEvaluation('synthetic', product_match.product_id, product.get('name'),
+                                        render_synthetic(product), metadata,
+                                        json.dumps(product, ensure_ascii=False))
+    return _agribalyse_match(description, where)
+
+
+def narrative_prompt(description: str, facts: str) -> str:
+    """Prompt of the single LLM sentence of the "mixed" mode."""
+    return f"""Faits vérifiés:
+{facts}
+
+Tâche: Écris UNE seule phrase de conclusion pédagogique (≤ 30 mots) sur l'impact environnemental du produit: {description}.
+Contraintes:
+- N'ajoute aucun chiffre ni aucun fait absent des faits vérifiés
+- Ton: naturel, concis
+Sortie: une phrase, texte uniquement.
+"""
+
+
+__all__ = [
+    'GENERATION_MODES',
+    'StructuredEvaluation',
+    'fmt_number',
+    'narrative_prompt',
+    'parse_generation_mode',
+    'product_metrics',
+    'render_agribalyse',
+    'render_synthetic',
+    'structured_evaluation',
+]
@@ -0,0 +1,178 @@
+"""Federated search over several named indexes (main_index, synthetic_index...).
+
+`/evaluate` used to find synthetic product profiles with extra sequential
+searches on `main_index`, while `data/faiss/synthetic_index` (built by
+`reindex_synthetic`) was never loaded. `federated_search`:
+
+1. embeds the query once (shared query vector, memoized by the query cache),
+2. runs the hybrid dense + BM25 lookup of every index in parallel
+   (FAISS releases the GIL),
+3. merges the per-index rankings with weighted reciprocal rank:
+   score = weight(index) / (HYBRID_RRF_K + rank), deduplicating identical chunks,
+4. applies quotas: e.g. "synthetic_index=2" (EVAL_FEDERATED_QUOTAS for
+   /evaluate, FEDERATED_QUOTAS elsewhere) keeps at least 2 synthetic chunks in
+   the top k when their L2 distance is below FEDERATED_QUOTA_MAX_DISTANCE
+   (0 = no distance condition).
+
+An optional metadata filter (`where`) is pushed into every index.
+
+Indexes are listed in FEDERATED_INDEXES ("name=weight,..."); missing ones are
+skipped, and each one is versioned / rebuilt independently under FAISS_DIR/<name>.
+With a single available index the plain hybrid scores are returned unchanged.
+"""
+from __future__ import annotations
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.config import settings
+from .hybrid import BM25Index, hybrid_ranked
+
+# (nom, poids, vectordb, index BM25)
+IndexSpec = Tuple[str, float, Any, Optional[BM25Index]]
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='federated')
+    return _executor
+
+
+def parse_spec(raw: str) -> Dict[str, float]:
+    """"main_index=1.0,synthetic_index=1.2" -> {name: value} (a bare name gets 1.0)."""
+    out: Dict[str, float] = {}
+    for part in (raw or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, value = part.partition('=')
+        try:
+            out[name.strip()] = float(value) if value else 1.0
+        except ValueError:
+            continue
+    return out
+
+
+def configured_indexes(manager=None) -> List[IndexSpec]:
+    """Loaded indexes of FEDERATED_INDEXES, in configuration order."""
+    if manager is None:
+        from .vectorstore_manager import VectorStoreManager
+        manager = VectorStoreManager()
+    out = []
+    for name, weight in parse_spec(getattr(settings, 'FEDERATED_INDEXES', 'main_index')).items():
+        vectordb, sparse = manager.get_index(name)
+        if vectordb is not None:
+            out.append((name, weight, vectordb, sparse))
+    return out
+
+
+def _embed_query(vectordb, query: str):
+    fn = vectordb.embedding_function
+    return fn.embed_query(query) if hasattr(fn, 'embed_query') else fn(query)
+
+
+def _content_key(doc) -> str:
+    return hashlib.sha1((doc.page_content or '').encode('utf-8')).hexdigest()
+
+
+def _eligible(distance: Optional[float], max_distance: float) -> bool:
+    return max_distance <= 0 or (distance is not None and distance < max_distance)
+
+
+def _apply_quotas(selected: List[tuple], pool: List[tuple], quotas: Dict[str, float],
+                  max_distance: float) -> int:
+    """Swap low-ranked picks for quota candidates; returns how many were added."""
+    added = 0
+    for name, minimum in quotas.items():
+        minimum = int(minimum)
+        missing = minimum - sum(1 for c in selected if c[1] == name)
+        if missing <= 0:
+            continue
+        taken = {id(c) for c in selected}
+        extra = [c for c in pool if c[1] == name and id(c) not in taken and _eligible(c[3], max_distance)]
+        for cand in extra[:missing]:
+            # Remplace le moins bien classé qui n'est pas requis par un quota
+            victim = None
+            for i in range(len(selected) - 1, -1, -1):
+                owner = selected[i][1]
+                if owner in quotas and sum(1 for c in selected if c[1] == owner) <= int(quotas[owner]):
+                    continue
+                victim = i
+                break
+            if victim is None:
+                break
+            selected[victim] = cand
+            added += 1
+    selected.sort(key=lambda c: -c[0])
+    return added
+
+
+def federated_search(query: str, k: int, indexes: Sequence[IndexSpec] = None,
+                     quotas: Dict[str, float] = None, max_distance: float = None,
+                     stats: Optional[Dict[str, Any]] = None,
+                     where: Optional[Dict[str, List[str]]] = None) -> List[Tuple[Any, float]]:
+    """Fan-out search over `indexes` (default: FEDERATED_INDEXES) -> [(Document, score)].
+
+    `where`: metadata filter applied inside every index (see `rag/metadata_filter.py`).
+    """
+    indexes = list(configured_indexes() if indexes is None else indexes)
+    quotas = parse_spec(getattr(settings, 'FEDERATED_QUOTAS', '')) if quotas is None else quotas
+    max_distance = (getattr(settings, 'FEDERATED_QUOTA_MAX_DISTANCE', 0.0)
+                    if max_distance is None else max_distance)
+    if not indexes:
+        return []
+    if len(indexes) == 1:
+        name, _w, vectordb, sparse = indexes[0]
+        ranked = hybrid_ranked(query, k, vectordb, sparse, where=where)
+        if stats is not None:
+            stats.update({'indexes': {name: len(ranked)}, 'quota_added': 0})
+        return [(doc, score) for doc, score, _d in ranked]
+
+    # Un seul embedding de requête partagé par tous les index
+    embedding = _embed_query(indexes[0][2], query)
+    futures = [
+        _pool().submit(hybrid_ranked, query, k + int(quotas.get(name, 0)), vectordb, sparse, embedding, where)
+        for name, _w, vectordb, sparse in indexes
+    ]
+    rrf_k = getattr(settings, 'HYBRID_RRF_K', 60)
+    candidates = []
+    for (name, weight, _v, _s), fut in zip(indexes, futures):
+        try:
+            ranked = fut.result()
+        except Exception as e:
+            print(f"⚠️ Recherche fédérée: index '{name}' en erreur: {e}")
+            continue
+        for rank, (doc, _score, distance) in enumerate(ranked):
+            candidates.append((weight / (rrf_k + rank + 1), name, doc, distance))
+    candidates.sort(key=lambda c: -c[0])
+
+    quotas = {n: q for n, q in quotas.items() if q > 0}
+    unique, seen = [], {}
+    for cand in candidates:
+        key = _content_key(cand[2])
+        if key not in seen:
+            seen[key] = len(unique)
+            unique.append(cand)
+        elif cand[1] in quotas and unique[seen[key]][1] not in quotas:
+            # Chunk présent dans plusieurs index: attribué à l'index sous quota (meilleur score conservé)
+            kept = unique[seen[key]]
+            unique[seen[key]] = (kept[0], cand[1], cand[2], cand[3] if kept[3] is None else kept[3])
+    selected = unique[:k]
+    added = _apply_quotas(selected, unique, quotas, max_distance)
+    if stats is not None:
+        per_index: Dict[str, int] = {}
+        for c in selected:
+            per_index[c[1]] = per_index.get(c[1], 0) + 1
+        stats.update({'indexes': per_index, 'quota_added': added})
+    return [(c[2], c[0]) for c in selected]
+
+
+__all__ = [
+    'federated_search',
+    'configured_indexes',
+    'parse_spec',
+]
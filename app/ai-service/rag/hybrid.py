@@ -0,0 +1,257 @@
+"""Hybrid retrieval: BM25 sparse index + FAISS dense search fused by RRF.
+
+Dense MiniLM recall is weak on exact product names ("sardines", "avoine"...),
+which `/evaluate` used to patch with substring filters and extra dense searches
+per anchor token. `BM25Index` is a small inverted index over the same chunks as
+the FAISS store (keyed by docstore id), with French accent folding, a short
+stopword list and naive plural stripping. It is built in `create_vectorstore`
+and persisted next to the FAISS index as `sparse_index.json`.
+
+`hybrid_search(query, k)` runs one dense and one sparse lookup and fuses both
+rankings with reciprocal rank fusion: score(d) = sum 1 / (RRF_K + rank).
+An optional metadata filter (`where`) restricts both lookups inside the indexes.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.scoring import fold_text, top_k
+
+SPARSE_INDEX_FILE = 'sparse_index.json'
+
+FRENCH_STOPWORDS = {
+    "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "elle", "en", "et", "eux", "il", "je",
+    "la", "le", "les", "leur", "lui", "ma", "mais", "me", "meme", "mes", "moi", "mon", "ne", "nos",
+    "notre", "nous", "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "sa", "se", "ses", "son",
+    "sur", "ta", "te", "tes", "toi", "ton", "tu", "un", "une", "vos", "votre", "vous", "est", "sont",
+    "the", "of", "and", "to", "in", "for", "is", "on", "with", "by", "an", "at",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def analyze(text: str) -> List[str]:
+    """Fold accents, lowercase, drop stopwords, strip plural 's'/'x' on longer words."""
+    out = []
+    for tok in _TOKEN_RE.findall(fold_text(text or "")):
+        if len(tok) < 2 or tok in FRENCH_STOPWORDS:
+            continue
+        if len(tok) > 4 and tok[-1] in "sx":
+            tok = tok[:-1]
+        out.append(tok)
+    return out
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring over docstore ids."""
+
+    def __init__(self, doc_ids: List[str], doc_len: np.ndarray,
+                 postings: Dict[str, Tuple[np.ndarray, np.ndarray]], k1: float = 1.5, b: float = 0.75):
+        self.doc_ids = doc_ids
+        self.doc_len = doc_len.astype(np.float32)
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avgdl = float(self.doc_len.mean()) if len(doc_ids) else 0.0
+
+    @classmethod
+    def build(cls, items: Sequence[Tuple[str, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """`items`: (docstore_id, text) pairs."""
+        doc_ids: List[str] = []
+        lengths: List[int] = []
+        raw: Dict[str, Tuple[List[int], List[int]]] = {}
+        for pos, (doc_id, text) in enumerate(items):
+            tokens = analyze(text)
+            doc_ids.append(doc_id)
+            lengths.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for t in tokens:
+                counts[t] = counts.get(t, 0) + 1
+            for t, c in counts.items():
+                plist = raw.setdefault(t, ([], []))
+                plist[0].append(pos)
+                plist[1].append(c)
+        postings = {
+            t: (np.asarray(p, dtype=np.int32), np.asarray(tf, dtype=np.float32))
+            for t, (p, tf) in raw.items()
+        }
+        return cls(doc_ids, np.asarray(lengths, dtype=np.float32), postings, k1=k1, b=b)
+
+    @classmethod
+    def from_vectorstore(cls, vectordb) -> Optional["BM25Index"]:
+        mapping = getattr(vectordb, 'index_to_docstore_id', None)
+        docstore = getattr(vectordb, 'docstore', None)
+        if mapping is None or docstore is None:
+            return None
+        items = []
+        for pos in sorted(mapping):
+            doc_id = mapping[pos]
+            doc = docstore.search(doc_id)
+            items.append((doc_id, getattr(doc, 'page_content', '') or ''))
+        return cls.build(items)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def search(self, query: str, k: int = 10, allowed: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Return [(docstore_id, bm25_score)] for the k best chunks (score > 0).
+
+        `allowed`: positions eligible (metadata filter); others are never returned.
+        """
+        n = len(self.doc_ids)
+        if n == 0 or k <= 0 or (allowed is not None and not allowed.size):
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_len / (self.avgdl or 1.0))
+        for term in set(analyze(query)):
+            plist = self.postings.get(term)
+            if plist is None:
+                continue
+            pos, tf = plist
+            df = pos.shape[0]
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            scores[pos] += idf * tf * (self.k1 + 1.0) / (tf + norm[pos])
+        if allowed is not None:
+            keep = np.zeros(n, dtype=bool)
+            keep[allowed[allowed < n]] = True
+            scores[~keep] = 0.0
+        best = [i for i in top_k(scores, k) if scores[i] > 0]
+        return [(self.doc_ids[i], float(scores[i])) for i in best]
+
+    def save(self, persist_path: str):
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_ids": self.doc_ids,
+            "doc_len": self.doc_len.astype(int).tolist(),
+            "postings": {t: [p.tolist(), tf.astype(int).tolist()] for t, (p, tf) in self.postings.items()},
+        }
+        with open(os.path.join(persist_path, SPARSE_INDEX_FILE), 'w', encoding='utf-8') as fh:
+            json.dump(data, fh, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, persist_path: str) -> Optional["BM25Index"]:
+        path = os.path.join(persist_path, SPARSE_INDEX_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as fh:
+            data = json.load(fh)
+        postings = {
+            t: (np.asarray(p, dtype=np.int32), np.asarray(tf, dtype=np.float32))
+            for t, (p, tf) in data["postings"].items()
+        }
+        return cls(data["doc_ids"], np.asarray(data["doc_len"], dtype=np.float32), postings,
+                   k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+
+
+def rrf_fuse(rankings: Sequence[Sequence[Hashable]], rrf_k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Reciprocal rank fusion of several ranked key lists (best first)."""
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def doc_key(doc) -> Hashable:
+    """Identity of a chunk across lookups: docstore id when set, else the object itself."""
+    return getattr(doc, 'id', None) or id(doc)
+
+
+def _dense(vectordb, query: str, k: int, embedding: Optional[Sequence[float]] = None):
+    if embedding is not None:
+        return vectordb.similarity_search_with_score_by_vector(list(embedding), k=k)
+    return vectordb.similarity_search_with_score(query, k=k)
+
+
+def _query_vector(vectordb, query: str):
+    fn = getattr(vectordb, 'embedding_function', None)
+    return fn.embed_query(query) if hasattr(fn, 'embed_query') else fn(query)
+
+
+def hybrid_ranked(query: str, k: int, vectordb, sparse: Optional[BM25Index] = None,
+                  embedding: Optional[Sequence[float]] = None,
+                  where: Optional[Dict[str, List[str]]] = None) -> List[Tuple[object, float, Optional[float]]]:
+    """Ranked [(Document, score, L2 distance or None)] of one index.
+
+    `embedding`: precomputed query vector (shared across indexes by federated search).
+    `where`: metadata filter (see `rag/metadata_filter.py`), applied inside FAISS and BM25.
+    Score is the RRF score, or the L2 distance itself in dense-only mode.
+    """
+    fetch_k = max(k, getattr(settings, 'HYBRID_FETCH_K', 20))
+    use_sparse = sparse is not None and getattr(settings, 'HYBRID_SEARCH_ENABLED', True)
+    allowed = None
+    if where:
+        from .metadata_filter import filtered_dense_search, metadata_index_for
+        meta_index = metadata_index_for(vectordb)
+        allowed = meta_index.positions(where) if meta_index is not None else None
+        if allowed is None:
+            raise ValueError("Metadata filter unavailable for this index")
+        if not allowed.size:
+            return []
+        if embedding is None:
+            embedding = _query_vector(vectordb, query)
+        dense = filtered_dense_search(vectordb, embedding, fetch_k if use_sparse else k, allowed, meta_index)
+        # Positions BM25 = positions FAISS (index construit dans l'ordre de index_to_docstore_id)
+        if use_sparse and len(sparse) != meta_index.ntotal:
+            use_sparse = False
+    else:
+        dense = _dense(vectordb, query, fetch_k if use_sparse else k, embedding)
+    if not use_sparse:
+        return [(doc, score, score) for doc, score in dense]
+
+    docstore = getattr(vectordb, 'docstore', None)
+    by_key = {}
+    distances = {}
+    dense_ranking = []
+    for doc, score in dense:
+        by_key[doc_key(doc)] = doc
+        distances[doc_key(doc)] = score
+        dense_ranking.append(doc_key(doc))
+    sparse_ranking = []
+    if docstore is not None:
+        for doc_id, _score in sparse.search(query, k=fetch_k, allowed=allowed):
+            doc = docstore.search(doc_id)
+            if doc is None or isinstance(doc, str):  # InMemoryDocstore renvoie un message si absent
+                continue
+            key = doc_key(doc)
+            by_key.setdefault(key, doc)
+            sparse_ranking.append(key)
+    fused = rrf_fuse([dense_ranking, sparse_ranking], rrf_k=getattr(settings, 'HYBRID_RRF_K', 60))
+    return [(by_key[key], score, distances.get(key)) for key, score in fused[:k] if key in by_key]
+
+
+def hybrid_search(query: str, k: int, vectordb=None, sparse: Optional[BM25Index] = None,
+                  where: Optional[Dict[str, List[str]]] = None):
+    """One dense + one sparse lookup fused by RRF -> [(Document, rrf_score)].
+
+    Defaults to the index held by VectorStoreManager. Falls back to plain
+    dense results (with their L2 distances) when no sparse index is available
+    or HYBRID_SEARCH_ENABLED is off.
+    """
+    if vectordb is None or sparse is None:
+        from .vectorstore_manager import VectorStoreManager
+        vsm = VectorStoreManager()
+        if vectordb is None:
+            vectordb = vsm.get_vectordb()
+        if sparse is None and hasattr(vsm, 'get_sparse_index'):
+            sparse = vsm.get_sparse_index()
+    return [(doc, score) for doc, score, _dist in hybrid_ranked(query, k, vectordb, sparse, where=where)]
+
+
+__all__ = [
+    'BM25Index',
+    'analyze',
+    'rrf_fuse',
+    'doc_key',
+    'hybrid_search',
+    'hybrid_ranked',
+    'SPARSE_INDEX_FILE',
+]
@@ -0,0 +1,269 @@
+"""Incremental reindexing driven by a per-file content manifest.
+
+`index_manifest.json` (next to `embedding_meta.json`) records, for every source
+file: size, mtime, sha256 of the content, number of loaded documents and the
+ids of its chunks in the FAISS docstore. A reindex then:
+
+- skips files whose (size, mtime) or content hash did not change,
+- deletes the chunks of removed / changed files from the FAISS index and docstore,
+- loads (optionally in a process pool, see `loader.load_files`), splits and embeds
+  only new / changed files (deterministic chunk ids) through the overlapping
+  `EmbeddingPipeline`,
+- re-saves FAISS + BM25 + meta, then the manifest.
+
+A full rebuild (`full=True`) is forced when the manifest is missing or was built
+with another embedding model / chunking configuration.
+
+`build_and_activate` runs such an update in a fresh version directory (copy of
+the active one), validates it with the smoke-check queries and only then flips
+`CURRENT` (see index_versions).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+from .loader import _gather_files, has_loader, load_files, synthetic_profile_files
+from .vectorstore import get_embeddings, get_splitter, save_index
+from .embedding_pipeline import EmbeddingPipeline
+from .model_registry import embedding_model_name, embedding_provider
+from .ann import load_flat_sidecar
+from .index_store import load_vectorstore
+from .index_versions import activate, active_index_dir, index_root, new_version_dir, prune_versions
+
+MANIFEST_FILE = 'index_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _manifest_key(path: str) -> str:
+    try:
+        rel = os.path.relpath(path, start=settings.DATA_DIR)
+    except ValueError:
+        rel = path
+    return path if rel.startswith('..') else rel
+
+
+# Manifests antérieurs au champ embedding_provider: index sentence-transformers (torch)
+_LEGACY_CONFIG = {"embedding_provider": "torch"}
+
+
+def _index_config() -> Dict[str, Any]:
+    return {
+        "embedding_model": embedding_model_name(),
+        "embedding_provider": embedding_provider(),
+        "chunk_size": getattr(settings, 'CHUNK_SIZE', 400),
+        "chunk_overlap": getattr(settings, 'CHUNK_OVERLAP', 50),
+    }
+
+
+def load_manifest(persist_path: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(persist_path, MANIFEST_FILE)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except Exception as e:
+        print(f"⚠️ Lecture manifest échouée: {e}")
+        return None
+
+
+def save_manifest(persist_path: str, manifest: Dict[str, Any]):
+    path = os.path.join(persist_path, MANIFEST_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _content_hash(files: Dict[str, Dict[str, Any]]) -> str:
+    h = hashlib.sha256()
+    for key in sorted(files):
+        h.update(f"{key}\x00{files[key]['sha256']}\x00".encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def reindex_incremental(persist_path: str, data_dir: str = None, full: bool = False,
+                        batch_size: int = 1024, embeddings=None, files: List[str] = None,
+                        load_workers: int = None) -> Dict[str, Any]:
+    """Update the persisted index under `persist_path` from the current corpus.
+
+    Returns counters: added / changed / removed / unchanged files, chunks added / deleted,
+    and the per-file load report (`loading`). Files that fail to load are left out of the
+    manifest so the next reindex retries them.
+    """
+    os.makedirs(persist_path, exist_ok=True)
+    index_path = os.path.join(persist_path, 'faiss_index')
+    config = _index_config()
+    stats = {"mode": "incremental", "added": 0, "changed": 0, "removed": 0, "unchanged": 0,
+             "chunks_added": 0, "chunks_deleted": 0}
+
+    manifest = None if full else load_manifest(persist_path)
+    if manifest is not None and (manifest.get("version") != MANIFEST_VERSION
+                                 or any({**_LEGACY_CONFIG, **manifest}.get(k) != v for k, v in config.items())):
+        print("⚠️ Manifest incompatible (modèle ou découpage modifié) -> reconstruction complète")
+        manifest = None
+    if manifest is None or not os.path.isdir(index_path):
+        manifest = None
+        stats["mode"] = "full"
+
+    embeddings = embeddings or get_embeddings()
+    vectordb = None
+    if manifest is not None:
+        try:
+            # Docstore matérialisé en mémoire: l'index va être modifié
+            vectordb = load_vectorstore(index_path, embeddings, lazy=False)
+            # Index ANN (HNSW/PQ...): on repart des vecteurs exacts pour supprimer / ajouter
+            flat = load_flat_sidecar(index_path)
+            if flat is not None:
+                vectordb.index = flat
+        except Exception as e:
+            print(f"⚠️ Chargement index existant échoué ({e}) -> reconstruction complète")
+            manifest = None
+            stats["mode"] = "full"
+    old_files: Dict[str, Dict[str, Any]] = (manifest or {}).get("files", {})
+
+    # --- 1. Diff du corpus contre le manifest ---
+    paths = [p for p in (files if files is not None else _gather_files(data_dir)) if has_loader(p)]
+    new_files: Dict[str, Dict[str, Any]] = {}
+    to_index = []
+    stale_ids: List[str] = []
+    seen = set()
+    for path in paths:
+        key = _manifest_key(path)
+        seen.add(key)
+        st = os.stat(path)
+        old = old_files.get(key)
+        if old and old.get("size") == st.st_size and old.get("mtime") == st.st_mtime:
+            new_files[key] = old
+            stats["unchanged"] += 1
+            continue
+        sha = _file_sha256(path)
+        if old and old.get("sha256") == sha:
+            # Contenu identique (touch / copie): seule la date change
+            new_files[key] = {**old, "size": st.st_size, "mtime": st.st_mtime}
+            stats["unchanged"] += 1
+            continue
+        if old:
+            stale_ids.extend(old.get("chunk_ids", []))
+            stats["changed"] += 1
+        else:
+            stats["added"] += 1
+        to_index.append((path, key, {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha}))
+    for key, old in old_files.items():
+        if key not in seen:
+            stale_ids.extend(old.get("chunk_ids", []))
+            stats["removed"] += 1
+
+    print(f"🧾 Reindex {stats['mode']}: +{stats['added']} ~{stats['changed']} -{stats['removed']} "
+          f"fichiers ({stats['unchanged']} inchangés)")
+
+    # --- 2. Suppression des chunks obsolètes ---
+    if vectordb is not None and stale_ids:
+        vectordb.delete(stale_ids)
+        stats["chunks_deleted"] = len(stale_ids)
+        print(f"🗑️ {len(stale_ids)} chunks supprimés de l'index")
+
+    # --- 3. Chargement / découpage / embedding des seuls fichiers nouveaux ou modifiés ---
+    splitter = get_splitter()
+
+    load_stats: Dict[str, Any] = {}
+
+    def _batches():
+        # Chargement (pool optionnel, ordre des fichiers conservé) / découpage pendant que le lot précédent est encodé
+        pending_docs, pending_ids = [], []
+        loaded = load_files([path for path, _key, _entry in to_index], workers=load_workers, stats=load_stats)
+        for (path, key, entry), (_path, docs) in zip(to_index, loaded):
+            if load_stats["files"][-1]["error"]:
+                continue
+            chunks = splitter.split_documents(docs)
+            file_tag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+            ids = [f"{file_tag}:{entry['sha256'][:16]}:{i}" for i in range(len(chunks))]
+            new_files[key] = {**entry, "doc_count": len(docs), "chunk_ids": ids}
+            pending_docs.extend(chunks)
+            pending_ids.extend(ids)
+            if len(pending_docs) >= batch_size:
+                yield pending_docs, pending_ids
+                pending_docs, pending_ids = [], []
+        if pending_docs:
+            yield pending_docs, pending_ids
+
+    pipeline = EmbeddingPipeline(embeddings)
+    vectordb = pipeline.build(_batches(), vectordb)
+    stats["chunks_added"] = pipeline.stats.get("chunks", 0)
+    if to_index:
+        stats["loading"] = load_stats
+    if stats["chunks_added"]:
+        stats["embedding"] = pipeline.stats
+
+    manifest = {"version": MANIFEST_VERSION, **config, "files": new_files}
+    if vectordb is None:
+        print("⚠️ Aucun chunk à indexer")
+        return stats
+    if to_index or stale_ids or stats["mode"] == "full":
+        chunk_count = sum(len(f.get("chunk_ids", [])) for f in new_files.values())
+        doc_count = sum(f.get("doc_count", 0) for f in new_files.values())
+        save_index(vectordb, persist_path, doc_count=doc_count, chunk_count=chunk_count,
+                   content_hash=_content_hash(new_files))
+    else:
+        print("✅ Index déjà à jour")
+    save_manifest(persist_path, manifest)
+    return stats
+
+
+def files_for_index(name: str = None) -> Optional[List[str]]:
+    """Source files of a named index (None: the whole corpus, for main_index)."""
+    if name == 'synthetic_index':
+        return synthetic_profile_files()
+    return None
+
+
+def build_and_activate(full: bool = False, root: str = None, embeddings=None, files: List[str] = None,
+                       batch_size: int = 1024, queries: List[str] = None, load_workers: int = None) -> Dict[str, Any]:
+    """Build a new index version, validate it, then atomically make it the active one.
+
+    The version directory is discarded (and `CURRENT` untouched) when validation fails.
+    """
+    from .scripts.smoke_check import DEFAULT_QUERIES, verify_index
+
+    root = root or index_root()
+    os.makedirs(root, exist_ok=True)
+    base = None if full else active_index_dir(root)
+    version_dir = new_version_dir(root, base=base)
+    version = os.path.basename(version_dir)
+    embeddings = embeddings or get_embeddings()
+    try:
+        stats = reindex_incremental(version_dir, full=full, batch_size=batch_size,
+                                    embeddings=embeddings, files=files, load_workers=load_workers)
+        # Validation sur les fichiers écrits, ouverts comme en production (mmap + SQLite)
+        vs = load_vectorstore(os.path.join(version_dir, 'faiss_index'), embeddings)
+        ok, verification = verify_index(vs, queries or DEFAULT_QUERIES, k=3)
+    except Exception as e:
+        print(f"❌ Construction de la version {version} échouée: {e}")
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    stats.update({"version": version, "verification": verification, "activated": False})
+    if not ok:
+        print(f"❌ Validation smoke-check échouée, version {version} abandonnée")
+        shutil.rmtree(version_dir, ignore_errors=True)
+        return stats
+    activate(version, root=root)
+    stats["activated"] = True
+    stats["pruned"] = prune_versions(root=root)
+    print(f"✅ Version d'index activée: {version}")
+    return stats
+
+
+__all__ = ['reindex_incremental', 'build_and_activate', 'files_for_index', 'load_manifest', 'MANIFEST_FILE']
@@ -0,0 +1,233 @@
+"""Memory-mapped FAISS index + on-disk SQLite docstore (replaces index.pkl).
+
+`FAISS.load_local` reads the whole `index.faiss` into RAM and unpickles
+`index.pkl` (every chunk text + metadata), so startup time and per-worker
+memory grow with the corpus, and loading needs `allow_dangerous_deserialization`.
+
+Layout of `faiss_index/` written by `save_vectorstore`:
+
+- `index.faiss`: FAISS index (any type), memory-mapped so several uvicorn
+  workers share the OS page cache instead of private copies. `IO_FLAG_MMAP`
+  alone only maps IVF inverted lists (flat / HNSW / SQ codes would still be
+  copied), so flat-code indexes use `IO_FLAG_MMAP_IFC` (see `mmap_flags`).
+- `docstore.sqlite`: table `docs(pos, id, content, metadata)`; `pos` is the
+  FAISS position. Text/metadata are read lazily, only for the hits returned
+  (small per-process LRU), JSON-encoded (no pickle).
+
+`load_vectorstore` returns a regular LangChain `FAISS` object whose `docstore`
+and `index_to_docstore_id` are SQLite-backed. `lazy=False` materializes both in
+memory (build tooling that mutates the index). Legacy directories that only
+contain `index.pkl` fall back to `FAISS.load_local`.
+
+An mmapped file must never be rewritten in place: builds go to a new version
+directory (index_versions) and `save_vectorstore` writes via temp files + rename.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional
+
+from core.cache import LRUCache
+from core.config import settings
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    faiss = None  # type: ignore
+
+try:
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+except Exception:
+    from langchain.vectorstores import FAISS
+    from langchain.docstore.in_memory import InMemoryDocstore
+
+try:
+    from langchain_core.documents import Document
+except Exception:
+    from langchain.docstore.document import Document
+
+INDEX_FILE = 'index.faiss'
+DOCSTORE_FILE = 'docstore.sqlite'
+
+
+class ReadOnlyDocstoreError(RuntimeError):
+    """Write attempted on a SQLite-backed (serving) docstore."""
+
+
+class _SQLiteReader:
+    """Read-only connections (one per thread) on a docstore file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5.0)
+            self._local.conn = conn
+        return conn
+
+
+class SQLiteDocstore:
+    """LangChain docstore interface (`search`) over `docstore.sqlite`."""
+
+    def __init__(self, path: str, cache_size: int = None):
+        self._db = _SQLiteReader(path)
+        self.path = path
+        size = cache_size if cache_size is not None else getattr(settings, 'DOCSTORE_CACHE_SIZE', 2048)
+        # Même objet Document renvoyé tant qu'il est en cache (dédoublonnage dense/sparse)
+        self._cache = LRUCache(max_size=max(1, size), ttl_seconds=24 * 3600)
+
+    def search(self, search: str):
+        doc = self._cache.get(search)
+        if doc is not None:
+            return doc
+        row = self._db.conn().execute(
+            "SELECT content, metadata FROM docs WHERE id = ?", (search,)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        doc = Document(id=search, page_content=row[0], metadata=json.loads(row[1] or '{}'))
+        self._cache.set(search, doc)
+        return doc
+
+    def add(self, texts: Dict[str, Any]):
+        raise ReadOnlyDocstoreError("SQLiteDocstore is read-only; load with lazy=False to modify the index")
+
+    def delete(self, ids: List):
+        raise ReadOnlyDocstoreError("SQLiteDocstore is read-only; load with lazy=False to modify the index")
+
+    def __len__(self) -> int:
+        return self._db.conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+
+class SQLitePositionMap(Mapping):
+    """Read-only `index_to_docstore_id` (FAISS position -> docstore id) backed by SQLite."""
+
+    def __init__(self, path: str):
+        self._db = _SQLiteReader(path)
+        self._len: Optional[int] = None
+
+    def __getitem__(self, pos) -> str:
+        row = self._db.conn().execute("SELECT id FROM docs WHERE pos = ?", (int(pos),)).fetchone()
+        if row is None:
+            raise KeyError(pos)
+        return row[0]
+
+    def __iter__(self) -> Iterator[int]:
+        for (pos,) in self._db.conn().execute("SELECT pos FROM docs ORDER BY pos"):
+            yield pos
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = self._db.conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        return self._len
+
+    def position_of(self, doc_id: str) -> Optional[int]:
+        row = self._db.conn().execute("SELECT pos FROM docs WHERE id = ?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+
+def _write_docstore(vectordb, path: str):
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("CREATE TABLE docs (pos INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+                     "content TEXT, metadata TEXT)")
+        rows = []
+        for pos in sorted(vectordb.index_to_docstore_id):
+            doc_id = vectordb.index_to_docstore_id[pos]
+            doc = vectordb.docstore.search(doc_id)
+            if isinstance(doc, str):
+                continue
+            rows.append((int(pos), doc_id, doc.page_content,
+                         json.dumps(doc.metadata or {}, ensure_ascii=False, default=str)))
+            if len(rows) >= 1000:
+                conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", rows)
+                rows.clear()
+        if rows:
+            conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+
+
+def save_vectorstore(vectordb, index_path: str):
+    """Write `index.faiss` + `docstore.sqlite` (no pickle) under `index_path`."""
+    os.makedirs(index_path, exist_ok=True)
+    tmp = os.path.join(index_path, INDEX_FILE + '.tmp')
+    faiss.write_index(vectordb.index, tmp)
+    os.replace(tmp, os.path.join(index_path, INDEX_FILE))
+    _write_docstore(vectordb, os.path.join(index_path, DOCSTORE_FILE))
+    # Ancien format pickle devenu obsolète dans ce répertoire
+    legacy = os.path.join(index_path, 'index.pkl')
+    if os.path.exists(legacy):
+        os.remove(legacy)
+
+
+def mmap_flags(path: str) -> int:
+    """`read_index` flags memory-mapping the bulk of the index stored at `path`.
+
+    IVF indexes (fourcc "Iw..") map their inverted lists with IO_FLAG_MMAP; every
+    other type (flat, HNSW, SQ, PQ) maps its code array with IO_FLAG_MMAP_IFC.
+    The two cannot be combined (IVF load fails).
+    """
+    with open(path, 'rb') as fh:
+        fourcc = fh.read(4)
+    if fourcc.startswith(b'Iw') or not hasattr(faiss, 'IO_FLAG_MMAP_IFC'):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def load_vectorstore(index_path: str, embeddings, lazy: bool = True, mmap: bool = None):
+    """Open a saved index; SQLite-backed docstore when `lazy`, in-memory otherwise."""
+    db_path = os.path.join(index_path, DOCSTORE_FILE)
+    if not os.path.isfile(db_path):
+        # Format historique (index.pkl)
+        return FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+    mmap = getattr(settings, 'FAISS_MMAP', True) if mmap is None else mmap
+    index_file = os.path.join(index_path, INDEX_FILE)
+    index = faiss.read_index(index_file, mmap_flags(index_file) if (mmap and lazy) else 0)
+    if lazy:
+        docstore = SQLiteDocstore(db_path)
+        mapping = SQLitePositionMap(db_path)
+    else:
+        docs, mapping = {}, {}
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            for pos, doc_id, content, meta in conn.execute(
+                    "SELECT pos, id, content, metadata FROM docs ORDER BY pos"):
+                docs[doc_id] = Document(id=doc_id, page_content=content, metadata=json.loads(meta or '{}'))
+                mapping[pos] = doc_id
+        finally:
+            conn.close()
+        docstore = InMemoryDocstore(docs)
+    return FAISS(embeddings, index, docstore, mapping)
+
+
+def has_saved_index(index_path: str) -> bool:
+    return os.path.isfile(os.path.join(index_path, INDEX_FILE)) and (
+        os.path.isfile(os.path.join(index_path, DOCSTORE_FILE))
+        or os.path.isfile(os.path.join(index_path, 'index.pkl'))
+    )
+
+
+__all__ = [
+    'ReadOnlyDocstoreError',
+    'SQLiteDocstore',
+    'SQLitePositionMap',
+    'save_vectorstore',
+    'load_vectorstore',
+    'has_saved_index',
+    'mmap_flags',
+    'DOCSTORE_FILE',
+]
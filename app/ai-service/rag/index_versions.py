@@ -0,0 +1,130 @@
+"""Versioned index layout with an atomic `CURRENT` pointer.
+
+    data/faiss/main_index/
+        CURRENT                   -> "v20261018-101500-482113"
+        v20261018-101500-482113/  faiss_index/, embedding_meta.json, sparse_index.json, index_manifest.json
+        v20261017-220000-017554/  (previous build, kept for rollback)
+
+A build writes into a fresh version directory, is validated, then activated by
+replacing `CURRENT` with `os.replace` (atomic on POSIX): readers see either the
+old or the new version, never a half-written directory. Without `CURRENT`
+(legacy layout) the root itself is the active index.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import time
+import uuid
+from typing import List, Optional
+
+from core.config import settings
+
+CURRENT_FILE = 'CURRENT'
+VERSION_PREFIX = 'v'
+MAIN_INDEX = 'main_index'
+
+
+def index_root(name: str = None) -> str:
+    return os.path.join(settings.FAISS_DIR, name or MAIN_INDEX)
+
+
+def current_version(root: str = None) -> Optional[str]:
+    path = os.path.join(root or index_root(), CURRENT_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            version = fh.read().strip()
+    except OSError:
+        return None
+    return version or None
+
+
+def active_index_dir(root: str = None) -> str:
+    """Directory of the active index (`root/<CURRENT>`, or `root` for the legacy layout)."""
+    root = root or index_root()
+    version = current_version(root)
+    if version and os.path.isdir(os.path.join(root, version)):
+        return os.path.join(root, version)
+    return root
+
+
+def list_versions(root: str = None) -> List[str]:
+    """Version directory names, oldest first."""
+    root = root or index_root()
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        d for d in os.listdir(root)
+        if d.startswith(VERSION_PREFIX) and os.path.isdir(os.path.join(root, d))
+    )
+
+
+def new_version_dir(root: str = None, base: str = None) -> str:
+    """Create an empty version directory, or a copy of `base` (incremental builds start from it)."""
+    root = root or index_root()
+    # Horodatage à la microseconde: l'ordre lexicographique suit l'ordre de construction
+    now = time.time()
+    version = f"{VERSION_PREFIX}{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1e6) % 1000000:06d}"
+    path = os.path.join(root, version)
+    os.makedirs(path)
+    if base and os.path.isdir(os.path.join(base, 'faiss_index')):
+        # Copie des seuls fichiers d'index (pas des autres versions si base == racine legacy)
+        for name in os.listdir(base):
+            src = os.path.join(base, name)
+            if name == CURRENT_FILE or (os.path.isdir(src) and name.startswith(VERSION_PREFIX)):
+                continue
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(path, name))
+            else:
+                shutil.copy2(src, os.path.join(path, name))
+    return path
+
+
+def activate(version: str, root: str = None):
+    """Atomically point `CURRENT` at `version`."""
+    root = root or index_root()
+    if not os.path.isdir(os.path.join(root, version)):
+        raise FileNotFoundError(f"Unknown index version: {version}")
+    tmp = os.path.join(root, f".{CURRENT_FILE}.{uuid.uuid4().hex[:8]}")
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        fh.write(version)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+
+def previous_version(root: str = None) -> Optional[str]:
+    """Newest version older than the active one (rollback target)."""
+    root = root or index_root()
+    current = current_version(root)
+    versions = list_versions(root)
+    older = [v for v in versions if current is None or v < current]
+    return older[-1] if older else None
+
+
+def prune_versions(keep: int = None, root: str = None) -> List[str]:
+    """Delete the oldest versions beyond `keep` (INDEX_KEEP_VERSIONS); never the active one."""
+    root = root or index_root()
+    keep = max(1, keep if keep is not None else getattr(settings, 'INDEX_KEEP_VERSIONS', 3))
+    current = current_version(root)
+    versions = list_versions(root)
+    removed = []
+    for v in versions[:-keep] if len(versions) > keep else []:
+        if v == current:
+            continue
+        shutil.rmtree(os.path.join(root, v), ignore_errors=True)
+        removed.append(v)
+    return removed
+
+
+__all__ = [
+    'MAIN_INDEX',
+    'index_root',
+    'current_version',
+    'active_index_dir',
+    'list_versions',
+    'new_version_dir',
+    'activate',
+    'previous_version',
+    'prune_versions',
+]
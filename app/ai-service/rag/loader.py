@@ -2,7 +2,12 @@ import os
 import csv
 import json
 import glob
-from typing import List, Callable, Dict, Any
+import multiprocessing
+import time
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 try:
     from bs4 import BeautifulSoup
 except Exception:
@@ -15,6 +20,13 @@ try:
 except Exception:
     from langchain.document_loaders import PyPDFLoader
 
+# Découpage des gros PDF par plages de pages (mêmes Documents que PyPDFLoader)
+try:
+    import pypdf  # type: ignore
+    from langchain_community.document_loaders.parsers.pdf import PyPDFParser
+except Exception:  # pragma: no cover - dépend de la version langchain/pypdf
+    pypdf = None  # type: ignore
+
 try:
     from langchain.schema import Document
 except Exception:
@@ -41,6 +53,57 @@ def load_pdf(path: str) -> List[Document]:
     return loader.load()
 
 
+def pdf_page_count(path: str) -> int:
+    """Number of pages of a PDF (0 when page-range loading is unavailable or the file is unreadable)."""
+    if pypdf is None:
+        return 0
+    try:
+        return len(pypdf.PdfReader(path).pages)
+    except Exception:
+        return 0
+
+
+def _pdf_metadata(reader, path: str) -> Dict[str, Any]:
+    """Document-level metadata normalized like PyPDFLoader: keys without '/' and lower-cased, dates in ISO 8601."""
+    raw = ({"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""} | dict(reader.metadata or {})
+           | {"source": str(path), "total_pages": len(reader.pages)})
+    metadata: Dict[str, Any] = {}
+    for key, value in raw.items():
+        if type(value) not in (str, int):
+            value = str(value)
+        key = (key[1:] if key.startswith('/') else key).lower()
+        if key in ('creationdate', 'moddate'):
+            try:
+                metadata[key] = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                metadata[key] = value
+            continue
+        # Clés alignées sur les autres parseurs PDF de langchain (la clé d'origine est conservée)
+        alias = {'page_count': 'total_pages', 'file_path': 'source'}.get(key)
+        if alias:
+            metadata[alias] = value
+        metadata[key] = value.strip() if isinstance(value, str) and not alias else value
+    return metadata
+
+
+def load_pdf_pages(path: str, start: int, end: int) -> List[Document]:
+    """Pages [start, end) of a PDF, identical to the matching `load_pdf` documents (images not extracted)."""
+    parser = PyPDFParser()
+    reader = pypdf.PdfReader(path)
+    doc_metadata = _pdf_metadata(reader, path)
+    labels = reader.page_labels
+    docs: List[Document] = []
+    for number in range(start, min(end, len(reader.pages))):
+        page = reader.pages[number]
+        if pypdf.__version__.startswith('3'):
+            text = page.extract_text()
+        else:
+            text = page.extract_text(extraction_mode=parser.extraction_mode, **parser.extraction_kwargs)
+        docs.append(Document(page_content=text.strip(),
+                             metadata=doc_metadata | {"page": number, "page_label": labels[number]}))
+    return docs
+
+
 def load_csv(path: str) -> List[Document]:
     docs: List[Document] = []
     try:
@@ -178,28 +241,155 @@ def _gather_files(data_dir: str) -> List[str]:
     return sorted(files)
 
 
-def load_all_documents(data_dir: str = None) -> List[Document]:
-    files = _gather_files(data_dir)
-    all_docs: List[Document] = []
-    counts: Dict[str, int] = {}
+def synthetic_profile_files(data_dir: str = None) -> List[str]:
+    """TXT synthetic product profiles (data/raw/synthetic_profiles), source of `synthetic_index`."""
+    target = os.path.join(data_dir or settings.DATA_DIR, 'raw', 'synthetic_profiles')
+    if not os.path.isdir(target):
+        return []
+    return sorted(os.path.join(target, f) for f in os.listdir(target) if f.endswith('.txt'))
+
+
+def has_loader(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in _LOADERS
+
+
+def load_file(path: str) -> List[Document]:
+    """Load one file with the loader registered for its extension ([] if none)."""
+    loader = _LOADERS.get(os.path.splitext(path)[1].lower())
+    return loader(path) if loader is not None else []
+
+
+# --- Chargement parallèle ---
+
+Task = Tuple[str, Optional[int], Optional[int]]  # (path, première page, page de fin) ; pages None = fichier entier
 
-    for path in files:
-        _, ext = os.path.splitext(path)
-        ext = ext.lower()
-        loader = _LOADERS.get(ext)
-        if loader is None:
+
+def _load_task(path: str, start: Optional[int] = None, end: Optional[int] = None):
+    """One load task -> (docs, error, seconds); runs in a pool worker or inline."""
+    t0 = time.perf_counter()
+    try:
+        docs = load_file(path) if start is None else load_pdf_pages(path, start, end)
+        return docs, None, time.perf_counter() - t0
+    except Exception as e:
+        return [], f"{e.__class__.__name__}: {e}", time.perf_counter() - t0
+
+
+def _plan(path: str, pages_per_task: int) -> List[Task]:
+    """Tasks of one file: page ranges for PDFs longer than `pages_per_task`, else the whole file."""
+    if pages_per_task > 0 and path.lower().endswith('.pdf'):
+        pages = pdf_page_count(path)
+        if pages > pages_per_task:
+            return [(path, lo, min(lo + pages_per_task, pages)) for lo in range(0, pages, pages_per_task)]
+    return [(path, None, None)]
+
+
+def _relpath(path: str) -> str:
+    try:
+        return os.path.relpath(path, start=settings.DATA_DIR)
+    except ValueError:
+        return path
+
+
+def load_files(paths: Iterable[str], workers: int = None, pages_per_task: int = None,
+               stats: Dict[str, Any] = None, mp_context: str = 'spawn') -> Iterator[Tuple[str, List[Document]]]:
+    """Yield (path, documents) for every file, in input order.
+
+    With `workers` > 0 (default LOAD_WORKERS) files are parsed in a process pool and large
+    PDFs are split into page ranges of `pages_per_task` (LOAD_PDF_PAGES_PER_TASK); results
+    are reassembled in input order, so chunk ids and signatures match a sequential load.
+    Per-file timings and failures are appended to `stats["files"]` / `stats["failed"]`.
+    """
+    workers = settings.LOAD_WORKERS if workers is None else workers
+    pages_per_task = settings.LOAD_PDF_PAGES_PER_TASK if pages_per_task is None else pages_per_task
+    stats = stats if stats is not None else {}
+    stats.update({"workers": workers, "files": [], "failed": [], "documents": 0})
+    start = time.perf_counter()
+
+    def _report(path: str, results: List[tuple]) -> List[Document]:
+        docs = [d for r in results for d in r[0]]
+        errors = [r[1] for r in results if r[1]]
+        entry = {"path": _relpath(path), "docs": len(docs), "tasks": len(results),
+                 "seconds": round(sum(r[2] for r in results), 3), "error": "; ".join(errors) or None}
+        stats["files"].append(entry)
+        stats["documents"] += len(docs)
+        if errors:
+            stats["failed"].append(entry["path"])
+            print(f"Error loading {entry['path']}: {entry['error']}")
+        else:
+            print(f"Loaded {len(docs)} docs from {entry['path']} ({entry['seconds']:.2f}s"
+                  f"{f', {len(results)} tâches' if len(results) > 1 else ''})")
+        return docs
+
+    try:
+        if workers <= 0:
+            for path in paths:
+                yield path, _report(path, [_load_task(path)])
+            return
+        ctx = multiprocessing.get_context(mp_context)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        try:
+            # Fenêtre de tâches en vol bornée: la mémoire ne dépend pas de la taille du corpus
+            window = workers * 4
+            pending: deque = deque()
+            in_flight = 0
+            todo = iter(paths)
+            exhausted = False
+            while True:
+                while not exhausted and in_flight < window:
+                    path = next(todo, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    futures = [pool.submit(_load_task, *task) for task in _plan(path, pages_per_task)]
+                    pending.append((path, futures))
+                    in_flight += len(futures)
+                if not pending:
+                    break
+                path, futures = pending.popleft()
+                in_flight -= len(futures)
+                results = []
+                for f in futures:
+                    try:
+                        results.append(f.result())
+                    except Exception as e:  # worker mort (BrokenProcessPool...)
+                        results.append(([], f"{e.__class__.__name__}: {e}", 0.0))
+                yield path, _report(path, results)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    finally:
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+
+
+def iter_documents(data_dir: str = None, workers: int = None, stats: Dict[str, Any] = None) -> Iterator[Document]:
+    """Yield the corpus documents file by file (streaming counterpart of `load_all_documents`).
+
+    `stats` receives the `load_files` report plus `by_extension` document counts.
+    """
+    files = []
+    for path in _gather_files(data_dir):
+        if not has_loader(path):
             print(f"No loader for {path}, skipping")
             continue
-        docs = loader(path)
-        all_docs.extend(docs)
+        files.append(path)
+    stats = stats if stats is not None else {}
+    counts: Dict[str, int] = stats.setdefault("by_extension", {})
+    for path, docs in load_files(files, workers=workers, stats=stats):
+        ext = os.path.splitext(path)[1].lower()
         counts[ext] = counts.get(ext, 0) + len(docs)
-        print(f"Loaded {len(docs)} docs from {os.path.relpath(path, start=settings.DATA_DIR)}")
+        yield from docs
+
+
+def load_all_documents(data_dir: str = None, workers: int = None, stats: Dict[str, Any] = None) -> List[Document]:
+    stats = stats if stats is not None else {}
+    all_docs = list(iter_documents(data_dir, workers=workers, stats=stats))
 
     # summary
-    print("Load summary:")
-    for ext, c in counts.items():
+    print(f"Load summary ({stats['workers']} workers, {stats['seconds']:.2f}s):")
+    for ext, c in stats["by_extension"].items():
         print(f"  {ext}: {c} documents")
     print(f"  Total: {len(all_docs)} documents")
+    if stats["failed"]:
+        print(f"  Failed: {', '.join(stats['failed'])}")
 
     return all_docs
 
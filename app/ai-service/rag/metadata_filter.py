@@ -0,0 +1,268 @@
+"""Metadata-filtered search executed inside the FAISS index.
+
+`filter_documents_by_type` (rag/rerank.py) filters after retrieval: `/ask?source_filter=csv`
+fetched a handful of mixed chunks and often kept none of the requested type.
+Here the filter is applied by FAISS itself:
+
+- `MetadataIndex` holds posting lists field -> value -> FAISS positions for
+  `type`, `source` (file name), `synthetic` and `product_id`. It is built at
+  index time (`save_index`) and persisted as `metadata_index.json` next to the
+  FAISS index (rebuilt from the docstore for older indexes).
+- A filter ("type=csv|pdf,synthetic=true"; bare values filter on `type`) is
+  resolved to a position bitmap passed to `index.search` through an
+  `IDSelectorBitmap`, for every ANN type (flat, hnsw, ivf, ivfpq, sq8).
+  FAISS only returns matching vectors: k results of the requested type without
+  over-fetching. The BM25 side of hybrid search is masked the same way.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.scoring import fold_text
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    faiss = None  # type: ignore
+
+METADATA_INDEX_FILE = 'metadata_index.json'
+FILTER_FIELDS = ('type', 'source', 'synthetic', 'product_id')
+
+Filter = Dict[str, List[str]]
+
+
+def normalize_value(field: str, value) -> str:
+    """Normalized form of a metadata value (what the posting lists are keyed by)."""
+    if field == 'synthetic':
+        if isinstance(value, str):
+            return 'true' if fold_text(value).strip() in ('1', 'true', 'yes', 'oui') else 'false'
+        return 'true' if value else 'false'
+    text = str(value or '')
+    if field == 'source':
+        text = os.path.basename(text.replace('\\', '/'))
+    return fold_text(text).strip()
+
+
+def parse_filter(raw: str) -> Filter:
+    """"type=csv|pdf,synthetic=true" -> {field: [values]}; a bare value filters on `type`.
+
+    Raises ValueError on unknown fields.
+    """
+    where: Filter = {}
+    for part in (raw or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '=' in part:
+            field, _, values = part.partition('=')
+            field = field.strip().lower()
+        else:
+            field, values = 'type', part
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter field '{field}' (allowed: {', '.join(FILTER_FIELDS)})")
+        for value in values.split('|'):
+            value = normalize_value(field, value.strip())
+            if value and value not in where.setdefault(field, []):
+                where[field].append(value)
+    return {f: v for f, v in where.items() if v}
+
+
+def request_filter(source_filter: str = "", raw_filter: str = "") -> Filter:
+    """Filter of an API request: `source_filter` ("csv,pdf", types) merged with `filter`."""
+    return parse_filter(','.join(p for p in (source_filter, raw_filter) if p and p.strip()))
+
+
+def format_filter(where: Optional[Filter]) -> Optional[str]:
+    """Canonical string of a parsed filter (cache keys, debug output)."""
+    if not where:
+        return None
+    return ','.join(f"{f}={'|'.join(sorted(where[f]))}" for f in sorted(where))
+
+
+def matches(metadata: dict, where: Optional[Filter]) -> bool:
+    """True when `metadata` satisfies every field of `where` (docs injected outside the index)."""
+    if not where:
+        return True
+    for field, values in where.items():
+        if normalize_value(field, (metadata or {}).get(field)) not in values:
+            return False
+    return True
+
+
+class MetadataIndex:
+    """Posting lists field -> value -> sorted FAISS positions (int64)."""
+
+    def __init__(self, ntotal: int, postings: Dict[str, Dict[str, np.ndarray]]):
+        self.ntotal = int(ntotal)
+        self.postings = postings
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[int, dict]], ntotal: int) -> "MetadataIndex":
+        """`items`: (FAISS position, chunk metadata) pairs."""
+        raw: Dict[str, Dict[str, List[int]]] = {f: {} for f in FILTER_FIELDS}
+        for pos, meta in items:
+            meta = meta or {}
+            for field in FILTER_FIELDS:
+                if field != 'synthetic' and not meta.get(field):
+                    continue
+                raw[field].setdefault(normalize_value(field, meta.get(field)), []).append(int(pos))
+        postings = {
+            f: {v: np.unique(np.asarray(p, dtype=np.int64)) for v, p in values.items()}
+            for f, values in raw.items()
+        }
+        return cls(ntotal, postings)
+
+    @classmethod
+    def from_vectorstore(cls, vectordb) -> Optional["MetadataIndex"]:
+        mapping = getattr(vectordb, 'index_to_docstore_id', None)
+        docstore = getattr(vectordb, 'docstore', None)
+        index = getattr(vectordb, 'index', None)
+        if mapping is None or docstore is None or index is None:
+            return None
+
+        def _items():
+            for pos in sorted(mapping):
+                doc = docstore.search(mapping[pos])
+                yield pos, getattr(doc, 'metadata', None)
+        return cls.build(_items(), index.ntotal)
+
+    def positions(self, where: Optional[Filter]) -> Optional[np.ndarray]:
+        """Positions matching `where` (union of values, intersection of fields); None = no filter."""
+        if not where:
+            return None
+        result = None
+        for field, values in where.items():
+            lists = [self.postings.get(field, {}).get(v) for v in values]
+            lists = [p for p in lists if p is not None]
+            field_pos = np.unique(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64)
+            result = field_pos if result is None else np.intersect1d(result, field_pos, assume_unique=True)
+            if not result.size:
+                break
+        return result
+
+    def bitmap(self, positions: np.ndarray) -> np.ndarray:
+        """Packed bitmap (1 bit per FAISS position, little-endian) for IDSelectorBitmap."""
+        mask = np.zeros(self.ntotal, dtype=bool)
+        mask[positions[positions < self.ntotal]] = True
+        return np.packbits(mask, bitorder='little')
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        return {f: {v: int(p.size) for v, p in values.items()} for f, values in self.postings.items()}
+
+    def save(self, persist_path: str):
+        data = {
+            "ntotal": self.ntotal,
+            "postings": {f: {v: p.tolist() for v, p in values.items()} for f, values in self.postings.items()},
+        }
+        with open(os.path.join(persist_path, METADATA_INDEX_FILE), 'w', encoding='utf-8') as fh:
+            json.dump(data, fh, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, persist_path: str) -> Optional["MetadataIndex"]:
+        path = os.path.join(persist_path, METADATA_INDEX_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as fh:
+            data = json.load(fh)
+        postings = {
+            f: {v: np.asarray(p, dtype=np.int64) for v, p in values.items()}
+            for f, values in data["postings"].items()
+        }
+        return cls(data["ntotal"], postings)
+
+
+# vectordb -> MetadataIndex ; reconstruit si l'index change de taille
+_INDEXES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def register(vectordb, meta_index: Optional[MetadataIndex]):
+    """Attach a persisted MetadataIndex to a loaded vectorstore (ignored if misaligned)."""
+    index = getattr(vectordb, 'index', None)
+    if meta_index is not None and index is not None and meta_index.ntotal == index.ntotal:
+        with _lock:
+            _INDEXES[vectordb] = meta_index
+
+
+def metadata_index_for(vectordb) -> Optional[MetadataIndex]:
+    """MetadataIndex of `vectordb` (registered at load time, else built from the docstore)."""
+    index = getattr(vectordb, 'index', None)
+    if index is None:
+        return None
+    cached = _INDEXES.get(vectordb)
+    if cached is not None and cached.ntotal == index.ntotal:
+        return cached
+    with _lock:
+        cached = _INDEXES.get(vectordb)
+        if cached is None or cached.ntotal != index.ntotal:
+            cached = MetadataIndex.from_vectorstore(vectordb)
+            if cached is not None:
+                _INDEXES[vectordb] = cached
+    return cached
+
+
+def _search_params(index, selector, k: int, exhaustive: bool = False):
+    """SearchParameters carrying the selector plus the index's own efSearch / nprobe."""
+    if hasattr(index, 'hnsw'):
+        ef = max(int(index.hnsw.efSearch), k)
+        # Filtre très sélectif: le parcours du graphe peut s'arrêter avant k résultats
+        if exhaustive:
+            ef = max(ef, int(index.ntotal))
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef)
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except Exception:
+        ivf = None
+    if ivf is not None:
+        nprobe = int(ivf.nlist) if exhaustive else int(ivf.nprobe)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def filtered_dense_search(vectordb, embedding: Sequence[float], k: int,
+                          positions: np.ndarray, meta_index: MetadataIndex) -> List[Tuple[object, float]]:
+    """[(Document, L2 distance)] of the k nearest chunks among `positions`, searched by FAISS."""
+    if faiss is None:
+        raise ImportError("faiss is required for filtered search")
+    k = min(int(k), int(positions.size))
+    if k <= 0:
+        return []
+    index = vectordb.index
+    bitmap = meta_index.bitmap(positions)  # référencé jusqu'à la fin de la recherche
+    selector = faiss.IDSelectorBitmap(meta_index.ntotal, faiss.swig_ptr(bitmap))
+    query = np.asarray([embedding], dtype=np.float32)
+    if getattr(vectordb, '_normalize_L2', False):
+        faiss.normalize_L2(query)
+    distances, ids = index.search(query, k, params=_search_params(index, selector, k))
+    if int((ids[0] >= 0).sum()) < k and (hasattr(index, 'hnsw') or hasattr(index, 'nprobe')):
+        # ANN: pas assez de candidats visités dans le sous-ensemble -> recherche exhaustive filtrée
+        distances, ids = index.search(query, k, params=_search_params(index, selector, k, exhaustive=True))
+    out = []
+    for dist, pos in zip(distances[0], ids[0]):
+        if pos < 0:
+            continue
+        doc = vectordb.docstore.search(vectordb.index_to_docstore_id[int(pos)])
+        if doc is None or isinstance(doc, str):
+            continue
+        out.append((doc, float(dist)))
+    return out
+
+
+__all__ = [
+    'MetadataIndex',
+    'METADATA_INDEX_FILE',
+    'FILTER_FIELDS',
+    'parse_filter',
+    'request_filter',
+    'format_filter',
+    'matches',
+    'register',
+    'metadata_index_for',
+    'filtered_dense_search',
+]
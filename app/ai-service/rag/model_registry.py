@@ -0,0 +1,280 @@
+"""Process-wide embedding model registry.
+
+The same sentence-transformers model used to be instantiated separately by the
+vector store manager (index loading), the reranker and every index build, each
+copy costing hundreds of MB and seconds of load time. `EMBEDDING_MODELS` loads
+each (model name, device, loader) once, lazily and under a per-model lock, and
+hands out a shared `SharedEmbeddings` handle.
+
+Handles resolve the model on each call, so `unload()` / `unload_idle()` really
+release it (the next call reloads it transparently). Idle unloading is off by
+default; EMBED_MODEL_IDLE_SECONDS > 0 starts a background reaper. `stats()`
+reports load time, memory footprint and idle time per model (/api/metrics).
+"""
+from __future__ import annotations
+
+import gc
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from langchain_core.embeddings import Embeddings
+except Exception:  # pragma: no cover - older langchain
+    from langchain.embeddings.base import Embeddings  # type: ignore
+
+try:
+    from langchain_huggingface import HuggingFaceEmbeddings
+except Exception:
+    try:
+        from langchain.embeddings import HuggingFaceEmbeddings
+    except Exception:
+        HuggingFaceEmbeddings = None
+
+from core.config import settings
+
+Key = Tuple[str, str, Any]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm', 'r') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return 0
+
+
+def _model_bytes(model: Any) -> Optional[int]:
+    """Parameter + buffer bytes of the underlying torch module, when there is one."""
+    module = getattr(model, 'client', None) or getattr(model, '_client', None)
+    if module is None or not hasattr(module, 'parameters'):
+        return None
+    try:
+        total = sum(p.numel() * p.element_size() for p in module.parameters())
+        total += sum(b.numel() * b.element_size() for b in module.buffers())
+        return int(total)
+    except Exception:
+        return None
+
+
+def embedding_provider() -> str:
+    """Configured provider: "ollama" (USE_OLLAMA_EMBEDDINGS), else EMBEDDING_BACKEND ("torch" / "onnx")."""
+    if getattr(settings, 'USE_OLLAMA_EMBEDDINGS', False):
+        return 'ollama'
+    return (getattr(settings, 'EMBEDDING_BACKEND', 'torch') or 'torch').lower()
+
+
+def embedding_model_name(provider: str = None) -> str:
+    if (provider or embedding_provider()) == 'ollama':
+        return getattr(settings, 'OLLAMA_EMBEDDING_MODEL', 'nomic-embed-text')
+    return getattr(settings, 'EMBEDDING_MODEL', '')
+
+
+def _vector_space(provider: str) -> str:
+    # torch et onnx servent le même modèle sentence-transformers (vecteurs compatibles)
+    return 'ollama' if provider == 'ollama' else 'sentence-transformers'
+
+
+class EmbeddingProviderMismatchError(ValueError):
+    """The persisted index was embedded by another provider: it must be rebuilt (reindex)."""
+
+
+def check_index_meta(meta: Dict[str, Any]) -> List[str]:
+    """Raise EmbeddingProviderMismatchError if the index was embedded by another provider; returns non-fatal warnings."""
+    built = meta.get('embedding_provider') or meta.get('embedding_backend') or 'torch'
+    runtime = embedding_provider()
+    if _vector_space(built) != _vector_space(runtime):
+        raise EmbeddingProviderMismatchError(f"Index construit avec le provider d'embeddings '{built}' "
+                         f"({meta.get('embedding_model')}), runtime '{runtime}': reindex nécessaire")
+    warnings = []
+    if meta.get('embedding_model') != embedding_model_name(runtime):
+        warnings.append(f"Mismatch embedding_model meta={meta.get('embedding_model')} != runtime={embedding_model_name(runtime)}")
+    if built != runtime:
+        warnings.append(f"Index construit avec le backend {built}, requêtes via {runtime}")
+    return warnings
+
+
+def embedding_loader(backend: str = None):
+    """Embeddings class for a provider ("torch", "onnx" or "ollama"; default: the configured one)."""
+    backend = (backend or embedding_provider()).lower()
+    if backend == 'ollama':
+        from .ollama_embeddings import OllamaBatchEmbeddings
+        return OllamaBatchEmbeddings
+    if backend == 'onnx':
+        from .onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings
+    if HuggingFaceEmbeddings is None:
+        raise ImportError("HuggingFaceEmbeddings not available. Please install langchain-huggingface.")
+    return HuggingFaceEmbeddings
+
+
+class _Entry:
+    def __init__(self, key: Key):
+        self.key = key
+        self.model = None
+        self.lock = threading.Lock()
+        self.load_seconds = 0.0
+        self.memory_bytes = 0
+        self.loads = 0
+        self.uses = 0
+        self.last_used = 0.0
+
+
+class SharedEmbeddings(Embeddings):
+    """Embeddings handle resolving the registry model at call time."""
+
+    def __init__(self, registry: "EmbeddingModelRegistry", key: Key):
+        self._registry = registry
+        self._key = key
+        self.model_name = key[0]
+
+    def _model(self):
+        return self._registry._acquire(self._key)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._model().embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._model().embed_documents(texts)
+
+    def __call__(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+    def __getattr__(self, name):
+        # Délègue le reste (client, model_kwargs...) au modèle partagé
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._model(), name)
+
+
+class EmbeddingModelRegistry:
+    def __init__(self, idle_seconds: float = None):
+        self._lock = threading.Lock()
+        self._entries: Dict[Key, _Entry] = {}
+        self.idle_seconds = idle_seconds
+        self._reaper: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _default_loader():
+        return embedding_loader()
+
+    def _entry(self, key: Key) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(key)
+            return entry
+
+    def _acquire(self, key: Key):
+        entry = self._entry(key)
+        model = entry.model
+        if model is None:
+            with entry.lock:
+                if entry.model is None:
+                    name, device, loader = key
+                    print(f"🔤 Chargement du modèle d'embeddings {name} ({device})...")
+                    rss0 = _rss_bytes()
+                    t0 = time.perf_counter()
+                    entry.model = loader(model_name=name, model_kwargs={'device': device})
+                    entry.load_seconds = round(time.perf_counter() - t0, 3)
+                    entry.memory_bytes = _model_bytes(entry.model) or max(0, _rss_bytes() - rss0)
+                    entry.loads += 1
+                    print(f"✅ Modèle chargé en {entry.load_seconds}s (~{entry.memory_bytes // (1024 * 1024)} MB)")
+                    self._ensure_reaper()
+                model = entry.model
+        entry.uses += 1
+        entry.last_used = time.time()
+        return model
+
+    def get(self, model_name: str = None, device: str = 'cpu',
+            loader: Callable[..., Any] = None) -> SharedEmbeddings:
+        """Shared handle on (model_name, device); the model is loaded now (errors surface here)."""
+        key = (model_name or embedding_model_name(), device, loader or self._default_loader())
+        self._acquire(key)
+        return SharedEmbeddings(self, key)
+
+    def unload(self, model_name: str = None, device: str = None) -> int:
+        """Drop loaded models matching name/device (all when both are None); returns how many."""
+        count = 0
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            name, dev, _ = entry.key
+            if (model_name and name != model_name) or (device and dev != device):
+                continue
+            with entry.lock:
+                if entry.model is not None:
+                    entry.model = None
+                    count += 1
+        if count:
+            gc.collect()
+        return count
+
+    def unload_idle(self, idle_seconds: float = None) -> List[str]:
+        """Unload models unused for more than `idle_seconds` (EMBED_MODEL_IDLE_SECONDS)."""
+        idle = self._idle_seconds() if idle_seconds is None else idle_seconds
+        if idle <= 0:
+            return []
+        now = time.time()
+        removed = []
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            with entry.lock:
+                if entry.model is not None and now - entry.last_used > idle:
+                    entry.model = None
+                    removed.append(entry.key[0])
+        if removed:
+            gc.collect()
+            print(f"💤 Modèles d'embeddings déchargés (inactifs): {removed}")
+        return removed
+
+    def _idle_seconds(self) -> float:
+        if self.idle_seconds is not None:
+            return self.idle_seconds
+        return float(getattr(settings, 'EMBED_MODEL_IDLE_SECONDS', 0) or 0)
+
+    def _ensure_reaper(self):
+        idle = self._idle_seconds()
+        if idle <= 0 or (self._reaper is not None and self._reaper.is_alive()):
+            return
+
+        def _loop():
+            while any(e.model is not None for e in list(self._entries.values())):
+                time.sleep(max(1.0, min(60.0, idle / 2)))
+                self.unload_idle(idle)
+
+        self._reaper = threading.Thread(target=_loop, name='embedding-reaper', daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.values())
+        return [{
+            "model": e.key[0],
+            "device": e.key[1],
+            "loader": getattr(e.key[2], '__name__', str(e.key[2])),
+            "loaded": e.model is not None,
+            "load_seconds": e.load_seconds,
+            "memory_bytes": e.memory_bytes if e.model is not None else 0,
+            "loads": e.loads,
+            "uses": e.uses,
+            "idle_seconds": round(now - e.last_used, 1) if e.last_used else None,
+        } for e in entries]
+
+
+EMBEDDING_MODELS = EmbeddingModelRegistry()
+
+
+__all__ = [
+    'EmbeddingModelRegistry',
+    'SharedEmbeddings',
+    'EMBEDDING_MODELS',
+    'embedding_loader',
+    'embedding_provider',
+    'embedding_model_name',
+    'check_index_meta',
+    'EmbeddingProviderMismatchError',
+]
@@ -0,0 +1,100 @@
+"""Batched embeddings served by the Ollama process (USE_OLLAMA_EMBEDDINGS).
+
+Offloads encoding to the already-running Ollama container, so API workers do
+not need torch. `OllamaBatchEmbeddings`:
+
+- calls `/api/embed` with many inputs per HTTP request (OLLAMA_EMBED_BATCH_SIZE),
+  falling back to the legacy one-prompt `/api/embeddings` on older servers;
+- reuses a pooled keep-alive `requests.Session` (one connection per concurrent
+  request);
+- sends at most OLLAMA_EMBED_CONCURRENCY requests in parallel when a reindex
+  hands it a large batch (results keep the input order).
+
+The provider ("ollama") and model are recorded in `embedding_meta.json`; a
+runtime configured with another provider refuses to load the index (see
+`model_registry.check_index_meta`).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.config import settings
+
+try:
+    from langchain_core.embeddings import Embeddings
+except Exception:  # pragma: no cover - older langchain
+    from langchain.embeddings.base import Embeddings  # type: ignore
+
+
+class OllamaBatchEmbeddings(Embeddings):
+    """LangChain embeddings over Ollama's batch embed endpoint (registry loader signature)."""
+
+    # Le pipeline de reindex lui confie des lots entiers: découpage et parallélisme gérés ici
+    handles_batching = True
+
+    def __init__(self, model_name: str = None, model_kwargs: Dict[str, Any] = None, base_url: str = None,
+                 batch_size: int = None, concurrency: int = None, timeout: float = None, retries: int = 2):
+        self.model_name = model_name or getattr(settings, 'OLLAMA_EMBEDDING_MODEL', 'nomic-embed-text')
+        self.base_url = (base_url or settings.OLLAMA_HOST).rstrip('/')
+        self.batch_size = max(1, batch_size or getattr(settings, 'OLLAMA_EMBED_BATCH_SIZE', 64))
+        self.concurrency = max(1, concurrency or getattr(settings, 'OLLAMA_EMBED_CONCURRENCY', 2))
+        self.timeout = timeout or getattr(settings, 'OLLAMA_EMBED_TIMEOUT', 120.0)
+        self.retries = max(0, retries)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._legacy = False
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> requests.Response:
+        last = None
+        for attempt in range(self.retries + 1):
+            try:
+                with self._lock:
+                    self.requests_sent += 1
+                return self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+            except requests.ConnectionError as e:
+                last = e
+                time.sleep(0.2 * (2 ** attempt))
+        raise last
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if not self._legacy:
+            resp = self._post('/api/embed', {"model": self.model_name, "input": texts, "truncate": True})
+            if resp.status_code != 404:
+                resp.raise_for_status()
+                vectors = resp.json().get('embeddings') or []
+                if len(vectors) != len(texts):
+                    raise ValueError(f"Ollama a renvoyé {len(vectors)} embeddings pour {len(texts)} textes")
+                return vectors
+            # Ollama < 0.2: pas d'endpoint batch
+            print("⚠️ /api/embed indisponible, repli sur /api/embeddings (un texte par requête)")
+            self._legacy = True
+        out = []
+        for text in texts:
+            resp = self._post('/api/embeddings', {"model": self.model_name, "prompt": text})
+            resp.raise_for_status()
+            out.append(resp.json()['embedding'])
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        batches = [texts[lo:lo + self.batch_size] for lo in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1 or self.concurrency == 1:
+            return [v for b in batches for v in self._embed_batch(b)]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return [v for vectors in pool.map(self._embed_batch, batches) for v in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0]
+
+
+__all__ = ['OllamaBatchEmbeddings']
@@ -0,0 +1,209 @@
+"""ONNX Runtime embedding backend (CPU, optionally int8-quantized).
+
+Selected with EMBEDDING_BACKEND=onnx. The configured sentence-transformers
+model is exported once to ONNX under ONNX_MODEL_DIR/<model>/ (torch is only
+needed for that export), dynamically quantized to int8 when ONNX_QUANTIZE is
+set, and served by onnxruntime with the model's own fast tokenizer
+(`tokenizers`, no torch/transformers import at serving time). Pooling,
+normalization and max sequence length are read from the sentence-transformers
+pipeline at export time and replayed in numpy, so vectors stay in the same
+space as the torch model that built the index.
+
+`parity_report` checks cosine similarity against the torch embeddings and
+`benchmark_qps` measures single-query throughput (see
+rag/scripts/onnx_benchmark.py).
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.config import settings
+
+try:
+    from langchain_core.embeddings import Embeddings
+except Exception:  # pragma: no cover - older langchain
+    from langchain.embeddings.base import Embeddings  # type: ignore
+
+try:
+    import onnxruntime as ort  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    ort = None  # type: ignore
+
+try:
+    from tokenizers import Tokenizer  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    Tokenizer = None  # type: ignore
+
+META_FILE = 'onnx_meta.json'
+FP32_FILE = 'model.onnx'
+INT8_FILE = 'model.int8.onnx'
+
+
+def model_dir(model_name: str = None) -> str:
+    name = model_name or getattr(settings, 'EMBEDDING_MODEL', '')
+    return os.path.join(getattr(settings, 'ONNX_MODEL_DIR', './data/models/onnx'), name.replace('/', '__'))
+
+
+def export_onnx(model_name: str = None, out_dir: str = None, quantize: bool = None) -> str:
+    """Export the sentence-transformers model (+ tokenizer, pooling config) to ONNX; returns the directory."""
+    from sentence_transformers import SentenceTransformer  # type: ignore
+    import torch  # type: ignore
+
+    model_name = model_name or getattr(settings, 'EMBEDDING_MODEL', '')
+    out_dir = out_dir or model_dir(model_name)
+    quantize = getattr(settings, 'ONNX_QUANTIZE', True) if quantize is None else quantize
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"📦 Export ONNX de {model_name} vers {out_dir}...")
+
+    st = SentenceTransformer(model_name, device='cpu')
+    transformer = st[0]
+    tokenizer = transformer.tokenizer
+    pooling = next((m for m in st if type(m).__name__ == 'Pooling'), None)
+    mode = 'mean'
+    if pooling is not None and getattr(pooling, 'pooling_mode_cls_token', False):
+        mode = 'cls'
+    elif pooling is not None and getattr(pooling, 'pooling_mode_max_tokens', False):
+        mode = 'max'
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["exemple de produit"], return_tensors='pt')
+    input_names = [n for n in ('input_ids', 'attention_mask', 'token_type_ids') if n in sample]
+    axes = {n: {0: 'batch', 1: 'seq'} for n in input_names + ['last_hidden_state']}
+    model = transformer.auto_model.eval()
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[n] for n in input_names), os.path.join(out_dir, FP32_FILE),
+                          input_names=input_names, output_names=['last_hidden_state'],
+                          dynamic_axes=axes, opset_version=14)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic  # type: ignore
+        quantize_dynamic(os.path.join(out_dir, FP32_FILE), os.path.join(out_dir, INT8_FILE),
+                         weight_type=QuantType.QInt8)
+
+    meta = {
+        "model_name": model_name,
+        "pooling": mode,
+        "normalize": any(type(m).__name__ == 'Normalize' for m in st),
+        "max_seq_length": int(st.max_seq_length or 512),
+        "input_names": input_names,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": bool(quantize),
+    }
+    with open(os.path.join(out_dir, META_FILE), 'w', encoding='utf-8') as fh:
+        json.dump(meta, fh, ensure_ascii=False, indent=2)
+    print(f"✅ Export ONNX terminé (pooling={mode}, int8={bool(quantize)})")
+    return out_dir
+
+
+def pool_embeddings(hidden: np.ndarray, mask: np.ndarray, mode: str = 'mean',
+                    normalize: bool = False) -> np.ndarray:
+    """Sentence-transformers pooling of token states (batch, seq, dim) -> (batch, dim)."""
+    if mode == 'cls':
+        out = hidden[:, 0]
+    elif mode == 'max':
+        masked = np.where(mask[:, :, None] > 0, hidden, -1e9)
+        out = masked.max(axis=1)
+    else:
+        m = mask[:, :, None].astype(hidden.dtype)
+        out = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+    if normalize:
+        out = out / np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+    return out.astype(np.float32)
+
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain embeddings served by onnxruntime (registry loader signature)."""
+
+    def __init__(self, model_name: str = None, model_kwargs: Dict[str, Any] = None,
+                 model_path: str = None, quantized: bool = None, threads: int = None):
+        if ort is None or Tokenizer is None:
+            raise ImportError("onnxruntime and tokenizers are required for EMBEDDING_BACKEND=onnx")
+        self.model_name = model_name or getattr(settings, 'EMBEDDING_MODEL', '')
+        self.model_path = model_path or model_dir(self.model_name)
+        if not os.path.isfile(os.path.join(self.model_path, META_FILE)):
+            export_onnx(self.model_name, self.model_path, quantized)
+        with open(os.path.join(self.model_path, META_FILE), 'r', encoding='utf-8') as fh:
+            self.meta = json.load(fh)
+        quantized = self.meta.get('quantized', False) if quantized is None else quantized
+        onnx_file = os.path.join(self.model_path, INT8_FILE if quantized else FP32_FILE)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_path, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=int(self.meta.get('max_seq_length', 512)))
+        self.tokenizer.enable_padding(pad_id=int(self.meta.get('pad_token_id') or 0),
+                                      pad_token=self.meta.get('pad_token') or '[PAD]')
+        opts = ort.SessionOptions()
+        threads = threads if threads is not None else getattr(settings, 'ONNX_THREADS', 0)
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_file, sess_options=opts, providers=['CPUExecutionProvider'])
+        self.quantized = bool(quantized)
+        self.batch_size = max(1, getattr(settings, 'EMBED_BATCH_SIZE', 64))
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(list(texts))
+        feeds = {
+            'input_ids': np.array([e.ids for e in enc], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in enc], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in enc], dtype=np.int64),
+        }
+        inputs = {n: feeds[n] for n in self.meta.get('input_names', feeds.keys())}
+        hidden = self.session.run(None, inputs)[0]
+        return pool_embeddings(hidden, feeds['attention_mask'], self.meta.get('pooling', 'mean'),
+                               bool(self.meta.get('normalize')))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        out: List[List[float]] = []
+        for lo in range(0, len(texts), self.batch_size):
+            out.extend(self._encode(texts[lo:lo + self.batch_size]).tolist())
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def parity_report(reference, candidate, texts: Sequence[str], threshold: float = None) -> Dict[str, Any]:
+    """Cosine similarity between two backends' embeddings of the same texts."""
+    threshold = getattr(settings, 'ONNX_PARITY_MIN_COSINE', 0.98) if threshold is None else threshold
+    a = np.asarray(reference.embed_documents(list(texts)), dtype=np.float32)
+    b = np.asarray(candidate.embed_documents(list(texts)), dtype=np.float32)
+    cos = (a * b).sum(axis=1) / np.clip(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12, None)
+    worst = int(np.argmin(cos)) if len(cos) else -1
+    return {
+        "n": int(len(cos)),
+        "min_cosine": round(float(cos.min()), 5) if len(cos) else None,
+        "mean_cosine": round(float(cos.mean()), 5) if len(cos) else None,
+        "worst_text": texts[worst][:120] if worst >= 0 else None,
+        "threshold": threshold,
+        "ok": bool(len(cos) and cos.min() >= threshold),
+    }
+
+
+def benchmark_qps(embeddings, queries: Sequence[str], warmup: int = 3) -> Dict[str, Any]:
+    """Single-query throughput (one embed_query per request, as in /search)."""
+    for q in list(queries)[:warmup]:
+        embeddings.embed_query(q)
+    t0 = time.perf_counter()
+    for q in queries:
+        embeddings.embed_query(q)
+    elapsed = time.perf_counter() - t0
+    return {
+        "queries": len(queries),
+        "seconds": round(elapsed, 4),
+        "qps": round(len(queries) / elapsed, 2) if elapsed > 0 else None,
+        "ms_per_query": round(elapsed * 1000 / max(1, len(queries)), 3),
+    }
+
+
+__all__ = [
+    'OnnxEmbeddings',
+    'export_onnx',
+    'model_dir',
+    'pool_embeddings',
+    'parity_report',
+    'benchmark_qps',
+]
@@ -0,0 +1,256 @@
+"""Direct product lookup for synthetic profiles (used by /evaluate).
+
+`/evaluate` used to find the synthetic profile of the described product by
+scanning the top-k dense hits for `product_id`s, fuzzy substring checks of
+every id against every description token, then extra BM25 / dense searches
+when nothing matched. `ProductIndex` is built at index time from the chunks
+carrying `synthetic` / `product_id` metadata (data/raw/synthetic_profiles) and
+the product names of `synthetic_products_env_metrics.json`:
+
+- `exact`: normalized product_id / name -> product_id,
+- `tokens`: analyzed name / id tokens -> product_ids (IDF weight, 1.0 = distinctive),
+- `trigrams`: character trigrams -> tokens (plural variants, typos),
+- `products`: product_id -> chunk docstore ids, in index order.
+
+`resolve(description)` is one dictionary pass plus a trigram lookup for unknown
+tokens; the matched chunks are read from the docstore without any search.
+Persisted as `product_index.json` next to the FAISS index.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.config import settings
+from core.scoring import fold_text
+from .hybrid import analyze
+
+PRODUCT_INDEX_FILE = 'product_index.json'
+PRODUCT_METRICS_FILE = 'synthetic_products_env_metrics.json'
+TRIGRAM_MIN_SIMILARITY = 0.5
+EXACT_MIN_LEN = 5  # clé exacte trop courte: sous-chaîne de n'importe quelle description
+
+_TITLE_RE = re.compile(r"Profil environnemental\s*[–-]\s*(.+)")
+
+
+def norm_id(text: str) -> str:
+    """Accent-folded alphanumeric form (same as routes.evaluate._norm_token)."""
+    return re.sub(r"[^a-z0-9]+", "", fold_text(str(text or '')))
+
+
+def _trigrams(token: str) -> set:
+    padded = f"#{token}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def load_product_names(json_dir: str = None) -> Dict[str, str]:
+    """product_id -> display name from synthetic_products_env_metrics.json ({} if absent)."""
+    path = os.path.join(json_dir or settings.JSON_DIR, PRODUCT_METRICS_FILE)
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            data = json.load(fh)
+    except Exception as e:
+        print(f"⚠️ Lecture {PRODUCT_METRICS_FILE} échouée: {e}")
+        return {}
+    return {p['id']: p.get('name') or p['id'] for p in data.get('products', []) if p.get('id')}
+
+
+class ProductMatch:
+    """Resolved product: id, how it matched, score and chunk docstore ids."""
+
+    def __init__(self, product_id: str, method: str, score: float, chunk_ids: List[str]):
+        self.product_id = product_id
+        self.method = method
+        self.score = score
+        self.chunk_ids = chunk_ids
+
+    def as_dict(self) -> dict:
+        return {"product_id": self.product_id, "method": self.method, "score": round(self.score, 3),
+                "chunks": len(self.chunk_ids)}
+
+
+class ProductIndex:
+    """Product id / name tokens / trigrams -> synthetic profile chunk ids."""
+
+    def __init__(self, products: Dict[str, dict]):
+        self.products = products
+        self.exact: Dict[str, str] = {}
+        self.tokens: Dict[str, Dict[str, float]] = {}
+        self.trigrams: Dict[str, set] = {}
+        token_sets = {}
+        for pid, info in products.items():
+            self.exact[norm_id(pid)] = pid
+            if info.get('name'):
+                self.exact.setdefault(norm_id(info['name']), pid)
+            token_sets[pid] = set(analyze(pid.replace('_', ' ') + ' ' + (info.get('name') or '')))
+        n = len(products)
+        df: Dict[str, int] = {}
+        for toks in token_sets.values():
+            for t in toks:
+                df[t] = df.get(t, 0) + 1
+        max_idf = math.log(1.0 + n) if n else 1.0
+        for pid, toks in token_sets.items():
+            for t in toks:
+                # IDF normalisé: jeton propre à un produit = 1.0, partagé (ex: "vegetal") < 1.0
+                self.tokens.setdefault(t, {})[pid] = math.log(1.0 + n / df[t]) / max_idf
+        for t in self.tokens:
+            for g in _trigrams(t):
+                self.trigrams.setdefault(g, set()).add(t)
+        # Clés exactes testées de la plus longue à la plus courte ("yaourt_soja" avant "yaourt")
+        self._exact_keys = sorted((k for k in self.exact if len(k) >= EXACT_MIN_LEN), key=lambda k: (-len(k), k))
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, dict, str]], names: Dict[str, str] = None) -> "ProductIndex":
+        """`chunks`: (docstore_id, metadata, text) in index order; only synthetic chunks are kept."""
+        names = dict(names or {})
+        products: Dict[str, dict] = {}
+        for doc_id, meta, text in chunks:
+            meta = meta or {}
+            pid = meta.get('product_id')
+            if not meta.get('synthetic') or not pid:
+                continue
+            entry = products.setdefault(pid, {"name": names.get(pid), "chunk_ids": []})
+            entry["chunk_ids"].append(doc_id)
+            if not entry["name"]:
+                title = _TITLE_RE.search(text or '')
+                if title:
+                    entry["name"] = title.group(1).strip()
+        return cls(products)
+
+    @classmethod
+    def from_vectorstore(cls, vectordb, names: Dict[str, str] = None) -> Optional["ProductIndex"]:
+        mapping = getattr(vectordb, 'index_to_docstore_id', None)
+        docstore = getattr(vectordb, 'docstore', None)
+        if mapping is None or docstore is None:
+            return None
+
+        def _chunks():
+            for pos in sorted(mapping):
+                doc = docstore.search(mapping[pos])
+                if doc is None or isinstance(doc, str):
+                    continue
+                yield mapping[pos], doc.metadata, doc.page_content
+        return cls.build(_chunks(), load_product_names() if names is None else names)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _fuzzy(self, token: str) -> List[Tuple[str, float]]:
+        """Known tokens sharing enough trigrams with `token` -> [(token, jaccard)]."""
+        grams = _trigrams(token)
+        counts: Dict[str, int] = {}
+        for g in grams:
+            for cand in self.trigrams.get(g, ()):
+                counts[cand] = counts.get(cand, 0) + 1
+        out = []
+        for cand, inter in counts.items():
+            sim = inter / float(len(grams) + len(_trigrams(cand)) - inter)
+            if sim >= TRIGRAM_MIN_SIMILARITY:
+                out.append((cand, sim))
+        return out
+
+    def resolve(self, description: str, min_score: float = None) -> Optional[ProductMatch]:
+        """Best product for a free-text description (None below `min_score`)."""
+        if not self.products:
+            return None
+        normalized = norm_id(description)
+        for key in self._exact_keys:
+            if key in normalized:
+                pid = self.exact[key]
+                return ProductMatch(pid, 'exact', float('inf'), list(self.products[pid]['chunk_ids']))
+        min_score = getattr(settings, 'EVAL_PRODUCT_MIN_SCORE', 0.8) if min_score is None else min_score
+        scores: Dict[str, Dict[str, float]] = {}
+        for tok in set(analyze(description)):
+            hits = [(tok, 1.0)] if tok in self.tokens else self._fuzzy(tok)
+            for known, sim in hits:
+                for pid, weight in self.tokens[known].items():
+                    # Un jeton produit ne compte qu'une fois (meilleure similarité)
+                    best = scores.setdefault(pid, {})
+                    best[known] = max(best.get(known, 0.0), weight * sim)
+        if not scores:
+            return None
+        pid, matched = max(scores.items(), key=lambda kv: (sum(kv[1].values()), kv[0]))
+        score = sum(matched.values())
+        if score < min_score:
+            return None
+        return ProductMatch(pid, 'tokens', score, list(self.products[pid]['chunk_ids']))
+
+    def save(self, persist_path: str):
+        with open(os.path.join(persist_path, PRODUCT_INDEX_FILE), 'w', encoding='utf-8') as fh:
+            json.dump({"products": self.products}, fh, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, persist_path: str) -> Optional["ProductIndex"]:
+        path = os.path.join(persist_path, PRODUCT_INDEX_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as fh:
+            return cls(json.load(fh)["products"])
+
+
+# vectordb -> (ntotal, ProductIndex) ; reconstruit si l'index change de taille
+_INDEXES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _ntotal(vectordb) -> int:
+    index = getattr(vectordb, 'index', None)
+    return int(index.ntotal) if index is not None else -1
+
+
+def register(vectordb, product_index: Optional[ProductIndex]):
+    """Attach a persisted ProductIndex to a loaded vectorstore."""
+    if product_index is not None:
+        with _lock:
+            _INDEXES[vectordb] = (_ntotal(vectordb), product_index)
+
+
+def product_index_for(vectordb) -> Optional[ProductIndex]:
+    """ProductIndex of `vectordb` (registered at load time, else built from the docstore)."""
+    cached = _INDEXES.get(vectordb)
+    if cached is not None and cached[0] == _ntotal(vectordb):
+        return cached[1]
+    with _lock:
+        cached = _INDEXES.get(vectordb)
+        if cached is None or cached[0] != _ntotal(vectordb):
+            built = ProductIndex.from_vectorstore(vectordb)
+            if built is None:
+                return None
+            cached = (_ntotal(vectordb), built)
+            _INDEXES[vectordb] = cached
+    return cached[1]
+
+
+def lookup_product(description: str, vectordbs: Iterable) -> Tuple[Optional[ProductMatch], List]:
+    """Resolve the product over several indexes -> (match, its chunks read from the docstore)."""
+    for vectordb in vectordbs:
+        index = product_index_for(vectordb)
+        match = index.resolve(description) if index is not None else None
+        if match is None:
+            continue
+        docs = []
+        for doc_id in match.chunk_ids:
+            doc = vectordb.docstore.search(doc_id)
+            if doc is not None and not isinstance(doc, str):
+                docs.append(doc)
+        if docs:
+            return match, docs
+    return None, []
+
+
+__all__ = [
+    'ProductIndex',
+    'ProductMatch',
+    'PRODUCT_INDEX_FILE',
+    'load_product_names',
+    'lookup_product',
+    'product_index_for',
+    'register',
+]
@@ -1,7 +1,8 @@
 from langchain.chains import RetrievalQA
+from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.prompts import PromptTemplate
 from core.ollama_client import get_llm
-from typing import Any, Dict
+from typing import Any, Dict, List
 import os
 
 PROMPTS_DIR = os.path.join(os.path.dirname(__file__), 'prompts')
@@ -162,4 +163,21 @@ def build_rag_chain(vectordb, llm=None, k: int = 8, debug: bool = False):
     return QAWithDebug(qa_chain, vectordb, retriever, k, debug)
 
 
+def build_stuff_chain(llm=None):
+    """
+    Chaîne "stuff" sans retriever: le LLM répond à partir des documents fournis.
+
+    Utilisée par /ask, qui a déjà filtré (métadonnées), fusionné (hybride) et reranké
+    ses documents: la chaîne ne relance pas de recherche.
+    """
+    if llm is None:
+        llm = get_llm()
+    qa_prompt = PromptTemplate.from_template(_load_prompt('analysis_v1.txt'))
+    return create_stuff_documents_chain(llm, qa_prompt, document_variable_name="context")
+
+
+def answer_from_documents(chain, question: str, docs: List[Any]) -> Dict[str, Any]:
+    """Run `build_stuff_chain` on `docs`; same keys as RetrievalQA (result, source_documents)."""
+    answer = chain.invoke({"context": list(docs), "question": question})
+    return {"query": question, "result": answer, "source_documents": list(docs)}
 
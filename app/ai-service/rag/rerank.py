@@ -3,20 +3,33 @@
 Strategy (MVP):
 1. Retrieve an initial candidate set (k_initial) from the vector store.
 2. (Optional) Apply a source/type filter driven by user param (e.g. pdf,csv,html).
-3. Re-score each candidate with a secondary similarity: cosine(question_embedding, doc_embedding).
-   - Uses the same embedding model as the vector index when available.
-   - Falls back gracefully to the original order if embeddings not available.
+3. Re-score each candidate: cosine(question_embedding, doc_embedding) plus cheap
+   signals that actually change the dense order:
+   - lexical overlap between question and chunk tokens (accent-folded),
+   - per-type source weights (RERANK_SOURCE_WEIGHTS),
+   - boost for the synthetic profile of the matched product.
+   Doc vectors are read back from the FAISS index (no encoder work); only
+   chunks not found in the index are re-embedded.
 4. Return the top `top_n` documents in descending score order.
 
-This is intentionally simple (single-stage rerank) so we can iterate later:
-- Future: cross-encoder / miniLM reranker, LLM-based judge, hybrid sparse + dense fusion.
+Backends (RERANK_BACKEND):
+- `bi_encoder` (default): cosine + signals above.
+- `cross_encoder`: batched multilingual cross-encoder under a per-request ms
+  budget (see `rag/cross_encoder.py`), falling back to `bi_encoder` when the
+  model is unavailable.
+- Future: LLM-based judge, hybrid sparse + dense fusion.
 
-All heavy resources (embedding model) are lazy-loaded and cached at module level.
+The embedding model is the process-wide shared instance (see `rag/model_registry.py`).
 """
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import math
+import re
+import time
+import weakref
+
+import numpy as np
 
 try:  # Prefer community package
     from langchain.schema import Document
@@ -29,15 +42,11 @@ except Exception:  # pragma: no cover
                 self.page_content = page_content
                 self.metadata = metadata or {}
 
-try:
-    from langchain_huggingface import HuggingFaceEmbeddings  # type: ignore
-except Exception:  # pragma: no cover
-    try:
-        from langchain.embeddings import HuggingFaceEmbeddings  # type: ignore
-    except Exception:  # pragma: no cover
-        HuggingFaceEmbeddings = None  # type: ignore
-
 from core.config import settings
+from core.scoring import batched_cosine, fold_text, token_hashes, top_k
+from .embeddings import with_query_cache
+from .cross_encoder import CROSS_ENCODER
+from .model_registry import EMBEDDING_MODELS
 
 _EMBEDDINGS = None  # lazy singleton
 
@@ -46,13 +55,9 @@ def _get_embeddings():  # pragma: no cover - trivial accessor
     global _EMBEDDINGS
     if _EMBEDDINGS is not None:
         return _EMBEDDINGS
-    if HuggingFaceEmbeddings is None:
-        return None
     try:
-        _EMBEDDINGS = HuggingFaceEmbeddings(
-            model_name=getattr(settings, 'EMBEDDING_MODEL', None),
-            model_kwargs={"device": "cpu"},
-        )
+        # Même modèle que l'index (registre partagé); requêtes mémoïsées: déjà encodées par la recherche FAISS
+        _EMBEDDINGS = with_query_cache(EMBEDDING_MODELS.get())
     except Exception as e:  # fallback to None
         print(f"⚠️ Rerank embeddings init failed: {e}")
         _EMBEDDINGS = None
@@ -60,6 +65,7 @@ def _get_embeddings():  # pragma: no cover - trivial accessor
 
 
 def _cosine(a: List[float], b: List[float]) -> float:
+    # Référence scalaire (benchmark); le rerank utilise core.scoring.batched_cosine
     if not a or not b or len(a) != len(b):
         return 0.0
     num = 0.0
@@ -74,6 +80,75 @@ def _cosine(a: List[float], b: List[float]) -> float:
     return num / math.sqrt(da * db)
 
 
+def _fold_tokens(text: str) -> set:
+    return {t for t in re.findall(r"[a-z0-9]+", fold_text(text)) if len(t) > 2}
+
+
+def _norm_pid(pid) -> str:
+    # même normalisation que routes.evaluate._norm_token
+    return re.sub(r"[^a-z0-9]+", "", fold_text(str(pid))) if pid else ""
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in (raw or "").split(','):
+        if '=' not in part:
+            continue
+        k, v = part.split('=', 1)
+        try:
+            weights[k.strip().lower()] = float(v)
+        except ValueError:
+            continue
+    return weights
+
+
+# vectordb -> (ntotal, {id(doc)|docstore_id: position}) ; recalculé si l'index change de taille
+_POSITION_MAPS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _index_positions(vectordb) -> Dict:
+    index = getattr(vectordb, 'index', None)
+    mapping = getattr(vectordb, 'index_to_docstore_id', None)
+    docstore = getattr(getattr(vectordb, 'docstore', None), '_dict', None)
+    if index is None or mapping is None or docstore is None:
+        return {}
+    cached = _POSITION_MAPS.get(vectordb)
+    if cached is not None and cached[0] == index.ntotal:
+        return cached[1]
+    positions: Dict = {}
+    for pos, doc_id in mapping.items():
+        positions[doc_id] = pos
+        doc = docstore.get(doc_id)
+        if doc is not None:
+            positions[id(doc)] = pos
+    _POSITION_MAPS[vectordb] = (index.ntotal, positions)
+    return positions
+
+
+def _stored_vectors(vectordb, docs: List[Document]) -> List[Optional[np.ndarray]]:
+    """Vectors of `docs` reconstructed from the FAISS index (None when unavailable)."""
+    if vectordb is None:
+        return [None] * len(docs)
+    positions = _index_positions(vectordb)
+    # Docstore SQLite: pas de _dict en mémoire, position retrouvée par id
+    position_of = getattr(getattr(vectordb, 'index_to_docstore_id', None), 'position_of', None)
+    out: List[Optional[np.ndarray]] = []
+    for d in docs:
+        pos = positions.get(id(d))
+        if pos is None and getattr(d, 'id', None):
+            pos = positions.get(d.id)
+            if pos is None and position_of is not None:
+                pos = position_of(d.id)
+        vec = None
+        if pos is not None:
+            try:
+                vec = vectordb.index.reconstruct(int(pos))
+            except Exception:  # ex: IVF sans direct map
+                vec = None
+        out.append(vec)
+    return out
+
+
 def filter_documents_by_type(docs: List[Document], allowed_types: List[str]) -> List[Document]:
     allowed = set(t.strip().lower() for t in allowed_types if t.strip())
     if not allowed:
@@ -82,14 +157,88 @@ def filter_documents_by_type(docs: List[Document], allowed_types: List[str]) ->
     return filtered or docs  # never return empty if original non-empty (fallback)
 
 
-def rerank_documents(question: str, docs: List[Document], top_n: int = 3) -> Tuple[List[Document], List[Tuple[int, float]]]:
-    """Return (top_docs, score_tuples) after similarity rerank.
+def _adjust_scores(scores: np.ndarray, docs: List[Document], question: str,
+                   product_id: Optional[str], lexical: bool = True) -> np.ndarray:
+    """Add lexical overlap / source weights and apply the synthetic product boost."""
+    lexical_w = getattr(settings, 'RERANK_LEXICAL_WEIGHT', 0.0) if lexical else 0.0
+    source_w = _parse_weights(getattr(settings, 'RERANK_SOURCE_WEIGHTS', ''))
+    synthetic_boost = getattr(settings, 'RERANK_SYNTHETIC_BOOST', 0.0)
+    target_pid = _norm_pid(product_id)
+
+    q_hashes = token_hashes(list(_fold_tokens(question))) if lexical_w else None
+    if q_hashes is not None and q_hashes.size:
+        overlaps = np.array([
+            np.isin(q_hashes, token_hashes(list(_fold_tokens(d.page_content[:3000])))).mean()
+            for d in docs
+        ])
+        scores = scores + lexical_w * overlaps
+    if source_w:
+        scores = scores + np.array([source_w.get(str(d.metadata.get('type', '')).lower(), 0.0) for d in docs])
+    if target_pid:
+        boosted = np.array([
+            bool(d.metadata.get('synthetic')) and _norm_pid(d.metadata.get('product_id')) == target_pid
+            for d in docs
+        ])
+        scores = np.where(boosted, scores * (1.0 + synthetic_boost), scores)
+    return scores
+
+
+def _cross_encoder_rerank(question: str, docs: List[Document], top_n: int, product_id: Optional[str],
+                          budget_ms: Optional[float], stats: Optional[dict]):
+    start = time.perf_counter()
+    raw, exhausted = CROSS_ENCODER.score(question, [d.page_content for d in docs], budget_ms=budget_ms)
+    scored_idx = [i for i, sc in enumerate(raw) if sc is not None]
+    unscored_idx = [i for i, sc in enumerate(raw) if sc is None]
+    # logits -> [0,1] pour que poids de source / boost restent comparables au mode cosine
+    probs = 1.0 / (1.0 + np.exp(-np.array([raw[i] for i in scored_idx], dtype=np.float64)))
+    adjusted = _adjust_scores(probs, [docs[i] for i in scored_idx], question, product_id, lexical=False)
+    order = [scored_idx[j] for j in top_k(adjusted, len(scored_idx))] + unscored_idx
+    by_idx = {scored_idx[j]: float(adjusted[j]) for j in range(len(scored_idx))}
+    scored = [(i, by_idx.get(i)) for i in order]
+    if stats is not None:
+        stats.update({
+            "backend": "cross_encoder",
+            "scored": len(scored_idx),
+            "budget_ms": budget_ms,
+            "budget_exhausted": exhausted,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+    return [docs[i] for i in order[:top_n]], scored
+
+
+def rerank_cache_tag(rerank: bool, budget_ms: Optional[float] = None) -> str:
+    """Cache-key part of a rerank request: backend, plus the explicit budget (cross-encoder ranking depends on it)."""
+    if not rerank:
+        return ''
+    tag = getattr(settings, 'RERANK_BACKEND', 'bi_encoder')
+    return f"{tag}@{budget_ms:g}ms" if budget_ms is not None else tag
+
+
+def rerank_documents(question: str, docs: List[Document], top_n: int = 3, vectordb=None,
+                     product_id: Optional[str] = None, budget_ms: Optional[float] = None,
+                     stats: Optional[dict] = None) -> Tuple[List[Document], List[Tuple[int, Optional[float]]]]:
+    """Return (top_docs, score_tuples) after rerank.
 
-    score_tuples: list of (original_index, cosine_score) sorted descending.
+    score_tuples: list of (original_index, score) sorted descending; with the
+    cross-encoder backend, candidates left unscored by the budget come last
+    (FAISS order) with score None.
+    `vectordb`: index the docs come from (vectors reused instead of re-embedded).
+    `product_id`: synthetic product matched upstream; its chunks get RERANK_SYNTHETIC_BOOST.
+    `budget_ms`: cross-encoder latency budget (default RERANK_CE_BUDGET_MS).
+    `stats`: optional dict filled with backend / timing details for debug output.
     Falls back to original order if embeddings unavailable.
     """
     if top_n <= 0:
         return [], []
+    if getattr(settings, 'RERANK_BACKEND', 'bi_encoder') == 'cross_encoder' and CROSS_ENCODER.available():
+        if budget_ms is None:
+            budget_ms = getattr(settings, 'RERANK_CE_BUDGET_MS', None)
+        try:
+            return _cross_encoder_rerank(question, docs, top_n, product_id, budget_ms, stats)
+        except Exception as e:  # pragma: no cover - robustness fallback
+            print(f"⚠️ Cross-encoder rerank failure, fallback bi-encoder: {e}")
+    if stats is not None:
+        stats["backend"] = "bi_encoder"
     embeddings = _get_embeddings()
     if embeddings is None:
         # Fallback: keep original order, assign descending pseudo-scores
@@ -100,16 +249,18 @@ def rerank_documents(question: str, docs: List[Document], top_n: int = 3) -> Tup
 
     try:
         q_emb = embeddings.embed_query(question)
-        # Truncate doc content to reduce embedding cost (long tail often redundant)
-        contents = [d.page_content[:1500] for d in docs]
-        d_embs = embeddings.embed_documents(contents)
-        scored = []
-        for idx, emb in enumerate(d_embs):
-            score = _cosine(q_emb, emb)
-            scored.append((idx, score))
-        scored.sort(key=lambda x: x[1], reverse=True)
-        ordered_docs = [docs[i] for i, _ in scored]
-        return ordered_docs[:top_n], scored
+        d_embs = _stored_vectors(vectordb, docs)
+        missing = [i for i, v in enumerate(d_embs) if v is None]
+        if missing:
+            # Truncate doc content to reduce embedding cost (long tail often redundant)
+            contents = [docs[i].page_content[:1500] for i in missing]
+            for i, emb in zip(missing, embeddings.embed_documents(contents)):
+                d_embs[i] = emb
+        scores = batched_cosine(q_emb, np.asarray(d_embs, dtype=np.float32)).astype(np.float64)
+        scores = _adjust_scores(scores, docs, question, product_id)
+        order = top_k(scores, len(docs))
+        scored = [(int(i), float(scores[i])) for i in order]
+        return [docs[i] for i in order[:top_n]], scored
     except Exception as e:  # pragma: no cover - robustness fallback
         print(f"⚠️ Rerank failure, using original order: {e}")
         scored = list((i, 0.0) for i in range(len(docs)))
@@ -117,6 +268,7 @@ def rerank_documents(question: str, docs: List[Document], top_n: int = 3) -> Tup
 
 
 __all__ = [
+    'rerank_cache_tag',
     'rerank_documents',
     'filter_documents_by_type'
 ]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""recall@k vs latency report of the FAISS index types against exact flat search.
+
+Uses the exact vectors of the active index (flat index or its `flat.faiss`
+sidecar). Queries are stored vectors perturbed with gaussian noise, so no
+embedding model is needed.
+
+Usage:
+  .venv/bin/python rag/scripts/ann_report.py [--persist-dir ./data/faiss/main_index] [--k 5] [--queries 200]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+from core.config import settings
+from rag.ann import INDEX_TYPES, load_flat_sidecar, flat_vectors, recall_report
+from rag.index_versions import active_index_dir
+
+try:
+    import faiss  # type: ignore
+except Exception:
+    faiss = None
+
+
+def load_vectors(persist_dir):
+    index_path = os.path.join(active_index_dir(persist_dir), 'faiss_index')
+    flat = load_flat_sidecar(index_path)
+    if flat is None:
+        flat = faiss.read_index(os.path.join(index_path, 'index.faiss'))
+    return flat_vectors(flat)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--persist-dir', default=os.path.join(settings.FAISS_DIR, 'main_index'))
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--types', default=','.join(INDEX_TYPES))
+    args = parser.parse_args()
+
+    if faiss is None:
+        print('faiss not available')
+        sys.exit(2)
+    vectors = load_vectors(args.persist_dir)
+    rng = np.random.default_rng(0)
+    picks = rng.choice(vectors.shape[0], size=min(args.queries, vectors.shape[0]), replace=False)
+    queries = vectors[picks] + rng.normal(0, args.noise, size=(len(picks), vectors.shape[1])).astype(np.float32)
+    configs = [{'type': t.strip()} for t in args.types.split(',') if t.strip()]
+    rows = recall_report(vectors, queries, k=args.k, configs=configs)
+
+    print(f"{len(vectors)} vecteurs, dim={vectors.shape[1]}, {len(picks)} requêtes, k={args.k}")
+    print(f"{'type':<8}{'recall@k':>10}{'ms/query':>10}{'build s':>9}{'MB':>8}")
+    for r in rows:
+        print(f"{r['config']['type']:<8}{r['recall_at_k']:>10.3f}{r['latency_ms']:>10.3f}"
+              f"{r['build_seconds']:>9.2f}{r['bytes'] / 1e6:>8.2f}")
+    print(json.dumps(rows, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
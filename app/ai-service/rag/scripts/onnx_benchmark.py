@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Export the embedding model to ONNX, check parity with torch and compare queries/second.
+
+Parity: cosine similarity between torch and ONNX embeddings of the same texts
+(chunks of the active index when available) must stay >= ONNX_PARITY_MIN_COSINE.
+Exit code 1 when it does not, so the check can gate EMBEDDING_BACKEND=onnx.
+
+Usage:
+  .venv/bin/python rag/scripts/onnx_benchmark.py [--no-quantize] [--samples 200] [--queries 200] [--threshold 0.98]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.getcwd())
+from core.config import settings
+from rag.index_versions import active_index_dir
+from rag.model_registry import embedding_loader
+from rag.onnx_embeddings import OnnxEmbeddings, benchmark_qps, export_onnx, model_dir, parity_report
+
+DEFAULT_TEXTS = [
+    "Pizza surgelée quatre fromages",
+    "Sardines à l'huile d'olive en conserve",
+    "Yaourt nature au lait entier bio",
+    "Quel est l'impact carbone d'un steak haché de boeuf ?",
+    "Emballage carton recyclable, origine France",
+    "Lait demi-écrémé UHT brique 1L",
+    "Chocolat noir 70% cacao commerce équitable",
+    "Quelle est la différence entre un score A et un score E ?",
+]
+
+
+def sample_texts(limit):
+    """Chunks of the active index (docstore.sqlite), else a few built-in sentences."""
+    db = os.path.join(active_index_dir(), 'faiss_index', 'docstore.sqlite')
+    if os.path.isfile(db):
+        conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT content FROM docs ORDER BY RANDOM() LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+        if rows:
+            return [r[0] for r in rows]
+    return DEFAULT_TEXTS
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=settings.EMBEDDING_MODEL)
+    parser.add_argument('--no-quantize', action='store_true')
+    parser.add_argument('--re-export', action='store_true')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--threshold', type=float, default=settings.ONNX_PARITY_MIN_COSINE)
+    args = parser.parse_args()
+
+    quantize = not args.no_quantize
+    path = model_dir(args.model)
+    if args.re_export or not os.path.isfile(os.path.join(path, 'onnx_meta.json')):
+        export_onnx(args.model, path, quantize=quantize)
+
+    torch_emb = embedding_loader('torch')(model_name=args.model, model_kwargs={'device': 'cpu'})
+    onnx_emb = OnnxEmbeddings(args.model, model_path=path, quantized=quantize)
+
+    texts = sample_texts(args.samples)
+    parity = parity_report(torch_emb, onnx_emb, texts, threshold=args.threshold)
+    queries = [t[:200] for t in (texts * (args.queries // max(1, len(texts)) + 1))[:args.queries]]
+    bench = {
+        'torch': benchmark_qps(torch_emb, queries),
+        'onnx_int8' if quantize else 'onnx_fp32': benchmark_qps(onnx_emb, queries),
+    }
+
+    print(f"Parité sur {parity['n']} textes: cos min={parity['min_cosine']} moyen={parity['mean_cosine']} "
+          f"(seuil {parity['threshold']}) -> {'OK' if parity['ok'] else 'ÉCHEC'}")
+    for name, row in bench.items():
+        print(f"{name:<10} {row['qps']:>8} req/s  {row['ms_per_query']:>8} ms/req")
+    print(json.dumps({'parity': parity, 'benchmark': bench}, ensure_ascii=False))
+    sys.exit(0 if parity['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
-"""Reindex CLI: load documents and create/persist FAISS index.
+"""Reindex CLI: build a new index version, validate it and make it active.
+
+Incremental by default: only new/changed/removed files are re-embedded, based on
+the manifest stored next to embedding_meta.json. Use --full to rebuild from scratch.
+The new version is written under <persist-dir>/<version>/ and CURRENT is switched
+only after the smoke-check queries pass.
 
 Usage:
-    .venv/bin/python rag/scripts/reindex.py [--persist-dir ./data/faiss/main_index]
+    .venv/bin/python rag/scripts/reindex.py [--persist-dir ./data/faiss/main_index] [--full]
 """
 import argparse
 import os
@@ -9,26 +14,34 @@ import sys
 sys.path.append(os.getcwd())
 
 from core.config import settings
-from rag.loader import load_all_documents
-from rag.vectorstore import create_vectorstore
+from rag.incremental import build_and_activate
 
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('--persist-dir', default=os.path.join(settings.FAISS_DIR, 'main_index'))
     p.add_argument('--batch-size', type=int, default=1024)
+    p.add_argument('--full', action='store_true', help='Full rebuild (ignore manifest)')
+    p.add_argument('--load-workers', type=int, default=None,
+                   help='Processes parsing files in parallel (default: LOAD_WORKERS, 0 = sequential)')
     args = p.parse_args()
 
-    print('Loading documents...')
-    docs = load_all_documents()
-    print(f'Loaded {len(docs)} documents')
-
-    print('Creating vectorstore...')
-    vs = create_vectorstore(docs, persist_path=args.persist_dir, batch_size=args.batch_size)
-    if vs:
-        print('Index created at', args.persist_dir)
+    print('Updating vectorstore...' if not args.full else 'Rebuilding vectorstore...')
+    stats = build_and_activate(full=args.full, root=args.persist_dir, batch_size=args.batch_size,
+                               load_workers=args.load_workers)
+    stats.pop('verification', None)
+    loading = stats.pop('loading', None)
+    if loading:
+        print(f"Loading: {loading['documents']} docs, {len(loading['files'])} files, "
+              f"{loading['workers']} workers, {loading['seconds']}s")
+        for entry in loading['failed']:
+            print('  Failed to load:', entry)
+    print('Reindex stats:', stats)
+    if stats.get('activated'):
+        print('Active index version:', stats['version'])
     else:
-        print('No index created')
+        print('Validation failed, active index unchanged')
+        sys.exit(2)
 
 
 if __name__ == '__main__':
@@ -1,9 +1,11 @@
 """Reindex only synthetic product profiles.
 
 Usage:
-    python -m rag.scripts.reindex_synthetic --persist-dir ./data/faiss/main_index_synth
+    python -m rag.scripts.reindex_synthetic [--persist-dir ./data/faiss/synthetic_index] [--full]
 
-This loads only TXT files under data/raw/synthetic_profiles and builds a FAISS index.
+This loads only TXT files under data/raw/synthetic_profiles and builds the
+`synthetic_index` queried by federated search, as a new validated version
+(incremental unless --full). Same as `POST /api/reindex?index=synthetic_index`.
 """
 import argparse
 import os
@@ -11,39 +13,28 @@ import sys
 sys.path.append(os.getcwd())
 
 from core.config import settings
-from rag.vectorstore import create_vectorstore
-from rag.loader import _load_text_with_tags  # type: ignore
-
-def _gather_synthetic_profiles(base_dir: str):
-    target = os.path.join(base_dir, 'raw', 'synthetic_profiles')
-    files = []
-    if os.path.isdir(target):
-        for fname in os.listdir(target):
-            if fname.endswith('.txt'):
-                files.append(os.path.join(target, fname))
-    return sorted(files)
+from rag.incremental import build_and_activate
+from rag.loader import synthetic_profile_files
 
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('--persist-dir', default=os.path.join(settings.FAISS_DIR, 'synthetic_index'))
     p.add_argument('--batch-size', type=int, default=256)
+    p.add_argument('--full', action='store_true')
     args = p.parse_args()
 
-    profiles = _gather_synthetic_profiles(settings.DATA_DIR)
+    profiles = synthetic_profile_files(settings.DATA_DIR)
     if not profiles:
         print('No synthetic profiles found.')
         return
     print(f'Found {len(profiles)} synthetic profiles')
-    docs = []
-    for pth in profiles:
-        docs.extend(_load_text_with_tags(pth))
-    print(f'Loaded {len(docs)} synthetic documents')
-    vs = create_vectorstore(docs, persist_path=args.persist_dir, batch_size=args.batch_size)
-    if vs:
-        print('Synthetic index created at', args.persist_dir)
+    stats = build_and_activate(full=args.full, root=args.persist_dir, files=profiles, batch_size=args.batch_size)
+    if stats.get('activated'):
+        print('Synthetic index created at', args.persist_dir, '-', stats.get('version'))
     else:
         print('Failed to build synthetic index')
+        sys.exit(2)
 
 if __name__ == '__main__':
     main()
@@ -10,19 +10,19 @@ import sys
 # ensure ai-service package path
 sys.path.append(os.getcwd())
 
-from rag.loader import load_all_documents
+from rag.loader import iter_documents
 from rag.vectorstore import create_vectorstore
 from core.config import settings
 
 
 def main():
-    print('Loading documents...')
-    docs = load_all_documents()
-    print(f'Loaded {len(docs)} documents total')
-
-    print('Creating vectorstore (persist to data/faiss/test_index)...')
+    print('Streaming documents into vectorstore (persist to data/faiss/test_index)...')
     persist_path = os.path.join(settings.FAISS_DIR, 'test_index')
-    vs = create_vectorstore(docs, persist_path=persist_path, batch_size=1024)
+    load_stats = {}
+    vs = create_vectorstore(iter_documents(stats=load_stats), persist_path=persist_path, batch_size=1024)
+    print(f"Loaded {load_stats.get('documents', 0)} documents total in {load_stats.get('seconds', 0)}s")
+    for path in load_stats.get('failed', []):
+        print('  Failed to load:', path)
     if vs is None:
         print('No vectorstore created (no chunks).')
     else:
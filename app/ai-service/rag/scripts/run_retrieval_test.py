@@ -8,6 +8,7 @@ import sys
 sys.path.append(os.getcwd())
 
 from core.config import settings
+from rag.index_store import load_vectorstore
 try:
     from langchain_community.vectorstores import FAISS
 except Exception:
@@ -35,8 +36,8 @@ def load_index(persist_dir):
             model_name=getattr(settings, 'EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'),
             model_kwargs={'device': 'cpu'}
         )
-        # We created this index locally in a previous step; allow local deserialization.
-        vectordb = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+        # mmap + docstore SQLite (ou index.pkl pour un index ancien format)
+        vectordb = load_vectorstore(index_path, embeddings)
         return vectordb
     except Exception as e:
         print('Error loading FAISS index:', e)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Timings of the vectorized scoring helpers against their pure-Python references.
+
+cosine: rerank of --candidates vectors (dim --dim), python loop vs batched_cosine.
+overlap: answer vs --sources chunks, set() version vs overlap_ratio with the
+chunk hash cache cleared before each pass (cold) and then reused (warm).
+Reporting only: timings depend on the machine, nothing is asserted.
+
+Usage:
+  .venv/bin/python rag/scripts/scoring_benchmark.py [--candidates 200] [--dim 384] [--sources 10] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+from core import scoring
+from core.scoring import batched_cosine, overlap_ratio, source_token_hashes
+from rag.rerank import _cosine
+
+
+def timed(fn, repeat, before=None):
+    """(last result, total milliseconds over `repeat` calls); `before` runs untimed before each call."""
+    total = 0.0
+    result = None
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        t0 = time.perf_counter()
+        result = fn()
+        total += time.perf_counter() - t0
+    return result, total * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=int, default=200)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--sources', type=int, default=10)
+    parser.add_argument('--source-tokens', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    q = rng.standard_normal(args.dim).astype(np.float32)
+    mat = rng.standard_normal((args.candidates, args.dim)).astype(np.float32)
+    q_list, mat_list = q.tolist(), mat.tolist()
+    ref, loop_ms = timed(lambda: [_cosine(q_list, row) for row in mat_list], args.repeat)
+    vec, vec_ms = timed(lambda: batched_cosine(q, mat), args.repeat)
+    if not np.allclose(vec, ref, atol=1e-4):
+        print('❌ batched_cosine diverge de la référence')
+        sys.exit(1)
+
+    words = [f"mot{i}" for i in range(3000)]
+    src = [" ".join(random.Random(i).choices(words, k=args.source_tokens)) for i in range(args.sources)]
+    ans = " ".join(random.Random(99).choices(words, k=150)).split()
+
+    def set_version():
+        a_set = set(ans)
+        s_set = set()
+        for s in src:
+            s_set.update(s.lower().split())
+        return round(len(a_set & s_set) / len(a_set), 4)
+
+    def hashed_version():
+        return overlap_ratio(ans, [source_token_hashes(s) for s in src])
+
+    ref_ratio, set_ms = timed(set_version, args.repeat)
+    cold_ratio, cold_ms = timed(hashed_version, args.repeat, before=scoring._chunk_hashes.clear)
+    warm_ratio, warm_ms = timed(hashed_version, args.repeat)
+    if not ref_ratio == cold_ratio == warm_ratio:
+        print('❌ overlap_ratio diverge de la référence')
+        sys.exit(1)
+
+    rows = {
+        'repeat': args.repeat,
+        'cosine': {'loop_ms': round(loop_ms, 3), 'vectorized_ms': round(vec_ms, 3),
+                   'speedup': round(loop_ms / max(vec_ms, 1e-9), 1)},
+        'overlap': {'sets_ms': round(set_ms, 3), 'hashed_cold_ms': round(cold_ms, 3),
+                    'hashed_warm_ms': round(warm_ms, 3),
+                    'cold_speedup': round(set_ms / max(cold_ms, 1e-9), 2)},
+    }
+    print(f"cosine ({args.candidates}x{args.dim}, {args.repeat} passes): loop={loop_ms:.1f}ms "
+          f"vectorized={vec_ms:.2f}ms speedup x{rows['cosine']['speedup']:g}")
+    print(f"overlap ({args.sources} chunks, {args.repeat} passes): sets={set_ms:.2f}ms "
+          f"hashed froid={cold_ms:.2f}ms hashed cache={warm_ms:.2f}ms")
+    print(json.dumps(rows, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,8 @@ import argparse
 
 sys.path.append(os.getcwd())
 from core.config import settings
+from rag.index_versions import active_index_dir
+from rag.index_store import load_vectorstore
 try:
     from langchain_community.vectorstores import FAISS
 except Exception:
@@ -35,6 +37,8 @@ DEFAULT_QUERIES = [
 
 
 def load_index(persist_dir):
+    # Racine versionnée (CURRENT) -> version active
+    persist_dir = active_index_dir(persist_dir)
     index_path = os.path.join(persist_dir, 'faiss_index')
     if not os.path.isdir(index_path):
         print('Index path not found:', index_path)
@@ -46,14 +50,12 @@ def load_index(persist_dir):
         model_name=getattr(settings, 'EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'),
         model_kwargs={'device': 'cpu'}
     )
-    vectordb = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+    vectordb = load_vectorstore(index_path, embeddings)
     return vectordb
 
 
-def run_smoke(persist_dir, queries, k=3):
-    vs = load_index(persist_dir)
-    if vs is None:
-        return 2
+def verify_index(vs, queries, k=3):
+    """Run `queries` against a loaded index -> (all_ok, per-query rows)."""
     results_summary = {}
     overall_ok = True
     for q in queries:
@@ -72,6 +74,14 @@ def run_smoke(persist_dir, queries, k=3):
         except Exception as e:
             results_summary[q] = {'error': str(e)}
             overall_ok = False
+    return overall_ok, results_summary
+
+
+def run_smoke(persist_dir, queries, k=3):
+    vs = load_index(persist_dir)
+    if vs is None:
+        return 2
+    overall_ok, results_summary = verify_index(vs, queries, k=k)
 
     print(json.dumps({'persist_dir': persist_dir, 'k': k, 'results': results_summary}, ensure_ascii=False, indent=2))
     return 0 if overall_ok else 2
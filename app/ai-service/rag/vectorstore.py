@@ -4,6 +4,14 @@ import math
 import os
 import json
 import hashlib
+import uuid
+from .hybrid import BM25Index
+from .metadata_filter import MetadataIndex
+from .product_index import ProductIndex
+from .ann import convert_vectorstore, save_flat_sidecar
+from .index_store import save_vectorstore
+from .embedding_pipeline import EmbeddingPipeline, chunk_batches
+from .model_registry import EMBEDDING_MODELS, embedding_loader, embedding_model_name, embedding_provider
 try:
     # Prefer community/huggingface packages when available
     from langchain_huggingface import HuggingFaceEmbeddings
@@ -18,63 +26,115 @@ try:
 except Exception:
     from langchain.vectorstores import FAISS
 
-def create_vectorstore(docs, persist_path: str = None, batch_size: int = 1024):
-    """Create a FAISS vectorstore from a list of LangChain Documents.
+def get_splitter() -> RecursiveCharacterTextSplitter:
+    """Splitter built from CHUNK_SIZE / CHUNK_OVERLAP (tuned for small models like Phi3:mini)."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=getattr(settings, 'CHUNK_SIZE', 400),
+        chunk_overlap=getattr(settings, 'CHUNK_OVERLAP', 50),
+        separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
+    )
 
-    - Uses chunking parameters from `core.config.settings` (CHUNK_SIZE, CHUNK_OVERLAP).
-    - Batches embedding and adding to FAISS to handle large datasets without OOM.
-    - Optionally persists the index to disk under `persist_path`.
-    """
-    # Count by declared metadata types when available
-    type_counts = {}
-    for d in docs:
-        try:
-            t = d.metadata.get('type')
-        except Exception:
-            t = None
-        type_counts[t or 'unknown'] = type_counts.get(t or 'unknown', 0) + 1
-
-    print(f"📄 Création de la vectorstore à partir de {len(docs)} documents")
-    for k, v in type_counts.items():
-        print(f"   - {k}: {v}")
 
-    chunk_size = getattr(settings, 'CHUNK_SIZE', 400)
-    chunk_overlap = getattr(settings, 'CHUNK_OVERLAP', 50)
+def get_embeddings():
+    """Multilingual embedding model used to build the index (shared instance, see model_registry)."""
+    # USE_OLLAMA_EMBEDDINGS (nomic-embed-text via Ollama) ou EMBEDDING_BACKEND=onnx
+    provider = embedding_provider()
+    if provider != 'torch':
+        return EMBEDDING_MODELS.get(embedding_model_name(provider), device='cpu', loader=embedding_loader(provider))
+    if HuggingFaceEmbeddings is None:
+        raise ImportError("HuggingFaceEmbeddings not available. Please install langchain-huggingface or ensure langchain provides HuggingFaceEmbeddings.")
 
-    # Configure splitter tuned for small models like Phi3:mini
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
+    return EMBEDDING_MODELS.get(
+        getattr(settings, 'EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'),
+        device='cpu', loader=HuggingFaceEmbeddings
     )
 
-    chunks = splitter.split_documents(docs)
-    print(f"✂️ Documents découpés en {len(chunks)} chunks (chunk_size={chunk_size}, overlap={chunk_overlap})")
 
-    # Example chunk metadata preview (helpful for debugging multi-source inputs)
+def save_index(vectordb, persist_path: str, doc_count: int, chunk_count: int, content_hash: str = None):
+    """Persist FAISS index (converted to FAISS_INDEX_TYPE) + BM25 / metadata / product indexes + embedding_meta.json under `persist_path`."""
+    index_path = os.path.join(persist_path, "faiss_index")
     try:
-        sample_meta = [getattr(c, 'metadata', {}) for c in (chunks[:10] or [])]
-        print(f"   (exemple metadata chunks: {sample_meta[:3]})")
-    except Exception:
-        pass
+        # Conversion flat -> type ANN configuré (entraînement ici); l'index exact est conservé à côté
+        flat_index = vectordb.index
+        ann = convert_vectorstore(vectordb)
+        print(f"💾 Sauvegarde de l'index FAISS ({ann['type']}) dans {index_path}...")
+        save_vectorstore(vectordb, index_path)
+        if ann['type'] != 'flat':
+            save_flat_sidecar(flat_index, index_path)
+        # Index BM25 construit sur les mêmes chunks (ids du docstore), persisté à côté
+        sparse = BM25Index.from_vectorstore(vectordb)
+        if sparse is not None:
+            sparse.save(persist_path)
+            print(f"🔠 Index BM25 sauvegardé ({len(sparse)} chunks, {len(sparse.postings)} termes)")
+        # Listes de positions par type / source / synthetic / product_id (filtres exécutés dans FAISS)
+        meta_index = MetadataIndex.from_vectorstore(vectordb)
+        if meta_index is not None:
+            meta_index.save(persist_path)
+        # Profils synthétiques: product_id / jetons du nom / trigrammes -> ids des chunks (/evaluate)
+        products = ProductIndex.from_vectorstore(vectordb)
+        if products is not None and len(products):
+            products.save(persist_path)
+            print(f"🏷️ Index produits sauvegardé ({len(products)} profils synthétiques)")
+        # Écriture métadonnées index
+        meta = {
+            "embedding_model": embedding_model_name(),
+            "embedding_provider": embedding_provider(),
+            "chunk_size": getattr(settings, 'CHUNK_SIZE', 400),
+            "chunk_overlap": getattr(settings, 'CHUNK_OVERLAP', 50),
+            "doc_count": doc_count,
+            "chunk_count": chunk_count,
+            "sparse_index": "bm25" if sparse is not None else None,
+            "metadata_index": sorted(meta_index.postings) if meta_index is not None else None,
+            "product_count": len(products) if products is not None else 0,
+            "ann": ann,
+        }
+        # Hash simple du nombre de chunks + nom modèle (signature rapide); + contenu si connu (manifest)
+        raw_sig = f"{meta['embedding_model']}:{meta['chunk_count']}:{meta['chunk_size']}"
+        if content_hash:
+            raw_sig += f":{content_hash}"
+        meta['signature'] = hashlib.sha256(raw_sig.encode()).hexdigest()[:16]
+        with open(os.path.join(persist_path, 'embedding_meta.json'), 'w', encoding='utf-8') as fh:
+            json.dump(meta, fh, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"Erreur lors de la sauvegarde locale du vectordb: {e}")
 
-    # Multilingual embeddings for French
-    print("🔤 Chargement du modèle d'embeddings multilingue...")
-    if HuggingFaceEmbeddings is None:
-        raise ImportError("HuggingFaceEmbeddings not available. Please install langchain-huggingface or ensure langchain provides HuggingFaceEmbeddings.")
 
-    embeddings = HuggingFaceEmbeddings(
-        model_name=getattr(settings, 'EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'),
-        model_kwargs={'device': 'cpu'}
-    )
-      # Option 2: Si vous avez nomic-embed-text dans Ollama (recommandé)
-      # from langchain.embeddings import OllamaEmbeddings
-      # embeddings = OllamaEmbeddings(
-      #     model="nomic-embed-text",
-      #     base_url="http://ollama:11434"
-      # )
+def create_vectorstore(docs, persist_path: str = None, batch_size: int = 1024):
+    """Create a FAISS vectorstore from LangChain Documents (a list or any iterable / generator).
 
-    print("🗄️ Création de la base vectorielle FAISS (batching pour grande volumétrie)...")
+    - Streaming pipeline: documents are consumed one at a time, split with CHUNK_SIZE /
+      CHUNK_OVERLAP, and fixed-size batches of `batch_size` chunks flow through the
+      bounded queues of `EmbeddingPipeline` (encoding, FAISS insertion). A slow stage
+      blocks the upstream ones, so memory does not grow with the corpus.
+    - Document / chunk / type counts are computed on the fly (embedding_meta.json).
+    - Optionally persists the index to disk under `persist_path`.
+    """
+    chunk_size = getattr(settings, 'CHUNK_SIZE', 400)
+    chunk_overlap = getattr(settings, 'CHUNK_OVERLAP', 50)
+    splitter = get_splitter()
+    counters = {"documents": 0, "chunks": 0, "types": {}, "sample_meta": []}
+
+    def _chunks():
+        for doc in docs:
+            meta = getattr(doc, 'metadata', None) or {}
+            t = meta.get('type') or 'unknown'
+            counters["documents"] += 1
+            counters["types"][t] = counters["types"].get(t, 0) + 1
+            # Découpage document par document: mêmes chunks que split_documents(docs)
+            for chunk in splitter.split_documents([doc]):
+                counters["chunks"] += 1
+                if len(counters["sample_meta"]) < 3:
+                    counters["sample_meta"].append(chunk.metadata)
+                yield chunk
+
+    def _ids():
+        while True:
+            yield str(uuid.uuid4())
+
+    embeddings = get_embeddings()
+
+    print(f"🗄️ Création de la base vectorielle FAISS en flux (chunk_size={chunk_size}, overlap={chunk_overlap}, "
+          f"lots de {batch_size} chunks)...")
 
     # If persist_path exists and contains an index, load it to append
     if persist_path:
@@ -83,47 +143,23 @@ def create_vectorstore(docs, persist_path: str = None, batch_size: int = 1024):
     else:
         index_path = None
 
-    # Create an empty FAISS store and add in batches to avoid memory peaks
-    # Use from_documents for small datasets, but for large sets, build incrementally
-    total = len(chunks)
-    if total == 0:
+    # chargement -> découpage -> encodage (lots EMBED_BATCH_SIZE, pool optionnel) -> insertion FAISS, étages recouverts
+    vectordb = EmbeddingPipeline(embeddings).build(chunk_batches(_chunks(), _ids(), batch_size))
+
+    print(f"📄 {counters['documents']} documents découpés en {counters['chunks']} chunks")
+    for k, v in counters["types"].items():
+        print(f"   - {k}: {v}")
+    if counters["sample_meta"]:
+        # Example chunk metadata preview (helpful for debugging multi-source inputs)
+        print(f"   (exemple metadata chunks: {counters['sample_meta']})")
+
+    if vectordb is None:
         print("⚠️ Aucun chunk à indexer")
         return None
 
-    # For small datasets, fallback to simple creation
-    if total <= batch_size:
-        vectordb = FAISS.from_documents(chunks, embeddings)
-    else:
-        # Create first batch as base
-        first_batch = chunks[:batch_size]
-        vectordb = FAISS.from_documents(first_batch, embeddings)
-        # Add remaining in batches
-        for start in range(batch_size, total, batch_size):
-            end = min(start + batch_size, total)
-            batch = chunks[start:end]
-            print(f"Ajout des chunks {start}-{end} / {total}...")
-            vectordb.add_documents(batch)
-
     # Optionally persist the FAISS index to disk (depends on FAISS wrapper implementation)
     if index_path:
-        try:
-            print(f"💾 Sauvegarde de l'index FAISS dans {index_path}...")
-            vectordb.save_local(index_path)
-            # Écriture métadonnées index
-            meta = {
-                "embedding_model": getattr(settings, 'EMBEDDING_MODEL', ''),
-                "chunk_size": chunk_size,
-                "chunk_overlap": chunk_overlap,
-                "doc_count": len(docs),
-                "chunk_count": len(chunks),
-            }
-            # Hash simple du nombre de chunks + nom modèle (signature rapide)
-            raw_sig = f"{meta['embedding_model']}:{meta['chunk_count']}:{meta['chunk_size']}".encode()
-            meta['signature'] = hashlib.sha256(raw_sig).hexdigest()[:16]
-            with open(os.path.join(persist_path, 'embedding_meta.json'), 'w', encoding='utf-8') as fh:
-                json.dump(meta, fh, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Erreur lors de la sauvegarde locale du vectordb: {e}")
+        save_index(vectordb, persist_path, doc_count=counters["documents"], chunk_count=counters["chunks"])
 
     print("✅ Base vectorielle créée avec succès!")
     return vectordb
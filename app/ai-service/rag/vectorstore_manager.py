@@ -1,41 +1,136 @@
 import threading
 import os
 import json
-from typing import Optional
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
 from core.config import settings
-from .loader import load_documents
+from .loader import iter_documents
 from .vectorstore import create_vectorstore
+from .embeddings import with_query_cache
+from .hybrid import BM25Index
+from .metadata_filter import MetadataIndex, register as register_metadata_index
+from .product_index import ProductIndex, register as register_product_index
+from .ann import apply_search_params
+from .index_store import load_vectorstore
+from .index_versions import MAIN_INDEX, active_index_dir, current_version
+from .model_registry import EMBEDDING_MODELS, EmbeddingProviderMismatchError, check_index_meta
 
 try:
     from langchain_community.vectorstores import FAISS
 except Exception:
     from langchain.vectorstores import FAISS
-    
-try:
-    from langchain_huggingface import HuggingFaceEmbeddings
-except Exception:
-    try:
-        from langchain.embeddings import HuggingFaceEmbeddings
-    except Exception:
-        HuggingFaceEmbeddings = None
+
+
+class ReadWriteLock:
+    """Plusieurs lecteurs simultanés, un seul écrivain (prioritaire sur les nouveaux lecteurs)."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
 
 
 class VectorStoreManager:
     """
     Gère le chargement lazy et le cache de la base vectorielle.
+
+    L'index actif est celui pointé par `main_index/CURRENT` (voir index_versions).
+    `reload()` charge la nouvelle version hors verrou puis échange le handle sous
+    verrou écrivain: les requêtes en cours terminent sur l'ancien objet.
+
+    Les autres index nommés de FAISS_DIR (ex: `synthetic_index`, voir
+    FEDERATED_INDEXES) sont chargés à la demande par `get_index(name)` et
+    rechargés indépendamment par `reload(name)`.
     """
     _instance = None
     _lock = threading.Lock()
-    
+
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super().__new__(cls)
                     cls._instance._vectordb = None
+                    cls._instance._sparse = None
+                    cls._instance._version = None
+                    cls._instance._index_dir = None
+                    cls._instance._embeddings = None
+                    cls._instance._extra = {}
+                    cls._instance._swap_lock = ReadWriteLock()
                     cls._instance._initialized = False
         return cls._instance
 
+    def _get_embeddings(self):
+        if self._embeddings is None:
+            # Instance partagée avec le rerank et les reindex (model_registry)
+            self._embeddings = with_query_cache(EMBEDDING_MODELS.get())
+        return self._embeddings
+
+    def _load_index(self, index_dir: str):
+        """Charge FAISS (+ vérification meta) depuis un répertoire de version."""
+        persist_dir = os.path.join(index_dir, 'faiss_index')
+        meta_path = os.path.join(index_dir, 'embedding_meta.json')
+        print(f"Chargement de l'index FAISS persistant depuis: {persist_dir}")
+        meta = {}
+        if os.path.isfile(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as fh:
+                    meta = json.load(fh)
+            except Exception as me:
+                print(f"⚠️ Lecture meta échouée: {me}")
+        # Provider d'embeddings incompatible (ex: index Ollama, runtime sentence-transformers): refus de charger
+        for warning in check_index_meta(meta) if meta else []:
+            print(f"⚠️ {warning}")
+        # index.faiss en mmap + docstore SQLite lu à la demande (index.pkl pour l'ancien format)
+        vectordb = load_vectorstore(persist_dir, self._get_embeddings())
+        # Type d'index ANN relu tel quel par FAISS; on réapplique efSearch / nprobe
+        if meta.get('ann'):
+            try:
+                apply_search_params(vectordb.index, meta['ann'])
+                print(f"🧭 Index ANN: {meta['ann']}")
+            except Exception as me:
+                print(f"⚠️ Paramètres ANN non appliqués: {me}")
+        try:
+            register_metadata_index(vectordb, MetadataIndex.load(index_dir))
+        except Exception as me:
+            print(f"⚠️ Lecture index de métadonnées échouée: {me}")
+        try:
+            register_product_index(vectordb, ProductIndex.load(index_dir))
+        except Exception as me:
+            print(f"⚠️ Lecture index produits échouée: {me}")
+        print("Index FAISS chargé avec succès depuis le disque.")
+        return vectordb
+
     def get_vectordb(self) -> FAISS:
         """
         Retourne la base vectorielle, en la chargeant si nécessaire (lazy loading).
@@ -44,41 +139,125 @@ class VectorStoreManager:
             with self._lock:
                 if not self._initialized:
                     # If a persisted FAISS index exists, load it (preferred)
-                    persist_dir = os.path.join(settings.FAISS_DIR, 'main_index', 'faiss_index')
-                    meta_path = os.path.join(settings.FAISS_DIR, 'main_index', 'embedding_meta.json')
-                    if os.path.isdir(persist_dir):
-                        print(f"Chargement de l'index FAISS persistant depuis: {persist_dir}")
+                    index_dir = active_index_dir()
+                    if os.path.isdir(os.path.join(index_dir, 'faiss_index')):
                         try:
-                            if HuggingFaceEmbeddings is None:
-                                raise ImportError("HuggingFaceEmbeddings not available to load persisted index")
-                            embeddings = HuggingFaceEmbeddings(
-                                model_name=getattr(settings, 'EMBEDDING_MODEL', None),
-                                model_kwargs={'device': 'cpu'}
-                            )
-                            # allow_dangerous_deserialization True because index is local/trusted
-                            self._vectordb = FAISS.load_local(persist_dir, embeddings, allow_dangerous_deserialization=True)
-                            # Vérification meta si présent
-                            if os.path.isfile(meta_path):
-                                try:
-                                    with open(meta_path, 'r', encoding='utf-8') as fh:
-                                        meta = json.load(fh)
-                                    expected = getattr(settings, 'EMBEDDING_MODEL', '')
-                                    if meta.get('embedding_model') != expected:
-                                        print(f"⚠️ Mismatch embedding_model meta={meta.get('embedding_model')} != runtime={expected}")
-                                except Exception as me:
-                                    print(f"⚠️ Lecture meta échouée: {me}")
-                            print("Index FAISS chargé avec succès depuis le disque.")
-                            self._initialized = True
-                            return self._vectordb
+                            vectordb = self._load_index(index_dir)
+                            with self._swap_lock.write():
+                                self._vectordb = vectordb
+                                self._sparse = None
+                                self._index_dir = index_dir
+                                self._version = current_version()
+                                self._initialized = True
+                            return vectordb
+                        except EmbeddingProviderMismatchError as e:
+                            # Index présent mais incompatible: pas de reconstruction implicite, reindex explicite requis
+                            print(f"❌ {e}")
+                            raise
                         except Exception as e:
                             print(f"Erreur lors du chargement de l'index persistant: {e}")
 
                     # Fallback: build from documents
                     print(f"Chargement des documents depuis le répertoire: {settings.PDF_DIR}")
-                    docs = load_documents()
-                    print(f"Création de la base vectorielle à partir de {len(docs)} documents...")
-                    self._vectordb = create_vectorstore(docs)
+                    # Chargement / découpage / embedding en flux (mémoire bornée)
+                    vectordb = create_vectorstore(iter_documents())
+                    if vectordb is not None:
+                        vectordb.embedding_function = with_query_cache(vectordb.embedding_function)
                     print("Base vectorielle créée avec succès!")
-                    self._initialized = True
-        
-        return self._vectordb
\ No newline at end of file
+                    with self._swap_lock.write():
+                        self._vectordb = vectordb
+                        self._sparse = None
+                        self._index_dir = None
+                        self._version = None
+                        self._initialized = True
+
+        with self._swap_lock.read():
+            return self._vectordb
+
+    def _load_named(self, name: str) -> Dict[str, Any]:
+        root = os.path.join(settings.FAISS_DIR, name)
+        index_dir = active_index_dir(root)
+        entry = {'vectordb': None, 'sparse': None, 'version': current_version(root), 'index_dir': index_dir}
+        if os.path.isdir(os.path.join(index_dir, 'faiss_index')):
+            try:
+                entry['vectordb'] = self._load_index(index_dir)
+                entry['sparse'] = self._load_sparse(index_dir, entry['vectordb'])
+            except EmbeddingProviderMismatchError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Index '{name}' non chargé: {e}")
+        return entry
+
+    def get_index(self, name: str) -> Tuple[Any, Optional[BM25Index]]:
+        """(vectordb, sparse) of the index `FAISS_DIR/<name>`; (None, None) if it does not exist."""
+        if name == MAIN_INDEX:
+            return self.get_vectordb(), self.get_sparse_index()
+        if name not in self._extra:
+            with self._lock:
+                if name not in self._extra:
+                    entry = self._load_named(name)
+                    with self._swap_lock.write():
+                        self._extra[name] = entry
+        with self._swap_lock.read():
+            entry = self._extra[name]
+            return entry['vectordb'], entry['sparse']
+
+    def reload(self, name: str = None) -> Optional[str]:
+        """
+        Charge la version active (CURRENT) et l'échange à chaud; retourne la version chargée.
+        """
+        if name and name != MAIN_INDEX:
+            entry = self._load_named(name)
+            with self._swap_lock.write():
+                self._extra[name] = entry
+            print(f"🔄 Index '{name}' actif: {entry['version'] or 'legacy'}")
+            return entry['version']
+        index_dir = active_index_dir()
+        version = current_version()
+        vectordb = self._load_index(index_dir)
+        sparse = self._load_sparse(index_dir, vectordb)
+        with self._swap_lock.write():
+            self._vectordb = vectordb
+            self._sparse = sparse
+            self._index_dir = index_dir
+            self._version = version
+            self._initialized = True
+        print(f"🔄 Index actif: {version or 'legacy'}")
+        return version
+
+    def get_version(self, name: str = None) -> Optional[str]:
+        """Version de l'index servi (None: index legacy ou non chargé)."""
+        with self._swap_lock.read():
+            if name and name != MAIN_INDEX:
+                return (self._extra.get(name) or {}).get('version')
+            return self._version
+
+    @staticmethod
+    def _load_sparse(index_dir: Optional[str], vectordb) -> Optional[BM25Index]:
+        sparse = None
+        if index_dir:
+            try:
+                sparse = BM25Index.load(index_dir)
+            except Exception as e:
+                print(f"⚠️ Lecture index BM25 échouée: {e}")
+        # Index absent ou désaligné (ancien index) -> reconstruction en mémoire
+        if sparse is None or len(sparse) != len(getattr(vectordb, 'index_to_docstore_id', {}) or {}):
+            sparse = BM25Index.from_vectorstore(vectordb)
+        return sparse
+
+    def get_sparse_index(self) -> Optional[BM25Index]:
+        """
+        Retourne l'index BM25 associé (chargé depuis le disque, sinon reconstruit depuis le docstore).
+        """
+        vectordb = self.get_vectordb()
+        if self._sparse is None and vectordb is not None:
+            with self._lock:
+                if self._sparse is None:
+                    sparse = self._load_sparse(self._index_dir, vectordb)
+                    with self._swap_lock.write():
+                        # Ne pas écraser un index plus récent échangé entre-temps
+                        if self._vectordb is vectordb:
+                            self._sparse = sparse
+                    return sparse
+        with self._swap_lock.read():
+            return self._sparse
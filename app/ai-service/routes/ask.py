@@ -2,15 +2,29 @@
 from fastapi import APIRouter, Query, HTTPException
 from core.ollama_client import get_llm
 from core.cache import cached_answer
-from rag.rag_chain import build_rag_chain
-from rag.rerank import rerank_documents, filter_documents_by_type
+from core.scoring import overlap_ratio as overlap_ratio_hashed, source_token_hashes
+from rag.rag_chain import answer_from_documents, build_stuff_chain
+from rag.rerank import rerank_cache_tag, rerank_documents
+from rag.federated import federated_search
+from rag.metadata_filter import format_filter, request_filter
 from rag.vectorstore_manager import VectorStoreManager
+from typing import Optional
 import re
 import time
 
 router = APIRouter()
+# Handle résolu à chaque requête (pas à l'import) pour suivre les bascules d'index à chaud
 vector_store_manager = VectorStoreManager()
-vectordb = vector_store_manager.get_vectordb()
+
+def _query_embedder(db):
+    """Fonction embed_query du modèle de l'index FAISS (même espace que le cache sémantique)."""
+    emb = getattr(db, 'embeddings', None)
+    if emb is not None and hasattr(emb, 'embed_query'):
+        return emb.embed_query
+    fn = getattr(db, 'embedding_function', None)
+    if hasattr(fn, 'embed_query'):
+        return fn.embed_query
+    return fn if callable(fn) else None
 
 def extract_quoted_blocks(text: str):
     """Extrait les blocs formatés [SOURCE] ```...``` du texte retourné par le LLM."""
@@ -31,6 +45,7 @@ def debug_retrieval(question: str = Query(..., description="Question pour tester
     """Route de debug pour vérifier la qualité de la récupération des documents"""
     print(f"🔍 DEBUG RETRIEVAL - Question: {question}")
     
+    vectordb = vector_store_manager.get_vectordb()
     retriever = vectordb.as_retriever(search_type="similarity", search_kwargs={"k": 5})
     start_time = time.time()
     retrieved_docs = retriever.get_relevant_documents(question)
@@ -67,35 +82,36 @@ def ask(
     question: str = Query(..., description="Question à poser au modèle"),
     rerank: bool = Query(False, description="Activer le reranking secondaire (embedding cosine)"),
     source_filter: str = Query("", description="Filtrer types sources ex: csv,pdf,html"),
+    metadata_filter: str = Query("", alias="filter", description="Filtre métadonnées ex: type=csv|pdf,synthetic=true,product_id=sardine"),
     top_n: int = Query(3, ge=1, le=10, description="Nombre final de documents après rerank"),
+    rerank_budget_ms: Optional[float] = Query(None, ge=0, le=10000, description="Budget (ms) du rerank cross-encoder"),
 ):
     if len(question) > MAX_QUESTION_LEN:
         raise HTTPException(status_code=400, detail=f"Question trop longue (>{MAX_QUESTION_LEN} caractères)")
+    try:
+        where = request_filter(source_filter, metadata_filter)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     print(f"\n🤔 Question reçue: {question}")
     
     # 1. Récupération des documents (une seule fois)
     base_k = max(top_n, 5)  # récupérer un peu plus pour permettre un rerank utile
-    retriever = vectordb.as_retriever(search_type="similarity", search_kwargs={"k": base_k})
+    vectordb = vector_store_manager.get_vectordb()
     start_retrieval = time.time()
-    retrieved_docs = retriever.get_relevant_documents(question)
+    # Recherche hybride: un appel dense + un appel BM25 fusionnés par RRF
+    # Filtre métadonnées (type, source...) exécuté dans l'index: base_k résultats conformes
+    retrieved_docs = [d for d, _ in federated_search(question, base_k, where=where)]
+    applied_filter = format_filter(where)
 
     original_docs = list(retrieved_docs)  # copy for debug
 
-    # 2.a Filtrage des sources (type) si demandé
-    applied_filter = None
-    if source_filter.strip():
-        types = [t.strip() for t in source_filter.split(',') if t.strip()]
-        if types:
-            filtered_docs = filter_documents_by_type(retrieved_docs, types)
-            if filtered_docs is not retrieved_docs:
-                applied_filter = ','.join(types)
-            retrieved_docs = filtered_docs
-
-    # 2.b Rerank si demandé
+    # 2. Rerank si demandé
     rerank_scores = []
     rerank_applied = False
+    rerank_stats = {}
     if rerank and len(retrieved_docs) > 1:
-        top_docs, scored = rerank_documents(question, retrieved_docs, top_n=top_n)
+        top_docs, scored = rerank_documents(question, retrieved_docs, top_n=top_n, vectordb=vectordb,
+                                            budget_ms=rerank_budget_ms, stats=rerank_stats)
         rerank_applied = True
         rerank_scores = scored[:len(top_docs)]
         retrieved_docs = top_docs
@@ -104,9 +120,9 @@ def ask(
         retrieved_docs = retrieved_docs[:top_n]
     retrieval_time = time.time() - start_retrieval
 
-    # 2. Construction de la chaîne RAG (LLM + prompt) après avoir les docs
+    # 2. Construction de la chaîne RAG (LLM + prompt) sur les docs déjà filtrés / rerankés (pas de 2e recherche)
     llm = get_llm()
-    qa_chain = build_rag_chain(vectordb, llm=llm, k=base_k)
+    qa_chain = build_stuff_chain(llm=llm)
     
     print(f"🔍 Récupération terminée en {retrieval_time:.2f}s")
     print(f"📚 {len(retrieved_docs)} documents récupérés:")
@@ -118,25 +134,23 @@ def ask(
     # 3. Génération de la réponse (avec cache)
     print(f"🤖 Génération de la réponse avec {llm.model} (cache support)...")
     def _gen():
-        return qa_chain.invoke({"query": question})
+        return answer_from_documents(qa_chain, question, retrieved_docs)
+    # La réponse dépend des documents transmis: filtre, top_n et rerank (backend, budget) font partie de la clé
+    answer_version = '|'.join((PROMPT_VERSION, applied_filter or '', f"top{top_n}",
+                               rerank_cache_tag(rerank_applied, rerank_budget_ms)))
+    # Budget cross-encoder épuisé: classement partiel, réponse servie mais jamais mise en cache
     start_generation = time.time()
-    result, from_cache = cached_answer(question, PROMPT_VERSION, _gen)
+    result, cache_hit_type = cached_answer(question, answer_version, _gen, embed_fn=_query_embedder(vectordb),
+                                           store=not rerank_stats.get("budget_exhausted"))
     generation_time = time.time() - start_generation
     answer = result.get("result", "") if isinstance(result, dict) else str(result)
     source_docs = (result.get("source_documents", []) if isinstance(result, dict) else []) or retrieved_docs
 
     # 3.b Heuristique overlap réponse / sources (approximate anti-hallucination metric)
-    answer_tokens = set(answer.lower().split()) if isinstance(answer, str) else set()
-    source_tokens = set()
-    for d in source_docs:
-        try:
-            source_tokens.update(d.page_content.lower().split())
-        except Exception:
-            pass
-    overlap_ratio = 0.0
-    if answer_tokens:
-        common = answer_tokens.intersection(source_tokens)
-        overlap_ratio = round(len(common) / max(1, len(answer_tokens)), 4)
+    answer_tokens = answer.lower().split() if isinstance(answer, str) else []
+    overlap_ratio = overlap_ratio_hashed(
+        answer_tokens, [source_token_hashes(getattr(d, 'page_content', '')) for d in source_docs]
+    )
     
     print(f"⏱️ Génération terminée en {generation_time:.2f}s")
     print(f"📝 Réponse générée ({len(answer)} caractères):")
@@ -170,6 +184,7 @@ def ask(
             {
                 "source": doc.metadata.get("source", "unknown"), 
                 "page": doc.metadata.get("page", None), 
+                "metadata": {k: v for k, v in doc.metadata.items() if isinstance(v, (str, int, float, bool))},
                 "text_snippet": doc.page_content[:300]
             }
             for doc in source_docs
@@ -178,10 +193,12 @@ def ask(
             "num_retrieved_docs": len(retrieved_docs),
             "answer_length": len(answer),
             "warnings_count": len(warnings),
-            "cache_hit": from_cache,
+            "cache_hit": cache_hit_type is not None,
+            "cache_hit_type": cache_hit_type,
             "rerank_applied": rerank_applied,
             "applied_source_filter": applied_filter,
             "rerank_scores": rerank_scores[:10],
+            "rerank_stats": rerank_stats,
             "original_candidate_count": len(original_docs),
             "overlap_ratio": overlap_ratio
         },
@@ -6,14 +6,22 @@ import asyncio
 import json
 # NOTE: Pour l'évaluation anti-hallucination nous effectuons une récupération manuelle
 # puis (optionnel) un rerank + filtrage pour contrôler précisément le contexte fourni au LLM
-from rag.rerank import rerank_documents, filter_documents_by_type
+from rag.rerank import rerank_cache_tag, rerank_documents
 from rag.vectorstore_manager import VectorStoreManager
+from rag.hybrid import doc_key
+from rag.federated import configured_indexes, federated_search, parse_spec
+from rag.product_index import lookup_product
+from rag.metadata_filter import format_filter, matches, request_filter
+from rag.eval_templates import narrative_prompt, parse_generation_mode, structured_evaluation
 import time
 import traceback
 from core.ollama_client import ensure_ollama_warm
 from core.config import settings
+from core.scoring import norm_tokens, overlap_ratio as overlap_ratio_hashed, source_token_hashes
+from core.cache import SingleFlight, _hash_key, _global_cache, index_signature
 import os
 import re
+import unicodedata
 
 # --- Anti-hallucination configuration ---
 EVAL_MAX_SENTENCES = int(os.getenv("EVAL_MAX_SENTENCES", "6"))
@@ -39,6 +47,28 @@ SUSPECT_PATTERNS = [
 ]
 
 SUSPECT_REGEX = re.compile("|".join(SUSPECT_PATTERNS), flags=re.IGNORECASE)
+OVERLAP_STOPWORDS = {"de","la","le","les","un","une","et","en","du","des","au","aux","sur","dans","par","pour","avec","plus","ou"}
+
+# --- Cache des évaluations complètes ---
+EVAL_CACHE_ENABLED = os.getenv("EVAL_CACHE_ENABLED", "1") == "1"
+# À incrémenter à chaque modification des prompts (query / strict / grounding) ci-dessous
+EVAL_PROMPT_VERSION = "eval_v1"
+
+def _norm_token(t: str) -> str:
+    t = unicodedata.normalize("NFKD", t).encode("ascii", "ignore").decode("utf-8").lower()
+    return re.sub(r"[^a-z0-9]+", "", t)
+
+def _evaluation_cache_key(product_description: str, top_n: int, rerank: bool, where: dict,
+                          mode: str = "llm", rerank_budget_ms: float | None = None) -> str:
+    normalized = " ".join(nt for nt in (_norm_token(t) for t in product_description.split()) if nt)
+    return _hash_key('eval', normalized, str(top_n), rerank_cache_tag(rerank, rerank_budget_ms),
+                     format_filter(where) or "", mode,
+                     EVAL_PROMPT_VERSION, settings.MODEL_NAME, index_signature())
+
+def _stream_json(payload: dict, chunk_size: int = 1024):
+    json_str = json.dumps(payload)
+    for i in range(0, len(json_str), chunk_size):
+        yield json_str[i:i+chunk_size]
 
 def _split_sentences(text: str):
     # rudimentary sentence splitter
@@ -76,15 +106,166 @@ MAX_EVAL_RETRIES = 3
 RETRY_BACKOFF_BASE = 0.75
 MAX_TOTAL_SECONDS = 45  # coupe après cette durée globale
 
+def _generate_answer(llm, prompt: str):
+    # Tente différentes interfaces (invoke / __call__ / run)
+    try:
+        if hasattr(llm, 'invoke'):
+            r = llm.invoke(prompt)
+            if isinstance(r, dict):
+                return r.get('result') or r.get('text') or str(r)
+            return r
+        if callable(llm):
+            r = llm(prompt)
+            if isinstance(r, dict):
+                return r.get('result') or r.get('text') or str(r)
+            return r
+        if hasattr(llm, 'run'):
+            return llm.run(prompt)
+    except Exception as e:
+        return f"<error: {e}>"
+    return "<vide>"
+
+def _generate_coalesced(llm, prompt: str):
+    key = _hash_key('eval_gen', settings.MODEL_NAME, prompt)
+    value, shared = _generation_flight.do(key, lambda: _generate_answer(llm, prompt))
+    if shared:
+        print("🔗 Génération partagée avec une requête concurrente identique")
+    return value
+
 router = APIRouter()
+# Coalescence des générations identiques (même modèle + même prompt) entre requêtes concurrentes
+_generation_flight = SingleFlight()
+# Handle résolu à chaque évaluation (pas à l'import) pour suivre les bascules d'index à chaud
 vector_store_manager = VectorStoreManager()
-vectordb = vector_store_manager.get_vectordb()
+
+async def _stream_structured_response(product_description: str, structured, mode: str, cache_key: str,
+                                     debug: bool, where: dict, product_match, product_lookup_us: float):
+    """Template / mixed evaluation: facts rendered from structured data, no regeneration loop."""
+    start_time = time.time()
+    source = {"source": structured.metadata.get("source", "unknown"), "page": None,
+              "text_snippet": structured.record[:400]}
+    debug_response = {
+        "product": product_description,
+        "debug": {
+            "selected_docs": [{"source": source["source"], "preview": structured.record[:400]}],
+            "original_candidate_count": 1,
+            "applied_source_filter": format_filter(where),
+            "rerank_applied": False,
+            "rerank_scores": [],
+        },
+    }
+    if debug:
+        print("🔧 Mode debug : affichage des données structurées")
+        yield json.dumps(debug_response)
+
+    # Mode mixed: la narration (1 phrase) prend la dernière place
+    facts = structured.text(EVAL_MAX_SENTENCES - 1 if mode == "mixed" else EVAL_MAX_SENTENCES)
+    answer = facts
+    narrative_failed = False
+    suspect = []
+    if mode == "mixed":
+        llm = get_llm()
+        try:
+            raw = await asyncio.to_thread(_generate_coalesced, llm, narrative_prompt(product_description, facts))
+            narrative, meta = _sanitize_answer(str(raw or ""), 1)
+            suspect = meta["suspect_patterns"]
+            narrative_failed = str(raw).startswith("<error") or not narrative or bool(suspect)
+        except Exception as e:
+            print(f"⚠️ Phrase narrative échouée: {e}")
+            narrative, narrative_failed = "", True
+        if not narrative_failed:
+            answer = f"{facts} {narrative}"
+        else:
+            print("ℹ️ Narration LLM écartée, réponse gabarit seule")
+    total_time = time.time() - start_time
+
+    answer_tokens = norm_tokens(answer, min_len=3, stop=OVERLAP_STOPWORDS)
+    overlap_ratio = overlap_ratio_hashed(
+        answer_tokens, [source_token_hashes(structured.record, normalize=True, min_len=3, stop=OVERLAP_STOPWORDS)])
+    response = {
+        "product": product_description,
+        "evaluation": answer,
+        "evaluation_time_seconds": round(total_time, 2),
+        "source_documents": [source],
+        "debug_info": {
+            "num_source_docs": 1,
+            "evaluation_length": len(answer),
+            "overlap_ratio": overlap_ratio,
+            "rerank_applied": False,
+            "applied_source_filter": format_filter(where),
+            "original_candidate_count": 1,
+            "rerank_scores": [],
+            "rerank_stats": {},
+            "federation": {},
+            "removed_sentences": max(0, len(structured.sentences) - len(_split_sentences(facts))),
+            "final_sentence_count": len(_split_sentences(answer)),
+            "suspect_patterns": suspect,
+            "regenerated": False,
+            "product_keywords": [],
+            "product_filtered_count": 0,
+            "product_synthetic_included": structured.kind == "synthetic",
+            "injected_product_id": _norm_token(product_match.product_id) if product_match else None,
+            "forced_injection": False,
+            "product_match": product_match.as_dict() if product_match else None,
+            "product_lookup_us": product_lookup_us,
+            "synthetic_candidate_ids": [],
+            "grounding_regen": False,
+            "grounding_missing_tokens": [],
+            "prompt_truncated": False,
+            "approx_prompt_tokens": 0,
+            "low_overlap_trigger": False,
+            "generation_mode": mode,
+            "structured_product": structured.as_dict(),
+            "narrative_failed": narrative_failed,
+            "template_time_ms": round(total_time * 1000, 2),
+            "cache_hit": False
+        }
+    }
+    if EVAL_CACHE_ENABLED and not narrative_failed:
+        _global_cache.set(cache_key, {"response": response, "debug": debug_response})
+    print(f"🧾 Évaluation {mode} ({structured.kind} '{structured.product_id}') en {total_time * 1000:.1f} ms")
+    for chunk in _stream_json(response):
+        yield chunk
 
 async def generate_streaming_response(product_description: str, debug: bool = False,
-                                      rerank: bool = False, source_filter: str = "", top_n: int = 3):
+                                      rerank: bool = False, source_filter: str = "", top_n: int = 3,
+                                      rerank_budget_ms: float | None = None, metadata_filter: str = "",
+                                      generation_mode: str | None = None):
     print(f"\n🌱 Évaluation demandée pour: {product_description[:100]}...")
+    where = request_filter(source_filter, metadata_filter)
+    mode = parse_generation_mode(generation_mode)
+    cache_key = _evaluation_cache_key(product_description, top_n, rerank, where, mode, rerank_budget_ms)
+    cached = _global_cache.get(cache_key) if EVAL_CACHE_ENABLED else None
+    if cached is not None:
+        print("⚡ Évaluation servie depuis le cache")
+        if debug:
+            yield json.dumps(cached["debug"])
+        response = dict(cached["response"])
+        response["debug_info"] = {**response["debug_info"], "cache_hit": True}
+        for chunk in _stream_json(response):
+            yield chunk
+        return
     print("⚡ Démarrage du processus d'évaluation...")
-    
+
+    # Résolution directe du produit (index product_id / jetons / trigrammes construit au reindex):
+    # chunks du profil lus dans le docstore, sans recherche vectorielle supplémentaire
+    start_lookup = time.perf_counter()
+    product_match, product_docs = lookup_product(
+        product_description, [vdb for _name, _w, vdb, _s in configured_indexes(vector_store_manager)])
+    product_lookup_us = round((time.perf_counter() - start_lookup) * 1e6, 1)
+    matched_pid = _norm_token(product_match.product_id) if product_match else None
+
+    # --- 0. Modes template / mixed: métriques structurées du produit, sans récupération ni régénération ---
+    if mode != "llm":
+        allowed_match = product_match if any(matches(d.metadata, where) for d in product_docs) else None
+        structured = structured_evaluation(product_description, allowed_match, where)
+        if structured is not None:
+            async for chunk in _stream_structured_response(product_description, structured, mode, cache_key,
+                                                           debug, where, allowed_match, product_lookup_us):
+                yield chunk
+            return
+        print(f"ℹ️ Mode {mode}: aucune métrique structurée pour ce produit -> génération LLM")
+
     print("🔄 Initialisation LLM (factory)...")
     start_init = time.time()
     llm = get_llm()
@@ -93,9 +274,14 @@ async def generate_streaming_response(product_description: str, debug: bool = Fa
     
     # --- 1. Récupération initiale des documents ---
     base_k = max(top_n * 2, settings.NUM_RETRIEVAL_DOCS + 2)
-    print(f"� Récupération initiale top-k (k={base_k})")
+    print(f"🔎 Récupération initiale hybride fédérée top-k (k={base_k})")
+    vectordb = vector_store_manager.get_vectordb()
+    federation_stats = {}
     try:
-        docs_and_scores = vectordb.similarity_search_with_score(product_description, k=base_k)
+        # main_index + synthetic_index en une seule fan-out (quota de profils produits)
+        docs_and_scores = federated_search(product_description, base_k,
+                                           quotas=parse_spec(settings.EVAL_FEDERATED_QUOTAS),
+                                           stats=federation_stats, where=where)
     except Exception:
         print("⚠️ similarity_search_with_score a échoué, fallback get_relevant_documents")
         retriever = vectordb.as_retriever(search_kwargs={"k": base_k})
@@ -105,90 +291,27 @@ async def generate_streaming_response(product_description: str, debug: bool = Fa
     candidate_docs = [d for d, _ in docs_and_scores]
 
     # --- Injection / boosting ciblée de documents synthétiques correspondant au produit ---
-    import unicodedata as _uc
-    def _norm_token(t: str) -> str:
-        t = _uc.normalize("NFKD", t).encode("ascii", "ignore").decode("utf-8").lower()
-        return re.sub(r"[^a-z0-9]+", "", t)
-
     # Extra tokens normalisés issus de la description (réutilisés plus bas)
     import re as _re
     raw_tokens = _re.findall(r"[A-Za-zÀ-ÖØ-öø-ÿ\-']+", product_description.lower())
-    norm_tokens = {_norm_token(t) for t in raw_tokens if t}
+    desc_tokens = {_norm_token(t) for t in raw_tokens if t}
 
-    synthetic_docs = [d for d in candidate_docs if d.metadata.get("synthetic")]
-    synthetic_by_pid = {}
-    for d in synthetic_docs:
-        pid_raw = d.metadata.get("product_id")
-        if not pid_raw:
-            continue
-        pid = _norm_token(pid_raw)
-        if not pid:
-            continue
-        synthetic_by_pid.setdefault(pid, []).append(d)
-
-    matched_pid = None
-    for pid in synthetic_by_pid.keys():
-        if pid in norm_tokens:
-            matched_pid = pid
-            break
-        # fuzzy: pid contained in any token (e.g. "sardine" vs "sardines")
-        if any(pid in nt or nt in pid for nt in norm_tokens):
-            matched_pid = pid
-            break
+    synthetic_candidate_ids = sorted({_norm_token(d.metadata.get("product_id")) for d in candidate_docs
+                                      if d.metadata.get("synthetic") and d.metadata.get("product_id")})
 
     injected_docs = []
     forced_injection = False
-    if matched_pid:
+    if product_docs:
         # Inject first 2 chunks for this synthetic product at the head
-        injected_docs = synthetic_by_pid.get(matched_pid, [])[:2]
-        if injected_docs:
-            already_ids = {id(d) for d in injected_docs}
-            rest = [d for d in candidate_docs if id(d) not in already_ids]
-            candidate_docs = injected_docs + rest
-            forced_injection = True
-            print(f"🧬 Injection forcée: {len(injected_docs)} doc(s) synthétique(s) pour produit '{matched_pid}'")
+        injected_docs = product_docs[:2]
+        already_ids = {doc_key(d) for d in injected_docs}
+        rest = [d for d in candidate_docs if doc_key(d) not in already_ids]
+        candidate_docs = injected_docs + rest
+        forced_injection = True
+        print(f"🧬 Injection forcée: {len(injected_docs)} doc(s) synthétique(s) pour produit '{product_match.product_id}'"
+              f" ({product_match.method}, {product_lookup_us} µs)")
     else:
-        print("ℹ️ Aucun profil synthétique correspondant détecté pour injection")
-        # --- Fallback injection (recherche ciblée) ---
-        if os.getenv("EVAL_FALLBACK_INJECT", "1") == "1":
-            # Essayer quelques tokens longs spécifiques
-            anchor_tokens = sorted([t for t in norm_tokens if len(t) > 5], key=len, reverse=True)[:2]
-            fallback_docs = []
-            tried_terms = []
-            for at in anchor_tokens:
-                try:
-                    tried_terms.append(at)
-                    res = vectordb.similarity_search_with_score(at, k=4)
-                    for d, _sc in res:
-                        if d.metadata.get("synthetic"):
-                            pid_raw = d.metadata.get("product_id")
-                            if not pid_raw:
-                                continue
-                            pid_norm = _norm_token(pid_raw)
-                            if pid_norm in norm_tokens or any(pid_norm in nt or nt in pid_norm for nt in norm_tokens):
-                                fallback_docs.append(d)
-                except Exception as fe:
-                    print(f"⚠️ Fallback search error term={at}: {fe}")
-                if fallback_docs:
-                    break
-            if fallback_docs:
-                # dedupe & prepend
-                unique = []
-                seen_ids = set()
-                for d in fallback_docs:
-                    i = id(d)
-                    if i not in seen_ids:
-                        unique.append(d)
-                        seen_ids.add(i)
-                injected_docs = unique[:2]
-                already_ids = {id(d) for d in injected_docs}
-                rest = [d for d in candidate_docs if id(d) not in already_ids]
-                candidate_docs = injected_docs + rest
-                forced_injection = True
-                matched_pid = _norm_token(injected_docs[0].metadata.get("product_id", "")) or matched_pid
-                print(f"🔁 Fallback injection: {len(injected_docs)} doc(s) synthétique(s) ajoutés via tokens {anchor_tokens}")
-            else:
-                print("❔ Fallback injection n'a trouvé aucun document synthétique")
+        print(f"ℹ️ Aucun profil synthétique correspondant détecté pour injection ({product_lookup_us} µs)")
     # --- Filtrage lexicale basique basé sur mots produits (améliore spécificité) ---
     # Extraire mots significatifs (>=5 lettres) du product_description
     product_keywords = sorted({t for t in raw_tokens if len(t) >= 5})[:12]
@@ -207,33 +330,24 @@ async def generate_streaming_response(product_description: str, debug: bool = Fa
     original_candidate_count = len(candidate_docs)
     print(f"📚 {original_candidate_count} candidats avant filtrage/rerank")
 
-    # --- 2. Filtrage par type de source ---
-    applied_source_filter = None
-    if source_filter.strip():
-        types = [t.strip() for t in source_filter.split(',') if t.strip()]
-        if types:
-            filtered_docs = filter_documents_by_type(candidate_docs, types)
-            if filtered_docs is not candidate_docs:
-                applied_source_filter = ','.join(types)
-            candidate_docs = filtered_docs
-            print(f"🔧 Filtrage sources appliqué: {applied_source_filter or 'aucun changement'} -> {len(candidate_docs)} docs")
+    # --- 2. Filtre métadonnées ---
+    # Déjà appliqué dans l'index; seuls les docs injectés hors recherche peuvent ne pas le respecter
+    applied_source_filter = format_filter(where)
+    if where:
+        kept = [d for d in candidate_docs if matches(d.metadata, where)]
+        if len(kept) != len(candidate_docs):
+            print(f"🔧 Filtre {applied_source_filter}: {len(candidate_docs) - len(kept)} doc(s) injecté(s) écarté(s)")
+        candidate_docs = kept
 
     # --- 3. Rerank optionnel ---
     rerank_scores = []
     rerank_applied = False
+    rerank_stats = {}
     if rerank and len(candidate_docs) > 1:
-        top_docs, scored = rerank_documents(product_description, candidate_docs, top_n=top_n)
-        # Boost synthetic matched product docs by slight score increase (post-rerank ordering adjust)
-        if matched_pid:
-            boosted = []
-            for doc, sc in scored:
-                if doc.metadata.get("synthetic") and _norm_token(str(doc.metadata.get("product_id"))) == matched_pid:
-                    sc *= 1.25  # 25% boost
-                boosted.append((doc, sc))
-            # re-sort after boost
-            boosted.sort(key=lambda x: x[1], reverse=True)
-            top_docs = [d for d, _ in boosted[:top_n]]
-            scored = boosted
+        # Vecteurs relus depuis l'index + boost du profil synthétique du produit détecté
+        top_docs, scored = rerank_documents(product_description, candidate_docs, top_n=top_n,
+                                            vectordb=vectordb, product_id=matched_pid,
+                                            budget_ms=rerank_budget_ms, stats=rerank_stats)
         rerank_applied = True
         rerank_scores = scored[:len(top_docs)]
         selected_docs = top_docs
@@ -281,25 +395,26 @@ Sortie: texte uniquement, sans listes, sans code, sans 'Instruction', sans 'Rewr
 """
     print(f"🔍 Query construite: {query[:150]}...")
 
+    # Bloc debug construit systématiquement (mis en cache avec la réponse), émis si demandé
+    debug_docs = [
+        {
+            "source": d.metadata.get('source', 'unknown'),
+            "preview": d.page_content[:400]
+        } for d in selected_docs
+    ]
+    debug_response = {
+        "product": product_description,
+        "debug": {
+            "selected_docs": debug_docs,
+            "original_candidate_count": original_candidate_count,
+            "applied_source_filter": applied_source_filter,
+            "rerank_applied": rerank_applied,
+            "rerank_scores": rerank_scores[:10]
+        },
+    }
     if debug:
         print("🔧 Mode debug : affichage des documents sélectionnés")
-        debug_docs = [
-            {
-                "source": d.metadata.get('source', 'unknown'),
-                "preview": d.page_content[:400]
-            } for d in selected_docs
-        ]
-        response = {
-            "product": product_description,
-            "debug": {
-                "selected_docs": debug_docs,
-                "original_candidate_count": original_candidate_count,
-                "applied_source_filter": applied_source_filter,
-                "rerank_applied": rerank_applied,
-                "rerank_scores": rerank_scores[:10]
-            },
-        }
-        yield json.dumps(response)
+        yield json.dumps(debug_response)
 
     # Warmup Ollama (best-effort)
     warm_ok = ensure_ollama_warm()
@@ -312,31 +427,12 @@ Sortie: texte uniquement, sans listes, sans code, sans 'Instruction', sans 'Rewr
     total_time = 0
     source_docs = selected_docs  # ceux réellement fournis
 
-    def _generate_answer(prompt: str):
-        # Tente différentes interfaces (invoke / __call__ / run)
-        try:
-            if hasattr(llm, 'invoke'):
-                r = llm.invoke(prompt)
-                if isinstance(r, dict):
-                    return r.get('result') or r.get('text') or str(r)
-                return r
-            if callable(llm):
-                r = llm(prompt)
-                if isinstance(r, dict):
-                    return r.get('result') or r.get('text') or str(r)
-                return r
-            if hasattr(llm, 'run'):
-                return llm.run(prompt)
-        except Exception as e:
-            return f"<error: {e}>"
-        return "<vide>"
-
     for attempt in range(1, MAX_EVAL_RETRIES + 1):
         try:
             print(f"🔄 Tentative d'évaluation {attempt}/{MAX_EVAL_RETRIES}...")
             gen_start = time.time()
             # Exécuter génération dans un thread pour ne pas bloquer event loop
-            result = await asyncio.to_thread(_generate_answer, query)
+            result = await asyncio.to_thread(_generate_coalesced, llm, query)
             gen_time = time.time() - gen_start
             print(f"✅ Génération réussie! (temps: {gen_time:.1f}s)")
             total_time = time.time() - start_time
@@ -371,27 +467,12 @@ Sortie: texte uniquement, sans listes, sans code, sans 'Instruction', sans 'Rewr
 
     # --- 5.b Heuristique overlap (approximation similarité contenu) ---
 
-    import unicodedata as _uc
-    def _norm_token_simple(t: str) -> str:
-        t = _uc.normalize("NFKD", t).encode("ascii", "ignore").decode("utf-8").lower()
-        return re.sub(r"[^a-z0-9]+", "", t)
-    STOP = {"de","la","le","les","un","une","et","en","du","des","au","aux","sur","dans","par","pour","avec","plus","ou"}
-    answer_tokens_raw = sanitized_answer.split() if isinstance(sanitized_answer, str) else []
-    answer_tokens = [_norm_token_simple(t) for t in answer_tokens_raw]
-    answer_tokens = [t for t in answer_tokens if t and len(t) > 2 and t not in STOP]
-    source_tokens_set = set()
-    for d in source_docs:
-        try:
-            for tk in d.page_content.split():
-                nt = _norm_token_simple(tk)
-                if nt and len(nt) > 2 and nt not in STOP:
-                    source_tokens_set.add(nt)
-        except Exception:
-            pass
-    overlap_ratio = 0.0
-    if answer_tokens:
-        common = set(answer_tokens).intersection(source_tokens_set)
-        overlap_ratio = round(len(common) / max(1, len(set(answer_tokens))), 4)
+    answer_tokens = norm_tokens(sanitized_answer, min_len=3, stop=OVERLAP_STOPWORDS) if isinstance(sanitized_answer, str) else []
+    overlap_ratio = overlap_ratio_hashed(
+        answer_tokens,
+        [source_token_hashes(getattr(d, 'page_content', ''), normalize=True, min_len=3, stop=OVERLAP_STOPWORDS)
+         for d in source_docs]
+    )
     
     # --- 5.c Décision de régénération stricte ---
     regenerated = False
@@ -409,17 +490,13 @@ Question: Impact environnemental du produit: {product_description}
 Réponse:
 """
         try:
-            strict_result = await asyncio.to_thread(_generate_answer, strict_prompt)
+            strict_result = await asyncio.to_thread(_generate_coalesced, llm, strict_prompt)
             strict_sanitized, strict_meta = _sanitize_answer(strict_result, EVAL_MAX_SENTENCES)
             # Recalcule overlap
-            answer_tokens = set(strict_sanitized.lower().split()) if strict_sanitized else set()
-            source_tokens = set()
-            for d in source_docs:
-                try:
-                    source_tokens.update(d.page_content.lower().split())
-                except Exception:
-                    pass
-            overlap_ratio = round(len(answer_tokens.intersection(source_tokens)) / max(1, len(answer_tokens)), 4) if answer_tokens else 0.0
+            answer_tokens = strict_sanitized.lower().split() if strict_sanitized else []
+            overlap_ratio = overlap_ratio_hashed(
+                answer_tokens, [source_token_hashes(getattr(d, 'page_content', '')) for d in source_docs]
+            )
             sanitized_answer = strict_sanitized
             sanitize_meta = strict_meta
             regenerated = True
@@ -436,7 +513,7 @@ Réponse:
     if matched_pid and sanitized_answer:
         norm_answer = {_norm_token(t) for t in sanitized_answer.split()}
         # Construire un set d'ancrage plus souple (découpage du product_description)
-        anchor_candidates = {nt for nt in norm_tokens if len(nt) > 4}
+        anchor_candidates = {nt for nt in desc_tokens if len(nt) > 4}
         required_hit = anchor_candidates.intersection(norm_answer)
         if not required_hit:
             grounding_missing_tokens.extend(sorted(anchor_candidates))
@@ -452,7 +529,7 @@ Rédige au maximum {EVAL_MAX_SENTENCES} phrases factuelles, concises, naturelles
 Inclue au moins une fois un terme parmi: {', '.join(sorted(anchor_candidates))} si présent dans le contexte, sinon écris seulement 'Information non disponible'.
 """
             try:
-                regen_result = await asyncio.to_thread(_generate_answer, regen_prompt)
+                regen_result = await asyncio.to_thread(_generate_coalesced, llm, regen_prompt)
                 regen_sanitized, regen_meta = _sanitize_answer(regen_result, EVAL_MAX_SENTENCES)
                 if regen_sanitized.strip():
                     sanitized_answer = regen_sanitized
@@ -480,6 +557,8 @@ Inclue au moins une fois un terme parmi: {', '.join(sorted(anchor_candidates))}
             "applied_source_filter": applied_source_filter,
             "original_candidate_count": original_candidate_count,
             "rerank_scores": rerank_scores[:10],
+            "rerank_stats": rerank_stats,
+            "federation": federation_stats,
             "removed_sentences": sanitize_meta.get("removed_sentences"),
             "final_sentence_count": sanitize_meta.get("final_sentence_count"),
             "suspect_patterns": sanitize_meta.get("suspect_patterns"),
@@ -489,25 +568,30 @@ Inclue au moins une fois un terme parmi: {', '.join(sorted(anchor_candidates))}
             "product_synthetic_included": bool(injected_docs),
             "injected_product_id": matched_pid,
             "forced_injection": forced_injection,
-            "fallback_injection_enabled": os.getenv("EVAL_FALLBACK_INJECT", "1") == "1",
-            "fallback_injection_terms": locals().get('anchor_tokens', []),
-            "synthetic_candidate_ids": list(synthetic_by_pid.keys()),
+            "product_match": product_match.as_dict() if product_match else None,
+            "product_lookup_us": product_lookup_us,
+            "synthetic_candidate_ids": synthetic_candidate_ids,
             "grounding_regen": grounding_regen,
             "grounding_missing_tokens": grounding_missing_tokens,
             "prompt_truncated": prompt_truncated,
             "approx_prompt_tokens": approx_tokens,
-            "low_overlap_trigger": low_overlap_trigger
+            "low_overlap_trigger": low_overlap_trigger,
+            "generation_mode": "llm",
+            "cache_hit": False
         }
     }
+
+    # Ne jamais mettre en cache un échec de génération ni un rerank tronqué par le budget cross-encoder
+    generation_failed = result is None or str(result).startswith("<error")
+    if EVAL_CACHE_ENABLED and not generation_failed and not rerank_stats.get("budget_exhausted"):
+        _global_cache.set(cache_key, {"response": response, "debug": debug_response})
     
     print(f"⏱️ Évaluation terminée en {total_time:.2f}s")
     print(f"📊 Réponse d'évaluation finale ({len(sanitized_answer)} chars) sentences={sanitize_meta.get('final_sentence_count')} overlap={overlap_ratio}")
 
     # Stream the response as chunks
-    json_str = json.dumps(response)
-    chunk_size = 1024
-    for i in range(0, len(json_str), chunk_size):
-        yield json_str[i:i+chunk_size]
+    for chunk in _stream_json(response):
+        yield chunk
 
 from pydantic import BaseModel
 
@@ -516,7 +600,10 @@ class ProductRequest(BaseModel):
     debug: bool = False
     rerank: bool = False
     source_filter: str | None = None
+    filter: str | None = None
     top_n: int = 3
+    rerank_budget_ms: float | None = None
+    generation_mode: str | None = None  # llm | template | mixed (défaut: EVAL_GENERATION_MODE)
 
 @router.post("/evaluate")
 async def evaluate(request: ProductRequest):
@@ -524,13 +611,23 @@ async def evaluate(request: ProductRequest):
         raise HTTPException(status_code=400, detail="Description produit trop longue (>1000 caractères)")
     if request.top_n < 1 or request.top_n > 10:
         raise HTTPException(status_code=400, detail="top_n doit être entre 1 et 10")
+    try:
+        request_filter(request.source_filter or "", request.filter or "")
+        parse_generation_mode(request.generation_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Index incompatible avec le provider d'embeddings: 503 (handler de l'app) avant l'ouverture du flux
+    vector_store_manager.get_vectordb()
     return StreamingResponse(
         generate_streaming_response(
             request.product_description,
             request.debug,
             rerank=request.rerank,
             source_filter=request.source_filter or "",
-            top_n=request.top_n
+            top_n=request.top_n,
+            rerank_budget_ms=request.rerank_budget_ms,
+            metadata_filter=request.filter or "",
+            generation_mode=request.generation_mode
         ),
         media_type="application/json"
     )
\ No newline at end of file
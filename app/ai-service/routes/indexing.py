@@ -1,62 +1,67 @@
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
 from pydantic import BaseModel
 from rag.vectorstore_manager import VectorStoreManager
-from rag.loader import load_all_documents
-from rag.vectorstore import create_vectorstore
-from rag.scripts.smoke_check import DEFAULT_QUERIES
-from rag.scripts.smoke_check import load_index as smoke_load_index
+from rag.incremental import build_and_activate, files_for_index
+from rag.index_versions import MAIN_INDEX, activate, current_version, index_root, list_versions, previous_version
+from rag.federated import federated_search, parse_spec
+from rag.metadata_filter import format_filter, matches, parse_filter
 from core.config import settings
+from core.cache import _global_cache
 import threading
 import os
 
 router = APIRouter()
 vsm = VectorStoreManager()
+# Une seule construction de version à la fois
+_reindex_lock = threading.Lock()
+
+
+def _index_name(index: str) -> str:
+    """Index nommé connu (main_index ou FEDERATED_INDEXES), sinon 404."""
+    if index != MAIN_INDEX and index not in parse_spec(settings.FEDERATED_INDEXES):
+        raise HTTPException(status_code=404, detail=f"Unknown index: {index}")
+    return index
 
 
 class SearchRequest(BaseModel):
     query: str
     k: int = 3
+    # Filtre métadonnées exécuté dans l'index, ex: "type=csv|pdf,synthetic=true"
+    filter: str | None = None
 
 
 @router.post('/reindex')
-def reindex(background_tasks: BackgroundTasks, sync: bool = Query(False, description="Run reindex synchronously"), verify: bool = Query(False, description="Run smoke-check verification after reindex")):
-    """Trigger a reindex. By default runs in background; set sync=true to run inline."""
+def reindex(background_tasks: BackgroundTasks, sync: bool = Query(False, description="Run reindex synchronously"), verify: bool = Query(False, description="Run smoke-check verification after reindex"), full: bool = Query(False, description="Full rebuild instead of incremental update"), index: str = Query(MAIN_INDEX, description="Named index to rebuild (main_index, synthetic_index...)"), load_workers: int | None = Query(None, ge=0, le=64, description="Processes parsing files in parallel (default LOAD_WORKERS, 0 = sequential)")):
+    """Trigger a reindex. By default runs in background; set sync=true to run inline.
+
+    Incremental by default (only new/changed/removed files are processed); full=true rebuilds everything.
+    Each named index is versioned and rebuilt independently.
+    """
+    index = _index_name(index)
     sm_result = None
+    reindex_stats = None
 
     def _run():
+        nonlocal reindex_stats, sm_result
         try:
-            docs = load_all_documents()
-            create_vectorstore(docs, persist_path=os.path.join(settings.FAISS_DIR, 'main_index'))
-            # Reset manager so next get will reload the new index
-            vsm._initialized = False
-            vsm._vectordb = None
-            if verify:
-                try:
-                    idx = smoke_load_index(os.path.join(settings.FAISS_DIR, 'main_index'))
-                    verification = {}
-                    for q in DEFAULT_QUERIES:
-                        try:
-                            res = idx.similarity_search_with_score(q, k=3)
-                            rows = []
-                            if res and isinstance(res[0], tuple):
-                                for doc, score in res:
-                                    rows.append({'score': float(score), 'source': doc.metadata.get('source'), 'snippet': (doc.page_content or '')[:300]})
-                            else:
-                                for doc in res:
-                                    rows.append({'score': None, 'source': doc.metadata.get('source'), 'snippet': (doc.page_content or '')[:300]})
-                            verification[q] = rows
-                        except Exception as e:
-                            verification[q] = {'error': str(e)}
-                    nonlocal sm_result
-                    sm_result = {'verification': verification}
-                except Exception as e:
-                    sm_result = {'error': str(e)}
+            # Construction dans main_index/<version>/, validation smoke-check, puis bascule atomique de CURRENT
+            with _reindex_lock:
+                reindex_stats = build_and_activate(full=full, root=index_root(index), files=files_for_index(index),
+                                                   load_workers=load_workers)
+                sm_result = {'verification': reindex_stats.pop('verification', None)}
+                if reindex_stats.get('activated'):
+                    # Échange à chaud: les requêtes en cours terminent sur l'ancien index
+                    vsm.reload(index)
+                    # Les évaluations en cache dépendent de l'ancien index
+                    _global_cache.clear('eval')
         except Exception as e:
             print('Reindex error:', e)
+            sm_result = {'error': str(e)}
 
     if sync:
         _run()
-        resp = {"status": "reindex_completed"}
+        activated = bool(reindex_stats and reindex_stats.get('activated'))
+        resp = {"status": "reindex_completed" if activated else "reindex_failed", "stats": reindex_stats}
         if verify:
             resp['verification'] = sm_result
         return resp
@@ -65,21 +70,48 @@ def reindex(background_tasks: BackgroundTasks, sync: bool = Query(False, descrip
         return {"status": "reindex_started"}
 
 
+@router.get('/index/versions')
+def index_versions(index: str = Query(MAIN_INDEX, description="Named index")):
+    """List persisted index versions and the active one."""
+    root = index_root(_index_name(index))
+    return {'index': index, 'current': current_version(root), 'loaded': vsm.get_version(index),
+            'versions': list_versions(root)}
+
+
+@router.post('/index/rollback')
+def index_rollback(version: str = Query(None, description="Version to activate (default: previous one)"),
+                   index: str = Query(MAIN_INDEX, description="Named index")):
+    """Point CURRENT back to a kept version and hot-swap it."""
+    root = index_root(_index_name(index))
+    target = version or previous_version(root)
+    if not target or target not in list_versions(root):
+        raise HTTPException(status_code=404, detail='No such index version')
+    with _reindex_lock:
+        activate(target, root=root)
+        vsm.reload(index)
+        _global_cache.clear('eval')
+    return {'status': 'rolled_back', 'index': index, 'current': target}
+
+
 @router.post('/search')
 def search(req: SearchRequest):
     if req.k < 1 or req.k > 10:
         raise HTTPException(status_code=400, detail='k must be between 1 and 10')
+    try:
+        where = parse_filter(req.filter or '')
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     vectordb = vsm.get_vectordb()
     if not vectordb:
         raise HTTPException(status_code=500, detail='Vectorstore not available')
-    # Use the vectorstore directly to obtain scores
+    # Recherche hybride BM25 + dense fédérée sur FEDERATED_INDEXES (score RRF; distance L2 si un seul index sans BM25)
     try:
-        results = vectordb.similarity_search_with_score(req.query, k=req.k)
+        results = federated_search(req.query, k=req.k, where=where)
     except Exception:
         # Fallback to retriever API if direct call not supported
         retriever = vectordb.as_retriever(search_type='similarity', search_kwargs={'k': req.k})
         docs = retriever.get_relevant_documents(req.query)
-        results = [(d, None) for d in docs]
+        results = [(d, None) for d in docs if matches(d.metadata, where)]
 
     def sanitize_meta(meta: dict):
         if not meta:
@@ -115,4 +147,4 @@ def search(req: SearchRequest):
             'metadata': sanitize_meta(doc.metadata)
         })
 
-    return {'query': req.query, 'k': req.k, 'results': out}
+    return {'query': req.query, 'k': req.k, 'filter': format_filter(where), 'results': out}
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, HTTPException, Query
+from rag.agribalyse import DEFAULT_INDICATOR, get_engine
+from typing import Optional
+
+router = APIRouter()
+
+
+def _engine():
+    try:
+        return get_engine()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=f"Agribalyse data not available: {e}")
+
+
+# Déclarée avant /products/{code} (sinon "search" serait pris pour un code)
+@router.get('/products/search')
+def search_products(
+    q: str = Query("", max_length=200, description="Nom du produit (préfixes / fautes tolérés)"),
+    group: Optional[str] = Query(None, description="Groupe d'aliment (préfixe, sans accents)"),
+    subgroup: Optional[str] = Query(None, description="Sous-groupe d'aliment (préfixe, sans accents)"),
+    limit: int = Query(10, ge=1, le=100),
+):
+    """Agribalyse products by name / food group, served from the columnar engine (no embedding)."""
+    if not q.strip() and not group and not subgroup:
+        raise HTTPException(status_code=400, detail="q, group or subgroup is required")
+    results = _engine().search(q, group=group, subgroup=subgroup, limit=limit)
+    return {"query": q, "group": group, "subgroup": subgroup, "count": len(results), "results": results}
+
+
+@router.get('/products/subgroups')
+def subgroup_medians(indicator: str = Query(DEFAULT_INDICATOR, description="Indicateur de agribalyse_synthese")):
+    """Median of an indicator per food subgroup."""
+    engine = _engine()
+    try:
+        return {"indicator": engine.resolve_indicator(indicator), "subgroups": engine.subgroup_medians(indicator)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get('/products/{code}')
+def get_product(code: str, indicator: str = Query(DEFAULT_INDICATOR, description="Indicateur pour étapes / comparaison")):
+    """Product card by Code AGB or Code CIQUAL: indicators, subgroup median, stages, ingredients."""
+    engine = _engine()
+    try:
+        card = engine.product(code.strip(), indicator)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if card is None:
+        raise HTTPException(status_code=404, detail=f"Unknown product code: {code}")
+    return card
@@ -0,0 +1,115 @@
+import itertools
+import os
+import sys
+import zlib
+from functools import partial
+
+import numpy as np
+import pytest
+
+sys.path.append(os.getcwd())
+
+try:
+    from langchain_core.embeddings import Embeddings
+except Exception:
+    from langchain.embeddings.base import Embeddings
+
+try:
+    from langchain_community.vectorstores import FAISS
+except Exception:
+    from langchain.vectorstores import FAISS
+
+try:
+    from langchain.schema import Document
+except Exception:
+    from langchain.docstore.document import Document
+
+
+# Extraits Agribalyse (en-têtes réels, BOM compris) pour le fixture csv_dir
+SYNTHESE = '''﻿"Code AGB","Code CIQUAL","Groupe d'aliment","Sous-groupe d'aliment","Nom du Produit en Français","Approche emballage ","Score unique EF","Changement climatique"
+"100",100,"poissons","poissons cuits","Sardine, à l'huile, appertisée","PACK PROXY",0.5,4.0
+"101",101,"poissons","poissons cuits","Thon albacore, au naturel","PACK PROXY",0.9,6.0
+"102",102,"poissons","poissons cuits","Maquereau fumé","PACK PROXY",0.7,
+"200",200,"féculents","pâtes","Pâtes alimentaires cuites","PACK PROXY",0.2,1.0
+"201",201,"féculents","pâtes","Pâtes fraîches aux oeufs","PACK PROXY",0.3,2.0
+'''
+
+ETAPES = '''"Code AGB","Code CIQUAL","Nom du Produit en Français","Changement climatique - Agriculture","Changement climatique - Transformation","Changement climatique - Emballage","Changement climatique - Transport","Changement climatique - Supermarché et distribution","Changement climatique - Consommation"
+"100",100,"Sardine, à l'huile, appertisée",2.0,1.0,0.6,0.3,0.1,0
+'''
+
+INGREDIENTS = '''"Ciqual  AGB","Ciqual  code","Nom Français","Ingredients","Changement climatique"
+"100","100","Sardine, à l'huile, appertisée","Sardine",3.1
+"100","100","Sardine, à l'huile, appertisée","Huile d'olive",0.5
+'''
+
+
+# Mots-clés des vecteurs 'keywords' (un axe par mot + biais)
+VOCAB = ('sardine', 'huile', 'pizza', 'carton', 'avoine')
+
+
+def _keyword_vector(text, vocab=VOCAB):
+    low = text.lower()
+    return [1.0 if w in low else 0.0 for w in vocab] + [0.1]
+
+
+def _length_vector(text):
+    # Distance L2² entre deux textes = (écart de longueur)²
+    return [float(len(text)), 0.0]
+
+
+def _seeded_vector(text, dim=16):
+    rng = np.random.default_rng(zlib.crc32(text.encode('utf-8')))
+    return rng.normal(size=dim).tolist()
+
+
+VECTORS = {'keywords': _keyword_vector, 'length': _length_vector, 'seeded': _seeded_vector}
+_ids = itertools.count()
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic embeddings; records the encoded queries and documents."""
+
+    def __init__(self, kind='keywords', **params):
+        self._vector = partial(VECTORS[kind], **params)
+        # Nom unique: le cache de requêtes (rag.embeddings) est partagé par tout le processus
+        self.model_name = f"fake-{kind}-{next(_ids)}"
+        self.queries = []
+        self.documents = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self._vector(text)
+
+    def embed_documents(self, texts):
+        self.documents.extend(texts)
+        return [self._vector(t) for t in texts]
+
+    def __call__(self, text):
+        return self.embed_query(text)
+
+
+@pytest.fixture
+def fake_embeddings():
+    """Factory: fake_embeddings('keywords' | 'length' | 'seeded', **params) -> FakeEmbeddings."""
+    return FakeEmbeddings
+
+
+@pytest.fixture
+def make_store():
+    """Factory: in-memory FAISS store from Documents, or from texts (+ metadatas)."""
+    def make(emb, items, metadatas=None):
+        items = list(items)
+        if items and isinstance(items[0], Document):
+            return FAISS.from_documents(items, emb)
+        return FAISS.from_texts(items, emb, metadatas=metadatas)
+    return make
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    """Directory with small Agribalyse synthese / etapes / ingredients CSV exports."""
+    for name, content in (('agribalyse_synthese.csv', SYNTHESE), ('agribalyse_etapes.csv', ETAPES),
+                          ('agribalyse_ingredients.csv', INGREDIENTS)):
+        (tmp_path / name).write_text(content, encoding='utf-8')
+    return str(tmp_path)
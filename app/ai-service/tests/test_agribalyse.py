@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.getcwd())
+
+from rag.agribalyse import AgribalyseEngine, get_engine
+
+
+def test_typed_columns_and_search(csv_dir):
+    engine = AgribalyseEngine.from_dir(csv_dir)
+    assert engine.synthese.get('Changement climatique').dtype == np.float64
+    assert engine.synthese.get('Code AGB')[0] == '100'
+    assert 'Approche emballage' in engine.synthese.columns
+    assert [r['code_agb'] for r in engine.search('sard')] == ['100']       # préfixe
+    assert [r['code_agb'] for r in engine.search('maquerau')] == ['102']   # trigrammes
+    assert [r['code_agb'] for r in engine.search('pates', subgroup='pâtes')] == ['201', '200']  # à score égal, nom le plus court
+    assert [r['code_agb'] for r in engine.search('', group='poisson', limit=2)] == ['102', '101']
+    assert engine.search('chocolat') == []
+
+
+def test_product_card_stages_and_subgroup_median(csv_dir):
+    engine = get_engine(csv_dir)
+    assert get_engine(csv_dir) is engine
+    card = engine.product('100')
+    assert card['indicators']['Changement climatique'] == 4.0
+    # Médiane du sous-groupe sur les valeurs renseignées (4.0, 6.0)
+    assert card['subgroup_comparison']['subgroup_median'] == 5.0
+    assert card['subgroup_comparison']['ratio_to_median'] == 0.8
+    stages = {s['stage']: s for s in card['stages']['stages']}
+    assert stages['Agriculture']['value'] == 2.0 and stages['Agriculture']['share'] == 0.5
+    assert [i['ingredient'] for i in card['ingredients']] == ['Sardine', "Huile d'olive"]
+    assert engine.subgroup_medians('changement climatique') == {
+        'poissons cuits': {'median': 5.0, 'count': 2}, 'pâtes': {'median': 1.5, 'count': 2}}
+    assert engine.product('102')['indicators']['Changement climatique'] is None
+    assert engine.product('999') is None
+    with pytest.raises(ValueError):
+        engine.product('100', indicator='inconnu')
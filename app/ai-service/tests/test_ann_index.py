@@ -0,0 +1,66 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from core.config import settings
+from rag.ann import build_index, recall_report, load_flat_sidecar
+from rag.incremental import reindex_incremental
+
+from rag.index_store import load_vectorstore
+
+
+def _data(n=3000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n, dim)).astype(np.float32)
+    m = min(100, n)
+    q = x[:m] + rng.normal(0, 0.05, size=(m, dim)).astype(np.float32)
+    return x, q
+
+
+def test_recall_report_against_flat():
+    x, q = _data()
+    configs = [{'type': 'flat'}, {'type': 'hnsw'}, {'type': 'ivf'}, {'type': 'sq8'},
+               {'type': 'ivfpq', 'pq_m': 8, 'pq_nbits': 4}]  # PQ réduit: entraînement rapide en CI
+    rows = {r['config']['type']: r for r in recall_report(x, q, k=5, configs=configs)}
+    assert rows['flat']['recall_at_k'] == 1.0
+    assert rows['hnsw']['recall_at_k'] >= 0.9
+    assert rows['sq8']['recall_at_k'] >= 0.9
+    assert rows['ivf']['recall_at_k'] >= 0.5
+    # PQ / SQ8 compressent les vecteurs
+    assert rows['ivfpq']['bytes'] < rows['flat']['bytes']
+    assert rows['sq8']['bytes'] < rows['flat']['bytes']
+
+
+def test_small_corpus_clamps_training_params():
+    x, _ = _data(n=50, dim=12)
+    _, p = build_index(x, {'type': 'ivfpq', 'nlist': 64, 'nprobe': 99, 'pq_m': 5, 'pq_nbits': 8})
+    assert p['nlist'] == 1 and p['nprobe'] == 1
+    assert 12 % p['pq_m'] == 0 and p['pq_nbits'] <= 5
+
+
+def test_reindex_records_ann_type_and_keeps_incremental(tmp_path, monkeypatch, fake_embeddings):
+    monkeypatch.setattr(settings, 'FAISS_INDEX_TYPE', 'hnsw')
+    files = []
+    for i in range(3):
+        path = str(tmp_path / f"f{i}.txt")
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(f"document numéro {i}")
+        files.append(path)
+    persist = str(tmp_path / 'idx')
+    emb = fake_embeddings('seeded', dim=8)
+    reindex_incremental(persist, files=files, embeddings=emb)
+
+    with open(os.path.join(persist, 'embedding_meta.json'), encoding='utf-8') as fh:
+        assert __import__('json').load(fh)['ann']['type'] == 'hnsw'
+    db = load_vectorstore(os.path.join(persist, 'faiss_index'), emb, lazy=False)
+    assert hasattr(db.index, 'hnsw') and db.index.ntotal == 3
+    assert load_flat_sidecar(os.path.join(persist, 'faiss_index')).ntotal == 3
+
+    # Suppression d'un fichier: possible grâce aux vecteurs exacts conservés
+    stats = reindex_incremental(persist, files=files[1:], embeddings=emb)
+    assert stats['removed'] == 1
+    db = load_vectorstore(os.path.join(persist, 'faiss_index'), emb, lazy=False)
+    assert db.index.ntotal == 2 and len(db.index_to_docstore_id) == 2
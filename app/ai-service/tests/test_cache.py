@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from core.cache import LRUCache, estimate_size
+
+
+def test_lru_evicts_least_recently_used():
+    c = LRUCache(max_size=2, ttl_seconds=60)
+    c.set('ask:a', 1)
+    c.set('ask:b', 2)
+    assert c.get('ask:a') == 1  # touch a -> b devient LRU
+    c.set('ask:c', 3)
+    assert c.get('ask:b') is None
+    assert c.get('ask:a') == 1
+    assert c.get('ask:c') == 3
+    assert c.stats()['evictions'] == 1
+
+
+def test_byte_budget_weighs_large_values():
+    big = {'result': 'x' * 10000, 'source_documents': ['y' * 5000]}
+    c = LRUCache(max_size=100, ttl_seconds=60, max_bytes=estimate_size(big) + 60)
+    c.set('ask:small1', 'a')
+    c.set('ask:small2', 'b')
+    c.set('ask:big', big)
+    stats = c.stats()
+    assert stats['bytes'] <= c.max_bytes
+    assert c.get('ask:big') == big
+    assert c.get('ask:small1') is None
+
+
+def test_namespace_limit_only_evicts_own_namespace():
+    c = LRUCache(max_size=100, ttl_seconds=60, namespace_limits={'eval': estimate_size('z' * 100) + 10})
+    c.set('ask:q', 'keep')
+    c.set('eval:1', 'z' * 100)
+    c.set('eval:2', 'z' * 100)
+    assert c.get('eval:1') is None
+    assert c.get('eval:2') is not None
+    assert c.get('ask:q') == 'keep'
+
+
+def test_ttl_expiry_and_counters():
+    c = LRUCache(max_size=10, ttl_seconds=0.05)
+    c.set('ask:a', 1)
+    time.sleep(0.1)
+    assert c.get('ask:a') is None
+    c.set('ask:b', 2)
+    c.set('ask:c', 3)
+    time.sleep(0.1)
+    assert c.purge_expired() == 2
+    stats = c.stats()
+    assert stats['expirations'] == 3
+    assert stats['misses'] == 1
+    assert stats['entries'] == 0 and stats['bytes'] == 0
+
+
+def test_cached_answer_semantic_tier(monkeypatch):
+    import core.cache as cache_module
+    from core.config import settings
+    monkeypatch.setattr(settings, 'SEMANTIC_CACHE_ENABLED', True)
+    monkeypatch.setattr(cache_module, '_global_cache', LRUCache(max_size=10, ttl_seconds=60))
+    monkeypatch.setattr(cache_module, '_semantic_cache', cache_module.SemanticCache(max_entries=4, threshold=0.9))
+    monkeypatch.setattr(cache_module, '_persistent_cache', None)
+
+    vectors = {
+        'empreinte carbone des sardines ?': [1.0, 0.0, 0.1],
+        "Quelle est l'empreinte carbone des sardines": [0.98, 0.0, 0.12],
+        'emballage des pizzas': [0.0, 1.0, 0.0],
+    }
+    calls = []
+
+    def gen(q):
+        return lambda: calls.append(q) or {'result': q}
+
+    embed = vectors.__getitem__
+    v1, hit1 = cache_module.cached_answer('empreinte carbone des sardines ?', 'v1', gen('a'), embed_fn=embed)
+    v2, hit2 = cache_module.cached_answer("Quelle est l'empreinte carbone des sardines", 'v1', gen('b'), embed_fn=embed)
+    v3, hit3 = cache_module.cached_answer('empreinte carbone des sardines ?', 'v1', gen('c'), embed_fn=embed)
+    v4, hit4 = cache_module.cached_answer('emballage des pizzas', 'v1', gen('d'), embed_fn=embed)
+    assert (hit1, hit2, hit3, hit4) == (None, 'semantic', 'exact', None)
+    assert v2 == v1
+    assert calls == ['a', 'd']
+
+
+def test_persistent_tier_survives_memory_loss(tmp_path, monkeypatch):
+    import core.cache as cache_module
+    from core.config import settings
+    db = str(tmp_path / 'answers.sqlite')
+    monkeypatch.setattr(cache_module, '_global_cache', LRUCache(max_size=10, ttl_seconds=60))
+    monkeypatch.setattr(cache_module, '_persistent_cache', cache_module.PersistentCache(db))
+    monkeypatch.setattr(cache_module, 'index_signature', lambda: 'sig-a')
+
+    v1, hit1 = cache_module.cached_answer('Impact du verre ?', 'v1', lambda: {'result': 'r1'})
+    # Simule un redémarrage: mémoire vide, nouvelle connexion SQLite
+    monkeypatch.setattr(cache_module, '_global_cache', LRUCache(max_size=10, ttl_seconds=60))
+    monkeypatch.setattr(cache_module, '_persistent_cache', cache_module.PersistentCache(db))
+    v2, hit2 = cache_module.cached_answer('Impact du verre ?', 'v1', lambda: {'result': 'r2'})
+    assert (hit1, hit2) == (None, 'exact')
+    assert v2 == {'result': 'r1'}
+
+    # Changement de modèle ou d'index -> pas de réponse périmée
+    monkeypatch.setattr(settings, 'MODEL_NAME', 'other-model')
+    v3, hit3 = cache_module.cached_answer('Impact du verre ?', 'v1', lambda: {'result': 'r3'})
+    monkeypatch.setattr(cache_module, 'index_signature', lambda: 'sig-b')
+    v4, hit4 = cache_module.cached_answer('Impact du verre ?', 'v1', lambda: {'result': 'r4'})
+    assert (hit3, hit4) == (None, None)
+    assert v4 == {'result': 'r4'}
+
+
+def test_degraded_answer_is_served_but_not_stored(monkeypatch):
+    import core.cache as cache_module
+    monkeypatch.setattr(cache_module, '_global_cache', LRUCache(max_size=10, ttl_seconds=60))
+    monkeypatch.setattr(cache_module, '_persistent_cache', None)
+    monkeypatch.setattr(cache_module, 'index_signature', lambda: 'sig-a')
+
+    v1, hit1 = cache_module.cached_answer('Impact du carton ?', 'v1', lambda: {'result': 'partiel'}, store=False)
+    v2, hit2 = cache_module.cached_answer('Impact du carton ?', 'v1', lambda: {'result': 'complet'})
+    v3, hit3 = cache_module.cached_answer('Impact du carton ?', 'v1', lambda: {'result': 'partiel'}, store=False)
+    assert (v1, hit1) == ({'result': 'partiel'}, None)
+    assert (v2, hit2) == ({'result': 'complet'}, None)
+    # Une entrée complète existante reste servie
+    assert (v3, hit3) == ({'result': 'complet'}, 'exact')
+
+
+def test_single_flight_coalesces_and_propagates_errors():
+    import threading
+    from core.cache import SingleFlight
+    sf = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return 'answer'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sf.do('k', slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while sf.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(v == 'answer' for v, _ in results)
+
+    # Erreur propagée aux attendants, puis non mémorisée
+    gate = threading.Event()
+
+    def boom():
+        gate.wait(2)
+        raise RuntimeError('ollama down')
+
+    errors = []
+
+    def call():
+        try:
+            sf.do('e', boom)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while sf.coalesced < 6:
+        time.sleep(0.01)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert errors == ['ollama down'] * 3
+    assert sf.do('e', lambda: 'ok') == ('ok', False)
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import rag.rerank as rerank_module
+from core.config import settings
+from rag.cross_encoder import CrossEncoderReranker
+
+try:
+    from langchain.schema import Document
+except Exception:
+    from langchain.docstore.document import Document
+
+
+class FakeCrossEncoder:
+    """Score = nombre de mots de la question présents dans le chunk; latence simulée par batch."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        return [float(sum(w in t.lower() for w in q.lower().split())) for q, t in pairs]
+
+
+def _reranker(model, batch_size=16):
+    r = CrossEncoderReranker('fake', batch_size=batch_size)
+    r._model = model
+    return r
+
+
+def test_single_batch_scoring():
+    model = FakeCrossEncoder()
+    r = _reranker(model)
+    scores, exhausted = r.score('emballage verre', ['verre recyclé', 'emballage en verre', 'pizza'])
+    assert model.batches == [3]
+    assert scores == [1.0, 2.0, 0.0]
+    assert exhausted is False
+
+
+def test_budget_returns_partial_scores():
+    model = FakeCrossEncoder(delay=0.05)
+    r = _reranker(model, batch_size=2)
+    scores, exhausted = r.score('verre', ['verre'] * 6, budget_ms=60)
+    assert exhausted is True
+    assert scores[:2] == [1.0, 1.0]
+    assert scores[-1] is None
+
+
+def test_budget_applies_when_candidates_fit_in_one_batch():
+    # 6 candidats, RERANK_CE_BATCH_SIZE=16: un seul batch sans budget
+    model = FakeCrossEncoder(delay=0.05)
+    r = _reranker(model)
+    scores, exhausted = r.score('verre', ['verre'] * 6, budget_ms=60)
+    # Latence inconnue: batch de mesure, puis plus rien ne tient dans le budget restant
+    assert exhausted is True
+    assert model.batches == [4]
+    assert scores == [1.0] * 4 + [None] * 2
+    assert r.pair_ms is not None and r.pair_ms >= 12
+
+    # Latence connue: batch dimensionné sur le budget, échéance vérifiée avant le premier batch
+    model = FakeCrossEncoder(delay=0.03)
+    r = _reranker(model)
+    r.pair_ms = 10.0
+    scores, exhausted = r.score('verre', ['verre'] * 6, budget_ms=80)
+    assert exhausted is True and model.batches[0] == 2 and scores[-1] is None
+    model.batches.clear()
+    scores, exhausted = r.score('verre', ['verre'] * 6, budget_ms=0)
+    assert exhausted is True and model.batches == [] and scores == [None] * 6
+    # Sans budget: inchangé, un seul batch
+    scores, exhausted = r.score('verre', ['verre'] * 6)
+    assert exhausted is False and model.batches == [6]
+
+
+def test_rerank_documents_cross_encoder_backend(monkeypatch):
+    model = FakeCrossEncoder(delay=0.05)
+    monkeypatch.setattr(rerank_module, 'CROSS_ENCODER', _reranker(model, batch_size=2))
+    monkeypatch.setattr(settings, 'RERANK_BACKEND', 'cross_encoder', raising=False)
+    docs = [Document(page_content=t, metadata={'source': str(i)}) for i, t in enumerate(
+        ['pizza', 'carton emballage', 'emballage verre consigné', 'verre', 'divers'])]
+    stats = {}
+    top, scored = rerank_module.rerank_documents('emballage verre', docs, top_n=2, budget_ms=120, stats=stats)
+    assert stats['backend'] == 'cross_encoder'
+    assert stats['budget_exhausted'] is True
+    # batch de mesure = docs 0,1 ; batch suivant dimensionné sur le budget restant ; doc 4 non scoré -> ordre FAISS, score None
+    assert top[0].page_content == 'emballage verre consigné'
+    assert scored[-1] == (4, None)
+
+
+def test_rerank_cache_tag_includes_backend_and_budget(monkeypatch):
+    monkeypatch.setattr(settings, 'RERANK_BACKEND', 'cross_encoder', raising=False)
+    assert rerank_module.rerank_cache_tag(False, 50) == ''
+    assert rerank_module.rerank_cache_tag(True) == 'cross_encoder'
+    assert rerank_module.rerank_cache_tag(True, 50) != rerank_module.rerank_cache_tag(True, 400)
+    monkeypatch.setattr(settings, 'RERANK_BACKEND', 'bi_encoder', raising=False)
+    assert rerank_module.rerank_cache_tag(True) == 'bi_encoder'
@@ -0,0 +1,134 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from langchain_core.documents import Document
+
+from rag.embedding_pipeline import EmbeddingPipeline, chunk_batches
+
+
+class FakeEmbeddings:
+    """Vecteurs déterministes; enregistre la taille des lots encodés."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _vec(self, text):
+        return [float(len(text)), float(text.count('a')), float(sum(map(ord, text)) % 97)]
+
+    def embed_query(self, text):
+        return self._vec(text)
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        return [self._vec(t) for t in texts]
+
+    def __call__(self, text):
+        return self._vec(text)
+
+
+def fake_factory():
+    # Au niveau module: picklable pour les workers 'spawn'
+    return FakeEmbeddings()
+
+
+def _chunks(n):
+    docs = [Document(page_content=f"chunk {i} banane" * (1 + i % 3), metadata={"i": i}) for i in range(n)]
+    return docs, [f"id-{i}" for i in range(n)]
+
+
+def _by_id(db):
+    out = {}
+    for pos, doc_id in db.index_to_docstore_id.items():
+        out[doc_id] = (db.docstore.search(doc_id).page_content, list(db.index.reconstruct(int(pos))))
+    return out
+
+
+def test_pipeline_matches_serial_build_and_reports_throughput():
+    docs, ids = _chunks(23)
+    emb = FakeEmbeddings()
+    pipeline = EmbeddingPipeline(emb, batch_size=4, workers=0)
+    db = pipeline.build(chunk_batches(docs, ids, 10))
+
+    assert db.index.ntotal == 23
+    # Lots d'encodage de EMBED_BATCH_SIZE textes au plus
+    assert max(emb.calls) <= 4 and sum(emb.calls) == 23
+    for doc_id, (content, vec) in _by_id(db).items():
+        assert vec == pytest.approx(emb._vec(content))
+    assert db.docstore.search('id-5').metadata == {"i": 5}
+    assert pipeline.stats['chunks'] == 23 and pipeline.stats['chunks_per_second'] > 0
+
+    # Ajout dans un index existant
+    more, more_ids = _chunks(3)
+    db = EmbeddingPipeline(emb, batch_size=2, workers=0).build(
+        chunk_batches(more, [f"x-{i}" for i in more_ids], 2), db)
+    assert db.index.ntotal == 26
+
+
+def test_pipeline_propagates_producer_errors():
+    def _broken():
+        docs, ids = _chunks(4)
+        yield docs, ids
+        raise ValueError("lecture impossible")
+
+    with pytest.raises(ValueError):
+        EmbeddingPipeline(FakeEmbeddings(), batch_size=2, workers=0).build(_broken())
+
+
+def test_pipeline_process_pool_matches_in_process():
+    docs, ids = _chunks(12)
+    serial = _by_id(EmbeddingPipeline(FakeEmbeddings(), batch_size=3, workers=0)
+                    .build(chunk_batches(docs, ids, 5)))
+    pooled = EmbeddingPipeline(FakeEmbeddings(), batch_size=3, workers=2, embedder_factory=fake_factory)
+    db = pooled.build(chunk_batches(docs, ids, 5))
+    assert _by_id(db) == serial
+    assert pooled.stats['workers'] == 2
+
+
+class _FailingStore:
+    def add_embeddings(self, pairs, metadatas=None, ids=None):
+        raise RuntimeError("insertion impossible")
+
+
+def test_insert_failure_stops_upstream_stages():
+    consumed = []
+
+    def _batches():
+        for i in range(200):
+            consumed.append(i)
+            docs, ids = _chunks(2)
+            yield docs, [f"{i}-{x}" for x in ids]
+
+    with pytest.raises(RuntimeError):
+        EmbeddingPipeline(FakeEmbeddings(), batch_size=2, workers=0).build(_batches(), _FailingStore())
+    # Seuls les lots déjà en file sont chargés / encodés, pas le reste du corpus
+    assert len(consumed) < 20
+
+
+def test_in_process_build_restores_torch_threads(monkeypatch):
+    import types
+    state = {"threads": 8, "during": []}
+    fake_torch = types.SimpleNamespace(
+        get_num_threads=lambda: state["threads"],
+        set_num_threads=lambda n: state.update(threads=n),
+    )
+    monkeypatch.setitem(sys.modules, "torch", fake_torch)
+
+    class _Recording(FakeEmbeddings):
+        def embed_documents(self, texts):
+            state["during"].append(state["threads"])
+            return super().embed_documents(texts)
+
+    docs, ids = _chunks(4)
+    EmbeddingPipeline(_Recording(), batch_size=2, workers=0, torch_threads=3).build(chunk_batches(docs, ids, 2))
+    assert state["during"] and set(state["during"]) == {3}
+    # Le serveur API retrouve son réglage initial
+    assert state["threads"] == 8
+
+    with pytest.raises(RuntimeError):
+        EmbeddingPipeline(_Recording(), batch_size=2, workers=0, torch_threads=3).build(
+            chunk_batches(docs, ids, 2), _FailingStore())
+    assert state["threads"] == 8
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from core.config import settings
+from rag.eval_templates import (fmt_number, parse_generation_mode, product_metrics, render_agribalyse,
+                                render_synthetic, structured_evaluation)
+from rag.product_index import ProductMatch
+
+SARDINES = {
+    "id": "sardines_huile_olive",
+    "name": "Sardines entières à l’huile d’olive vierge extra",
+    "category": "poisson conserve",
+    "functional_unit": "100 g égoutté",
+    "carbon_footprint_g_co2e": 310,
+    "water_use_l": 14,
+    "energy_processing_kwh_per_kg": 0.85,
+    "packaging": {"primary": "Boîte acier étamé", "weight_g": 18, "recyclability": 0.92},
+    "transport_mode": "maritime + routier réfrigéré court segment",
+    "sourcing_region": "Atlantique Est",
+    "impact_breakdown_percent": {"pêche": 46, "transformation": 24, "emballage": 18, "transport": 12},
+    "improvement_recommendations": ["Augmenter taux d'acier recyclé dans la boîte"],
+}
+
+
+def test_render_synthetic_profile():
+    sentences = render_synthetic(SARDINES)
+    assert sentences[0] == ("Sardines entières à l’huile d’olive vierge extra, de catégorie poisson conserve, "
+                            "a une empreinte carbone de 310 g CO2e par unité fonctionnelle (100 g égoutté).")
+    assert sentences[1] == "Les principaux postes d'impact sont pêche (46 %), transformation (24 %) et emballage (18 %)."
+    assert "0,85 kWh/kg" in sentences[2]
+    assert sentences[3] == "L'emballage (Boîte acier étamé de 18 g) est recyclable à 92 %."
+    assert len(sentences) == 6
+    # Champs absents: phrases omises, pas d'invention
+    assert render_synthetic({"id": "x", "name": "Produit X"}) == ["L'empreinte carbone de Produit X n'est pas disponible."]
+    assert fmt_number(1450) == "1450" and fmt_number(0.125, 1) == "0,1"
+
+
+def test_parse_generation_mode():
+    assert parse_generation_mode("Template") == "template"
+    assert parse_generation_mode(None) == settings.EVAL_GENERATION_MODE
+    with pytest.raises(ValueError):
+        parse_generation_mode("fast")
+
+
+def test_structured_evaluation_sources(tmp_path, csv_dir, monkeypatch):
+    (tmp_path / "synthetic_products_env_metrics.json").write_text(
+        json.dumps({"products": [SARDINES]}), encoding="utf-8")
+    monkeypatch.setattr(settings, "JSON_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "CSV_DIR", csv_dir)
+    assert list(product_metrics()) == ["sardines_huile_olive"]
+
+    match = ProductMatch("sardines_huile_olive", "exact", float("inf"), ["1"])
+    synthetic = structured_evaluation("sardines à l'huile", match)
+    assert synthetic.kind == "synthetic" and "310 g CO2e" in synthetic.text()
+
+    # Sans profil synthétique: ligne Agribalyse (tous les jetons retrouvés dans le nom)
+    agb = structured_evaluation("sardine à l'huile appertisée")
+    assert agb.kind == "agribalyse" and agb.product_id == "100"
+    assert agb.sentences[0].startswith("Sardine, à l'huile, appertisée (poissons cuits) a un impact")
+    assert "20 % en dessous de la médiane des 2 produits" in agb.text()
+    assert "L'étape la plus contributrice est l'agriculture (50 %), suivie de la transformation (25 %)." in agb.sentences
+    assert "L'emballage représente 15 % de l'impact et le transport 7,5 %." in agb.sentences
+    # Couverture insuffisante ou filtre excluant les CSV: pas de gabarit
+    assert structured_evaluation("impact environnemental d'une sardine") is None
+    assert structured_evaluation("sardine à l'huile appertisée", where={"type": ["pdf"]}) is None
+
+
+def test_render_agribalyse_missing_values():
+    sentences = render_agribalyse({"name": "Maquereau fumé", "subgroup": "poissons cuits", "climate_change": None})
+    assert sentences == ["L'impact sur le changement climatique de Maquereau fumé (poissons cuits) "
+                         "n'est pas disponible dans Agribalyse."]
@@ -38,3 +38,28 @@ def test_evaluate_top_n_bounds():
     bad2 = {"product_description": "x", "top_n": 99}
     r2 = client.post("/evaluate", json=bad2)
     assert r2.status_code == 400
+
+
+def test_evaluate_result_cache_hit(monkeypatch):
+    import routes.evaluate as ev
+
+    class DummyLLM:
+        calls = 0
+
+        def invoke(self, prompt):
+            DummyLLM.calls += 1
+            return "Les sardines à l'huile d'olive ont une empreinte carbone modérée."
+
+    monkeypatch.setattr(ev, "get_llm", lambda: DummyLLM())
+    monkeypatch.setattr(ev, "ensure_ollama_warm", lambda: True)
+    ev._global_cache.clear('eval')
+    payload = {"product_description": "Sardines à l'huile d'olive", "top_n": 2}
+    first = json.loads(b"".join(client.post("/api/evaluate", json=payload).iter_bytes()))
+    calls_after_first = DummyLLM.calls
+    # Même produit, casse/accents différents -> même clé normalisée
+    payload["product_description"] = "SARDINES a l'huile d'olive"
+    second = json.loads(b"".join(client.post("/api/evaluate", json=payload).iter_bytes()))
+    assert first["debug_info"]["cache_hit"] is False
+    assert second["debug_info"]["cache_hit"] is True
+    assert second["evaluation"] == first["evaluation"]
+    assert DummyLLM.calls == calls_after_first
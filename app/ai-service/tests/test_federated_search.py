@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from rag.federated import federated_search, parse_spec
+
+def _indexes(make_store, emb, synthetic_weight=1.0):
+    main_texts = ["x" * n for n in (10, 11, 12, 13, 14)]
+    synth_texts = ["s" * n for n in (30, 40)] + ["x" * 10]
+    main = make_store(emb, main_texts, [{'type': 'pdf'} for _ in main_texts])
+    synth = make_store(emb, synth_texts, [{'synthetic': True} for _ in synth_texts])
+    return [('main_index', 1.0, main, None), ('synthetic_index', synthetic_weight, synth, None)]
+
+
+def test_parse_spec():
+    assert parse_spec("main_index=1.0, synthetic_index=1.5,extra") == {
+        'main_index': 1.0, 'synthetic_index': 1.5, 'extra': 1.0}
+
+
+def test_single_shared_embedding_merge_and_dedupe(fake_embeddings, make_store):
+    emb = fake_embeddings('length')
+    stats = {}
+    results = federated_search("q" * 10, k=4, indexes=_indexes(make_store, emb), quotas={}, stats=stats)
+    assert len(emb.queries) == 1
+    texts = [d.page_content for d, _ in results]
+    # "x"*10 présent dans les deux index: une seule fois
+    assert len(texts) == len(set(texts)) == 4
+    assert texts[0] == "x" * 10
+    assert stats['quota_added'] == 0
+
+
+def test_quota_keeps_synthetic_chunks_under_distance_threshold(fake_embeddings, make_store):
+    emb = fake_embeddings('length')
+    # Poids faible: sans quota, seul le chunk commun "x"*10 viendrait de synthetic_index
+    stats = {}
+    results = federated_search("q" * 10, k=4, indexes=_indexes(make_store, emb, 0.5), quotas={'synthetic_index': 2},
+                               max_distance=0, stats=stats)
+    synthetic = [d for d, _ in results if d.metadata.get('synthetic')]
+    assert len(synthetic) == 2 and len(results) == 4
+    assert stats['quota_added'] == 1 and stats['indexes']['synthetic_index'] == 2
+    scores = [s for _, s in results]
+    assert scores == sorted(scores, reverse=True)
+
+    # Seuil de distance: "s"*30 (L2² = 400) est trop loin pour être ajouté par le quota
+    results = federated_search("q" * 10, k=4, indexes=_indexes(make_store, emb, 0.5), quotas={'synthetic_index': 2},
+                               max_distance=50.0, stats=stats)
+    assert stats['quota_added'] == 0
+    assert not any(d.page_content.startswith('s') for d, _ in results)
+
+
+def test_single_index_keeps_plain_scores(fake_embeddings, make_store):
+    emb = fake_embeddings('length')
+    main = _indexes(make_store, emb)[0]
+    results = federated_search("q" * 12, k=2, indexes=[main], quotas={'synthetic_index': 2})
+    assert [d.page_content for d, _ in results][0] == "x" * 12
+    assert results[0][1] == 0.0  # distance L2 brute
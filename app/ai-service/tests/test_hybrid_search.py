@@ -0,0 +1,59 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from rag.hybrid import BM25Index, analyze, hybrid_search, rrf_fuse
+
+try:
+    from langchain.schema import Document
+except Exception:
+    from langchain.docstore.document import Document
+
+
+def _docs():
+    return [
+        Document(page_content="Emballage carton recyclé pour céréales", metadata={'source': 'a.pdf'}),
+        Document(page_content="Impact de la pizza surgelée", metadata={'source': 'b.pdf'}),
+        Document(page_content="Sardines à l'huile d'olive en conserve, boîte métal",
+                 metadata={'source': 'synthetic', 'synthetic': True, 'product_id': 'sardines'}),
+        Document(page_content="Transport maritime des marchandises", metadata={'source': 'c.pdf'}),
+    ]
+
+
+def test_analyze_folds_accents_and_plurals():
+    assert analyze("Les Sardines à l'huile d'olive") == ['sardine', 'huile', 'olive']
+    assert analyze("céréales") == analyze("cereale")
+
+
+def test_bm25_ranks_exact_terms_and_roundtrips(tmp_path):
+    items = [(f"id{i}", d.page_content) for i, d in enumerate(_docs())]
+    index = BM25Index.build(items)
+    hits = index.search("sardine huile", k=3)
+    assert hits[0][0] == 'id2'
+    assert index.search("inconnu", k=3) == []
+
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.search("sardine huile", k=3) == hits
+    assert BM25Index.load(str(tmp_path / 'missing')) is None
+
+
+def test_rrf_fuse_prefers_items_ranked_by_both():
+    fused = rrf_fuse([['a', 'b', 'c'], ['c', 'a']], rrf_k=60)
+    assert [k for k, _ in fused] == ['a', 'c', 'b']
+
+
+def test_hybrid_search_surfaces_sparse_match(fake_embeddings, make_store):
+    # Vecteurs = longueur du texte: aucune information lexicale, le dense seul ne distingue pas les produits
+    vectordb = make_store(fake_embeddings('length'), _docs())
+    sparse = BM25Index.from_vectorstore(vectordb)
+    assert len(sparse) == 4
+
+    dense_only = vectordb.similarity_search_with_score("sardines en conserve", k=1)
+    assert dense_only[0][0].metadata.get('product_id') != 'sardines'
+
+    results = hybrid_search("sardines en conserve", k=2, vectordb=vectordb, sparse=sparse)
+    assert results[0][0].metadata.get('product_id') == 'sardines'
+    # Même objet Document que le docstore (pas de doublon dense/sparse)
+    assert len({id(d) for d, _ in results}) == len(results)
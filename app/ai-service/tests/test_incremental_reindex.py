@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from rag.incremental import reindex_incremental, load_manifest
+
+from rag.index_store import load_vectorstore
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(text)
+
+
+def _contents(persist, emb):
+    db = load_vectorstore(os.path.join(persist, 'faiss_index'), emb, lazy=False)
+    return sorted(d.page_content for d in db.docstore._dict.values()), db.index.ntotal
+
+
+def test_incremental_reindex_only_touches_changed_files(tmp_path, fake_embeddings):
+    corpus = tmp_path / 'corpus'
+    corpus.mkdir()
+    persist = str(tmp_path / 'index')
+    a, b, c = (str(corpus / n) for n in ('a.txt', 'b.txt', 'c.txt'))
+    _write(a, "Sardines en conserve")
+    _write(b, "Pizza surgelée")
+
+    emb = fake_embeddings('length')
+    stats = reindex_incremental(persist, files=[a, b], embeddings=emb)
+    assert stats['mode'] == 'full' and stats['chunks_added'] == 2
+    assert os.path.isfile(os.path.join(persist, 'embedding_meta.json'))
+    assert len(load_manifest(persist)['files']) == 2
+
+    # Rien n'a changé: aucun embedding
+    emb = fake_embeddings('length')
+    stats = reindex_incremental(persist, files=[a, b], embeddings=emb)
+    assert stats['unchanged'] == 2 and emb.documents == []
+
+    # b modifié, a supprimé, c ajouté: seuls b et c sont ré-encodés
+    _write(b, "Pizza surgelée au fromage")
+    _write(c, "Flocons d'avoine")
+    emb = fake_embeddings('length')
+    stats = reindex_incremental(persist, files=[b, c], embeddings=emb)
+    assert (stats['added'], stats['changed'], stats['removed']) == (1, 1, 1)
+    assert sorted(emb.documents) == ["Flocons d'avoine", "Pizza surgelée au fromage"]
+    contents, ntotal = _contents(persist, emb)
+    assert contents == ["Flocons d'avoine", "Pizza surgelée au fromage"]
+    assert ntotal == 2
+
+    # Reconstruction complète sur demande
+    emb = fake_embeddings('length')
+    stats = reindex_incremental(persist, files=[b, c], embeddings=emb, full=True)
+    assert stats['mode'] == 'full' and len(emb.documents) == 2
@@ -0,0 +1,141 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from rag.index_store import ReadOnlyDocstoreError, SQLiteDocstore, load_vectorstore, save_vectorstore
+from rag.hybrid import BM25Index, hybrid_search
+import rag.rerank as rerank_module
+
+try:
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+except Exception:
+    from langchain.vectorstores import FAISS
+    from langchain.docstore.in_memory import InMemoryDocstore
+
+try:
+    from langchain.schema import Document
+except Exception:
+    from langchain.docstore.document import Document
+
+
+@pytest.fixture
+def saved_store(tmp_path, fake_embeddings, make_store):
+    docs = [
+        Document(page_content="Sardines à l'huile", metadata={'source': 'a.pdf', 'page': 1}),
+        Document(page_content="Pizza surgelée", metadata={'source': 'b.pdf'}),
+        Document(page_content="Flocons d'avoine", metadata={'source': 'c.csv', 'synthetic': True}),
+    ]
+    db = make_store(fake_embeddings(), docs)
+    path = str(tmp_path / 'faiss_index')
+    save_vectorstore(db, path)
+    return db, path
+
+
+def test_saved_index_has_no_pickle_and_loads_lazily(saved_store, fake_embeddings):
+    _db, path = saved_store
+    assert sorted(os.listdir(path)) == ['docstore.sqlite', 'index.faiss']
+
+    vs = load_vectorstore(path, fake_embeddings())
+    assert isinstance(vs.docstore, SQLiteDocstore)
+    assert len(vs.index_to_docstore_id) == 3
+    doc, _score = vs.similarity_search_with_score('pizza', k=1)[0]
+    assert doc.page_content == "Pizza surgelée" and doc.metadata == {'source': 'b.pdf'}
+    # Lecture répétée: même objet (LRU)
+    assert vs.docstore.search(doc.id) is doc
+    assert vs.docstore.search('missing').startswith('ID missing')
+
+
+def test_lazy_store_supports_hybrid_and_stored_vector_rerank(saved_store, fake_embeddings, monkeypatch):
+    _db, path = saved_store
+    vs = load_vectorstore(path, fake_embeddings())
+    sparse = BM25Index.from_vectorstore(vs)
+    results = hybrid_search('flocons avoine', k=3, vectordb=vs, sparse=sparse)
+    assert results[0][0].page_content == "Flocons d'avoine"
+    assert len({d.id for d, _ in results}) == len(results)
+
+    emb = fake_embeddings()
+    monkeypatch.setattr(rerank_module, '_get_embeddings', lambda: emb)
+    top, _ = rerank_module.rerank_documents('sardines', [d for d, _ in results], top_n=1, vectordb=vs)
+    assert top[0].page_content == "Sardines à l'huile"
+    assert emb.documents == []  # vecteurs relus depuis l'index mmappé
+
+
+def test_materialized_load_matches(saved_store, fake_embeddings):
+    db, path = saved_store
+    vs = load_vectorstore(path, fake_embeddings(), lazy=False)
+    assert dict(vs.index_to_docstore_id) == dict(db.index_to_docstore_id)
+    assert sorted(d.page_content for d in vs.docstore._dict.values()) == sorted(
+        d.page_content for d in db.docstore._dict.values())
+
+
+# Mesure dans un processus neuf: l'allocateur du processus de test réutilise la mémoire libérée
+_MEASURE = """
+import json, os, sys
+sys.path.append(os.getcwd())
+import numpy as np
+from rag.index_store import load_vectorstore
+
+def rss_anon():
+    with open('/proc/self/status') as fh:
+        return next(int(l.split()[1]) for l in fh if l.startswith('RssAnon:'))
+
+path, mmap = sys.argv[1], sys.argv[2] == '1'
+import faiss  # noqa: F401 (import hors mesure)
+before = rss_anon()
+vs = load_vectorstore(path, None, mmap=mmap)
+vs.index.search(np.zeros((2, vs.index.d), dtype='float32'), 3)
+anon, current = 0, False
+with open('/proc/self/smaps') as fh:
+    for line in fh:
+        head = line.split()
+        if '-' in head[0] and ':' not in head[0]:
+            current = line.rstrip().endswith(os.path.join(path, 'index.faiss'))
+        elif current and head[0] == 'Anonymous:':
+            anon += int(head[1])
+print(json.dumps({"rss_anon_delta": rss_anon() - before, "anonymous": anon}))
+"""
+
+
+def _measure(path, mmap):
+    out = subprocess.run([sys.executable, '-c', _MEASURE, path, '1' if mmap else '0'],
+                         capture_output=True, text=True, check=True, cwd=os.getcwd())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/smaps'), reason="smaps Linux requis")
+@pytest.mark.parametrize('factory', ['Flat', 'HNSW16', 'IVF16,Flat'])
+def test_mmap_load_does_not_copy_index_into_private_memory(tmp_path, factory, fake_embeddings):
+    import faiss
+    import numpy as np
+    n, dim = 8000, 512
+    vectors = np.random.RandomState(0).rand(n, dim).astype('float32')
+    index = faiss.index_factory(dim, factory)
+    index.train(vectors)
+    index.add(vectors)
+    ids = [str(i) for i in range(n)]
+    db = FAISS(fake_embeddings(), index, InMemoryDocstore({i: Document(page_content=i) for i in ids}),
+               dict(enumerate(ids)))
+    path = str(tmp_path / 'faiss_index')
+    save_vectorstore(db, path)
+    data_kb = n * dim * 4 // 1024
+
+    mapped = _measure(path, mmap=True)
+    # Vecteurs servis depuis le cache de pages partagé: ni copie privée ni copy-on-write
+    assert mapped["rss_anon_delta"] < data_kb // 4 and mapped["anonymous"] == 0
+    copied = _measure(path, mmap=False)
+    assert copied["rss_anon_delta"] >= data_kb // 2
+
+
+def test_sqlite_docstore_is_read_only(saved_store, fake_embeddings):
+    _db, path = saved_store
+    vs = load_vectorstore(path, fake_embeddings())
+    with pytest.raises(ReadOnlyDocstoreError):
+        vs.docstore.add({'x': Document(page_content='x')})
+    with pytest.raises(ReadOnlyDocstoreError):
+        vs.docstore.delete(['x'])
@@ -0,0 +1,115 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from core.config import settings
+from rag import index_versions as iv
+from rag import vectorstore_manager as vsm_module
+from rag.incremental import build_and_activate
+from rag.model_registry import EmbeddingProviderMismatchError
+from rag.vectorstore_manager import VectorStoreManager
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(text)
+
+
+def test_build_validate_activate_and_rollback(tmp_path, fake_embeddings):
+    root = str(tmp_path / 'main_index')
+    a = str(tmp_path / 'a.txt')
+    _write(a, "Sardines en conserve")
+    emb = fake_embeddings()
+
+    first = build_and_activate(root=root, embeddings=emb, files=[a], queries=['sardines'])
+    assert first['activated']
+    assert iv.current_version(root) == first['version']
+    assert iv.active_index_dir(root) == os.path.join(root, first['version'])
+
+    _write(a, "Pizza surgelée")
+    second = build_and_activate(root=root, embeddings=emb, files=[a], queries=['pizza'])
+    assert second['activated'] and second['changed'] == 1
+    assert iv.previous_version(root) == first['version']
+    # L'ancienne version reste intacte pour un rollback instantané
+    assert os.path.isdir(os.path.join(root, first['version'], 'faiss_index'))
+
+    iv.activate(first['version'], root=root)
+    assert iv.current_version(root) == first['version']
+
+    # Construction invalide: CURRENT inchangé, répertoire jeté
+    before = iv.list_versions(root)
+    with pytest.raises(Exception):
+        build_and_activate(root=root, embeddings=emb, files=[], full=True, queries=['x'])
+    assert iv.current_version(root) == first['version']
+    assert iv.list_versions(root) == before
+
+
+def test_prune_keeps_active_version(tmp_path):
+    root = str(tmp_path)
+    for name in ('v1', 'v2', 'v3', 'v4'):
+        os.makedirs(os.path.join(root, name))
+    iv.activate('v1', root=root)
+    removed = iv.prune_versions(keep=2, root=root)
+    assert removed == ['v2']
+    assert iv.list_versions(root) == ['v1', 'v3', 'v4']
+
+
+def test_manager_hot_swap_keeps_old_handle(tmp_path, monkeypatch, fake_embeddings):
+    monkeypatch.setattr(settings, 'FAISS_DIR', str(tmp_path))
+    root = iv.index_root()
+    a = str(tmp_path / 'a.txt')
+    emb = fake_embeddings()
+    _write(a, "Sardines en conserve")
+    build_and_activate(root=root, embeddings=emb, files=[a], queries=['sardines'])
+
+    vsm = VectorStoreManager()
+    for attr in ('_vectordb', '_sparse', '_version', '_index_dir', '_initialized'):
+        monkeypatch.setattr(vsm, attr, getattr(vsm, attr))
+    monkeypatch.setattr(vsm, '_embeddings', emb)
+
+    v1 = vsm.reload()
+    old_db = vsm.get_vectordb()
+    assert vsm.get_version() == v1
+
+    _write(a, "Flocons d'avoine")
+    v2 = build_and_activate(root=root, embeddings=emb, files=[a], queries=['avoine'])['version']
+    assert vsm.reload() == v2
+    # Une requête en cours conserve l'ancien handle, les nouvelles voient la nouvelle version
+    assert 'Sardines' in old_db.similarity_search('sardines', k=1)[0].page_content
+    assert 'avoine' in vsm.get_vectordb().similarity_search('avoine', k=1)[0].page_content
+    assert len(vsm.get_sparse_index()) == 1
+
+
+def test_provider_mismatch_at_load_is_not_rebuilt(tmp_path, monkeypatch, fake_embeddings):
+    monkeypatch.setattr(settings, 'FAISS_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'USE_OLLAMA_EMBEDDINGS', False)
+    monkeypatch.setattr(settings, 'EMBEDDING_BACKEND', 'torch', raising=False)
+    a = str(tmp_path / 'a.txt')
+    _write(a, "Sardines en conserve")
+    build_and_activate(root=iv.index_root(), embeddings=fake_embeddings(), files=[a], queries=['sardines'])
+
+    vsm = VectorStoreManager()
+    for attr in ('_vectordb', '_sparse', '_version', '_index_dir', '_initialized', '_extra'):
+        monkeypatch.setattr(vsm, attr, getattr(vsm, attr))
+    monkeypatch.setattr(vsm, '_embeddings', fake_embeddings())
+    monkeypatch.setattr(vsm, '_initialized', False)
+    monkeypatch.setattr(vsm, '_extra', {})
+
+    def _no_rebuild(*args, **kwargs):
+        raise AssertionError("reconstruction implicite de l'index")
+    monkeypatch.setattr(vsm_module, 'create_vectorstore', _no_rebuild)
+
+    # Runtime Ollama, index sentence-transformers: chargement refusé, pas de fallback
+    monkeypatch.setattr(settings, 'USE_OLLAMA_EMBEDDINGS', True)
+    with pytest.raises(EmbeddingProviderMismatchError):
+        vsm.get_vectordb()
+    assert not vsm._initialized
+
+    from fastapi.testclient import TestClient
+    from app import app
+    response = TestClient(app).post('/api/search', json={'query': 'sardines', 'k': 3})
+    assert response.status_code == 503
+    assert 'reindex' in response.json()['detail']
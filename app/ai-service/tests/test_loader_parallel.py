@@ -0,0 +1,70 @@
+import csv
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from core.config import settings
+from rag.loader import load_files, load_pdf, load_pdf_pages, pdf_page_count
+
+PDF = os.path.join(settings.PDF_DIR, 'PackagingData.pdf')
+
+
+def _dump(docs):
+    return [(d.page_content, d.metadata) for d in docs]
+
+
+@pytest.mark.skipif(not os.path.isfile(PDF) or pdf_page_count(PDF) < 3, reason="PDF de test absent")
+def test_pdf_page_ranges_match_pypdf_loader():
+    pages = pdf_page_count(PDF)
+    ranged = load_pdf_pages(PDF, 0, 2) + load_pdf_pages(PDF, 2, pages + 5)
+    assert _dump(ranged) == _dump(load_pdf(PDF))
+
+
+@pytest.mark.skipif(not os.path.isfile(PDF) or pdf_page_count(PDF) < 3, reason="PDF de test absent")
+def test_pdf_page_ranges_match_metadata_normalization(tmp_path):
+    import pypdf
+    writer = pypdf.PdfWriter(clone_from=PDF)
+    writer.add_metadata({"/CreationDate": "D:20240131120000+01'00'", "/ModDate": "pas une date",
+                         "/Title": "  Emballages  ", "/Page_Count": "99"})
+    writer.set_page_label(0, 1, style="/r")
+    path = str(tmp_path / "labels.pdf")
+    with open(path, 'wb') as fh:
+        writer.write(fh)
+    pages = pdf_page_count(path)
+    ranged = load_pdf_pages(path, 0, 1) + load_pdf_pages(path, 1, pages)
+    assert _dump(ranged) == _dump(load_pdf(path))
+    meta = ranged[1].metadata
+    assert meta["creationdate"] == "2024-01-31T12:00:00+01:00" and meta["moddate"] == "pas une date"
+    assert meta["title"] == "Emballages" and meta["page_label"] == "ii"
+
+
+def test_parallel_load_keeps_order_and_reports_failures(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"data_{i}.csv"
+        with open(path, 'w', encoding='utf-8', newline='') as fh:
+            w = csv.DictWriter(fh, fieldnames=["produit", "co2"])
+            w.writeheader()
+            w.writerows({"produit": f"p{i}_{r}", "co2": r} for r in range(3))
+        paths.append(str(path))
+    (tmp_path / "items.json").write_text(json.dumps([{"k": "v1"}, {"k": "v2"}]), encoding='utf-8')
+    (tmp_path / "broken.pdf").write_bytes(b"pas un pdf")
+    paths[2:2] = [str(tmp_path / "broken.pdf"), str(tmp_path / "items.json")]
+
+    sequential, seq_stats = [], {}
+    for path, docs in load_files(paths, workers=0, stats=seq_stats):
+        sequential.append((path, _dump(docs)))
+    parallel, par_stats = [], {}
+    for path, docs in load_files(paths, workers=2, stats=par_stats):
+        parallel.append((path, _dump(docs)))
+
+    assert [p for p, _ in parallel] == paths
+    assert parallel == sequential
+    assert par_stats["documents"] == seq_stats["documents"] == 14
+    assert [f["path"] for f in par_stats["files"] if f["error"]] == par_stats["failed"] == seq_stats["failed"]
+    assert len(par_stats["failed"]) == 1 and par_stats["failed"][0].endswith("broken.pdf")
+    assert all(f["seconds"] >= 0 and f["tasks"] == 1 for f in par_stats["files"])
@@ -91,3 +91,36 @@ def test_vectorstore_with_dummy_embeddings(tmp_path, monkeypatch):
     idx_dir = Path(str(persist)) / 'faiss_index'
     # The implementation may save into persist_path/faiss_index
     assert idx_dir.exists() or (Path(str(persist))).exists()
+
+
+def test_create_vectorstore_streams_generator_with_bounded_lookahead(tmp_path, monkeypatch):
+    produced = {"n": 0}
+    lookahead = []
+
+    def _docs():
+        for i in range(300):
+            produced["n"] += 1
+            yield Document(page_content=f"document numero {i}", metadata={"source": f"s{i % 3}.csv", "type": "csv"})
+
+    class RecordingEmbeddings:
+        embedded = 0
+
+        def embed_documents(self, texts):
+            # Documents déjà lus par le générateur mais pas encore encodés
+            lookahead.append(produced["n"] - self.embedded)
+            self.embedded += len(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+
+        def embed_query(self, text):
+            return [float(len(text)), 1.0]
+
+        def __call__(self, text):
+            return self.embed_query(text)
+
+    monkeypatch.setattr(vectorstore_module, 'get_embeddings', lambda: RecordingEmbeddings())
+    vs = vectorstore_module.create_vectorstore(_docs(), persist_path=str(tmp_path), batch_size=10)
+    assert vs.index.ntotal == 300
+    # Files bornées entre chargement, encodage et insertion: pas de matérialisation du corpus
+    assert max(lookahead) <= 80
+    meta = json.loads((tmp_path / 'embedding_meta.json').read_text(encoding='utf-8'))
+    assert meta['doc_count'] == 300 and meta['chunk_count'] == 300
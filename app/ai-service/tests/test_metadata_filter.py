@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from core.config import settings
+from rag.ann import convert_vectorstore
+from rag.hybrid import BM25Index, hybrid_ranked
+from rag.metadata_filter import MetadataIndex, metadata_index_for, parse_filter, register, request_filter
+
+try:
+    from langchain_community.vectorstores import FAISS
+except Exception:
+    from langchain.vectorstores import FAISS
+
+
+@pytest.fixture
+def vectordb(fake_embeddings, make_store):
+    # 1 chunk csv sur 20: un post-filtrage sur les k plus proches n'en garderait presque jamais
+    texts, metas = [], []
+    for i in range(400):
+        kind = 'csv' if i % 20 == 0 else 'pdf'
+        texts.append(f"chunk {i} emballage transport {kind}")
+        metas.append({'type': kind, 'source': f"data/raw/{kind}/doc{i % 3}.{kind}",
+                      'synthetic': i % 40 == 0, 'product_id': 'Sardine' if i % 40 == 0 else None})
+    return make_store(fake_embeddings('seeded', dim=16), texts, metas)
+
+
+def test_parse_filter():
+    assert parse_filter("csv, type=PDF|html,synthetic=oui,source=data/raw/x.csv") == {
+        'type': ['csv', 'pdf', 'html'], 'synthetic': ['true'], 'source': ['x.csv']}
+    assert request_filter("csv", "product_id=Sardine") == {'type': ['csv'], 'product_id': ['sardine']}
+    with pytest.raises(ValueError):
+        parse_filter("color=red")
+
+
+@pytest.mark.parametrize("kind", ['flat', 'hnsw', 'ivf', 'sq8'])
+def test_filter_returns_full_k_of_requested_type(kind, vectordb):
+    if kind != 'flat':
+        convert_vectorstore(vectordb, {'type': kind})
+    ranked = hybrid_ranked("transport", 8, vectordb, where={'type': ['csv']})
+    assert len(ranked) == 8
+    assert all(doc.metadata['type'] == 'csv' for doc, _s, _d in ranked)
+
+    both = hybrid_ranked("transport", 5, vectordb, where={'type': ['csv'], 'synthetic': ['true']})
+    assert len(both) == 5
+    assert all(doc.metadata['synthetic'] and doc.metadata['product_id'] == 'Sardine' for doc, _s, _d in both)
+    assert hybrid_ranked("transport", 5, vectordb, where={'product_id': ['thon']}) == []
+
+
+def test_sparse_side_masked_and_persisted_index(tmp_path, vectordb):
+    sparse = BM25Index.from_vectorstore(vectordb)
+    meta_index = MetadataIndex.from_vectorstore(vectordb)
+    meta_index.save(str(tmp_path))
+    loaded = MetadataIndex.load(str(tmp_path))
+    register(vectordb, loaded)
+    assert metadata_index_for(vectordb) is loaded
+    assert loaded.counts()['source'] == meta_index.counts()['source']
+
+    # "chunk 7" n'existe qu'en pdf: le BM25 filtré ne le remonte pas
+    ranked = hybrid_ranked("chunk 7 emballage", 10, vectordb, sparse, where={'source': ['doc1.csv']})
+    assert len(ranked) == loaded.counts()['source']['doc1.csv'] < 10
+    assert all(doc.metadata['source'].endswith('doc1.csv') for doc, _s, _d in ranked)
+
+
+def test_ask_answers_from_filtered_documents(monkeypatch, vectordb):
+    from fastapi.testclient import TestClient
+    from langchain_core.language_models.fake import FakeListLLM
+    from app import app
+    from routes import ask as ask_route
+    from rag.vectorstore_manager import VectorStoreManager
+
+    class FakeLLM(FakeListLLM):
+        model: str = 'fake'
+
+    vsm = VectorStoreManager()
+    for attr, value in (('_vectordb', vectordb), ('_sparse', None), ('_index_dir', None), ('_version', None),
+                        ('_initialized', True), ('_extra', {})):
+        monkeypatch.setattr(vsm, attr, value)
+    monkeypatch.setattr(settings, 'FEDERATED_INDEXES', 'main_index')
+    monkeypatch.setattr(ask_route, 'get_llm', lambda: FakeLLM(responses=["Réponse test"]))
+    monkeypatch.setattr(ask_route, 'cached_answer', lambda q, version, fn, embed_fn=None, store=True: (fn(), None))
+    # Une seconde recherche (non filtrée) ferait échouer le test
+    monkeypatch.setattr(FAISS, 'as_retriever', lambda *a, **kw: pytest.fail("recherche non filtrée"))
+
+    r = TestClient(app).post('/api/ask', params={'question': 'transport emballage', 'filter': 'type=csv', 'top_n': 4})
+    assert r.status_code == 200
+    data = r.json()
+    assert data['answer'] == "Réponse test"
+    assert len(data['source_documents']) == 4
+    assert all(d['metadata']['type'] == 'csv' for d in data['source_documents'])
@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.getcwd())
+
+from rag.model_registry import EmbeddingModelRegistry
+
+
+class FakeModel:
+    instances = 0
+
+    def __init__(self, model_name=None, model_kwargs=None):
+        FakeModel.instances += 1
+        self.model_name = model_name
+        self.device = (model_kwargs or {}).get('device')
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def test_registry_loads_each_model_once_and_shares_it():
+    FakeModel.instances = 0
+    registry = EmbeddingModelRegistry()
+    handles = []
+
+    def _get():
+        handles.append(registry.get('m1', loader=FakeModel))
+
+    threads = [threading.Thread(target=_get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert FakeModel.instances == 1
+    assert handles[0].embed_query('abc') == [3.0, 1.0]
+    assert handles[0].device == 'cpu'
+
+    registry.get('m2', loader=FakeModel)
+    assert FakeModel.instances == 2
+    stats = {s['model']: s for s in registry.stats()}
+    assert stats['m1']['loaded'] and stats['m1']['loads'] == 1 and stats['m1']['uses'] >= 8
+
+
+def test_registry_unloads_idle_models_and_reloads_on_demand():
+    FakeModel.instances = 0
+    registry = EmbeddingModelRegistry()
+    handle = registry.get('m1', loader=FakeModel)
+    assert registry.unload_idle(idle_seconds=3600) == []
+    assert registry.unload_idle(idle_seconds=1e-9) == ['m1']
+    assert not registry.stats()[0]['loaded']
+
+    # Le handle existant recharge le modèle à la demande
+    assert handle.embed_documents(['ab']) == [[2.0, 1.0]]
+    assert FakeModel.instances == 2 and registry.stats()[0]['loads'] == 2
+    assert registry.unload('m1') == 1
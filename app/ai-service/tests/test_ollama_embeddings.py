@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from core.config import settings
+from rag.model_registry import check_index_meta
+from rag.ollama_embeddings import OllamaBatchEmbeddings
+
+
+def _vec(text):
+    return [float(len(text)), float(text.count('a')), 1.0]
+
+
+class _FakeOllama(BaseHTTPRequestHandler):
+    """Stand-in Ollama: /api/embed (batch) et /api/embeddings (legacy)."""
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        st = self.server.state
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with st['lock']:
+            st['requests'].append((self.path, body))
+            st['ports'].add(self.client_address[1])
+            st['inflight'] += 1
+            st['max_inflight'] = max(st['max_inflight'], st['inflight'])
+        time.sleep(0.02)
+        if self.path == '/api/embed' and not st['legacy']:
+            payload = {"model": body['model'], "embeddings": [_vec(t) for t in body['input']]}
+            code = 200
+        elif self.path == '/api/embeddings':
+            payload, code = {"embedding": _vec(body['prompt'])}, 200
+        else:
+            payload, code = {"error": "not found"}, 404
+        data = json.dumps(payload).encode()
+        with st['lock']:
+            st['inflight'] -= 1
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def ollama_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeOllama)
+    server.state = {"lock": threading.Lock(), "requests": [], "ports": set(), "inflight": 0,
+                    "max_inflight": 0, "legacy": False}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", server.state
+    server.shutdown()
+
+
+def test_batches_inputs_with_bounded_concurrency(ollama_server):
+    url, state = ollama_server
+    emb = OllamaBatchEmbeddings('nomic-embed-text', base_url=url, batch_size=10, concurrency=2)
+    texts = [f"produit {i} {'a' * (i % 5)}" for i in range(45)]
+    assert emb.embed_documents(texts) == [_vec(t) for t in texts]
+    # 45 textes / 10 par requête -> 5 requêtes, jamais plus de 2 simultanées
+    assert [p for p, _ in state['requests']] == ['/api/embed'] * 5
+    assert all(b['model'] == 'nomic-embed-text' for _, b in state['requests'])
+    assert state['max_inflight'] <= 2
+    # Connexions keep-alive réutilisées (pool borné par la concurrence)
+    assert len(state['ports']) <= 2
+    assert emb.embed_query("banane") == _vec("banane")
+
+
+def test_falls_back_to_legacy_endpoint(ollama_server):
+    url, state = ollama_server
+    state['legacy'] = True
+    emb = OllamaBatchEmbeddings('nomic-embed-text', base_url=url, batch_size=10, concurrency=1)
+    assert emb.embed_documents(["a", "bb"]) == [_vec("a"), _vec("bb")]
+    assert [p for p, _ in state['requests']] == ['/api/embed', '/api/embeddings', '/api/embeddings']
+
+
+def test_index_meta_provider_mismatch_refuses_load(monkeypatch):
+    monkeypatch.setattr(settings, 'USE_OLLAMA_EMBEDDINGS', False)
+    monkeypatch.setattr(settings, 'EMBEDDING_BACKEND', 'torch', raising=False)
+    with pytest.raises(ValueError):
+        check_index_meta({"embedding_provider": "ollama", "embedding_model": "nomic-embed-text"})
+    # torch / onnx: même espace vectoriel, simple avertissement
+    assert check_index_meta({"embedding_provider": "onnx", "embedding_model": settings.EMBEDDING_MODEL})
+
+    monkeypatch.setattr(settings, 'USE_OLLAMA_EMBEDDINGS', True)
+    with pytest.raises(ValueError):
+        check_index_meta({"embedding_model": settings.EMBEDDING_MODEL})  # ancien index (torch)
+    assert check_index_meta({"embedding_provider": "ollama",
+                             "embedding_model": settings.OLLAMA_EMBEDDING_MODEL}) == []
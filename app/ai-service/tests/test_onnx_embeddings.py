@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from rag.onnx_embeddings import benchmark_qps, parity_report, pool_embeddings
+
+
+class VecEmbeddings:
+    def __init__(self, noise=0.0):
+        self.noise = noise
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts):
+        out = []
+        for t in texts:
+            v = np.array([len(t), t.count('a') + 1, sum(map(ord, t)) % 13 + 1], dtype=np.float32)
+            out.append((v + self.noise * np.arange(1, 4)).tolist())
+        return out
+
+
+def test_mean_pooling_ignores_padding_and_normalizes():
+    hidden = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert pool_embeddings(hidden, mask).tolist() == [[2.0, 3.0]]
+    assert pool_embeddings(hidden, mask, mode='cls').tolist() == [[1.0, 2.0]]
+    assert pool_embeddings(hidden, mask, mode='max').tolist() == [[3.0, 4.0]]
+    normed = pool_embeddings(hidden, mask, normalize=True)
+    assert abs(float(np.linalg.norm(normed[0])) - 1.0) < 1e-6
+
+
+def test_parity_report_thresholds_cosine():
+    texts = ["pizza surgelée", "sardines", "yaourt nature"]
+    same = parity_report(VecEmbeddings(), VecEmbeddings(), texts, threshold=0.99)
+    assert same['ok'] and same['min_cosine'] >= 0.9999 and same['n'] == 3
+    off = parity_report(VecEmbeddings(), VecEmbeddings(noise=50.0), texts, threshold=0.99)
+    assert not off['ok'] and off['worst_text'] in texts
+
+
+def test_benchmark_reports_queries_per_second():
+    row = benchmark_qps(VecEmbeddings(), ["a", "b", "c"] * 10)
+    assert row['queries'] == 30 and row['qps'] > 0
@@ -5,6 +5,8 @@ import pytest
 sys.path.append(os.getcwd())
 
 from core.config import settings
+from rag.index_store import load_vectorstore
+from rag.index_versions import active_index_dir
 
 try:
     from langchain_community.vectorstores import FAISS
@@ -23,11 +25,11 @@ except Exception:
 @pytest.mark.integration
 def test_opendata_agribalyse_presence():
     """Load the persisted main_index and query for Agribalyse content; expect agribalyse CSV source in results."""
-    persist_path = os.path.join(settings.FAISS_DIR, 'main_index', 'faiss_index')
+    persist_path = os.path.join(active_index_dir(), 'faiss_index')
     assert os.path.isdir(persist_path), f"Index not found at {persist_path}"
     assert HuggingFaceEmbeddings is not None, "HuggingFaceEmbeddings not available in environment"
     emb = HuggingFaceEmbeddings(model_name=getattr(settings, 'EMBEDDING_MODEL'))
-    vs = FAISS.load_local(persist_path, emb, allow_dangerous_deserialization=True)
+    vs = load_vectorstore(persist_path, emb)
 
     query = 'tableau des ingrédients agribalyse'
     results = vs.similarity_search_with_score(query, k=5)
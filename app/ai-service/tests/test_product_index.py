@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from rag.product_index import ProductIndex, lookup_product, product_index_for, register
+
+NAMES = {
+    'sardines_huile_olive': "Sardines entières à l’huile d’olive vierge extra",
+    'proteine_vegetale_poudre': "Poudre protéine végétale mix pois / riz",
+    'omega3_vegetal_capsules': "Capsules Oméga-3 algues DHA/EPA",
+}
+
+
+def _corpus():
+    texts, metas = [], []
+    for pid in NAMES:
+        for part in range(3):
+            texts.append(f"Profil {pid} partie {part}")
+            metas.append({'type': 'text', 'synthetic': True, 'product_id': pid})
+    texts.append("Rapport ADEME emballages")
+    metas.append({'type': 'pdf'})
+    return texts, metas
+
+
+def test_resolve_exact_tokens_and_trigrams(fake_embeddings, make_store):
+    idx = ProductIndex.from_vectorstore(make_store(fake_embeddings('length'), *_corpus()), names=NAMES)
+    assert len(idx) == 3 and len(idx.products['sardines_huile_olive']['chunk_ids']) == 3
+    assert idx.resolve("sardines_huile_olive bio").method == 'exact'
+    assert idx.resolve("Boîte de sardines à l'huile").product_id == 'sardines_huile_olive'
+    assert idx.resolve("capsule omega3 d'algue").product_id == 'omega3_vegetal_capsules'
+    # Trigrammes: faute de frappe sur un jeton distinctif
+    assert idx.resolve("proteinne en poudre").product_id == 'proteine_vegetale_poudre'
+    # Jeton partagé par deux produits: insuffisant seul
+    shared = ProductIndex({'a_poudre': {'name': 'Poudre cacao', 'chunk_ids': ['1']},
+                           'b_poudre': {'name': 'Poudre lait', 'chunk_ids': ['2']},
+                           'c': {'name': 'Thon', 'chunk_ids': ['3']}})
+    assert shared.resolve("une poudre") is None
+    assert shared.resolve("poudre de cacao").product_id == 'a_poudre'
+    assert idx.resolve("lait demi-écrémé") is None
+    # Identifiant inclus dans un autre: la clé la plus longue l'emporte, quel que soit l'ordre d'insertion
+    nested = ProductIndex({'yaourt': {'name': 'Yaourt nature', 'chunk_ids': ['1']},
+                           'yaourt_soja': {'name': 'Yaourt au soja', 'chunk_ids': ['2']}})
+    assert nested.resolve("un yaourt soja bio").product_id == 'yaourt_soja'
+    assert nested.resolve("un yaourt soja bio").method == 'exact'
+    assert nested.resolve("un yaourt bio").product_id == 'yaourt'
+
+
+def test_lookup_reads_chunks_without_search(tmp_path, fake_embeddings, make_store):
+    emb = fake_embeddings('length')
+    vectordb = make_store(emb, *_corpus())
+    ProductIndex.from_vectorstore(vectordb, names=NAMES).save(str(tmp_path))
+    loaded = ProductIndex.load(str(tmp_path))
+    register(vectordb, loaded)
+    assert product_index_for(vectordb) is loaded
+
+    emb.queries.clear()
+    match, docs = lookup_product("sardines en conserve", [vectordb])
+    assert match.product_id == 'sardines_huile_olive'
+    assert [d.page_content for d in docs] == [f"Profil sardines_huile_olive partie {i}" for i in range(3)]
+    assert emb.queries == []
+    assert lookup_product("yaourt nature", [vectordb]) == (None, [])
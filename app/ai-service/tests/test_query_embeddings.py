@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from rag.embeddings import CachedQueryEmbeddings, with_query_cache
+
+try:
+    from langchain.schema import Document
+except Exception:
+    from langchain.docstore.document import Document
+
+
+def test_query_vectors_are_memoized_across_wrappers(fake_embeddings):
+    base = fake_embeddings('length')
+    a = with_query_cache(base)
+    b = CachedQueryEmbeddings(base)  # ex: instance du rerank
+    assert with_query_cache(a) is a
+    v1 = a.embed_query('sardines à l\'huile')
+    v2 = b.embed_query('  sardines   à l\'huile ')
+    assert v1 == v2
+    assert base.queries == ['sardines à l\'huile']
+
+
+def test_faiss_search_and_retriever_share_one_encoding(fake_embeddings, make_store):
+    base = fake_embeddings('length')
+    docs = [Document(page_content=t, metadata={'source': t}) for t in ('aa', 'bbbb', 'cacao avoine')]
+    db = make_store(with_query_cache(base), docs)
+    db.similarity_search_with_score('barre avoine', k=2)
+    db.as_retriever(search_kwargs={'k': 2}).invoke('barre avoine')
+    db.embedding_function.embed_query('barre avoine')
+    assert base.queries == ['barre avoine']
@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import rag.rerank as rerank_module
+from core.config import settings
+
+try:
+    from langchain.schema import Document
+except Exception:
+    from langchain.docstore.document import Document
+
+
+def _docs():
+    return [
+        Document(page_content='Pizza en carton recyclé', metadata={'source': 'a.pdf', 'type': 'pdf'}),
+        Document(page_content='Sardines à l\'huile: pêche et conserve', metadata={'source': 'b.csv', 'type': 'csv'}),
+        Document(page_content='Sardines profil synthétique', metadata={'source': 'sardines_huile_olive.txt', 'type': 'text',
+                                                                         'synthetic': True, 'product_id': 'sardines_huile_olive'}),
+    ]
+
+
+def test_rerank_reuses_index_vectors(monkeypatch, fake_embeddings, make_store):
+    emb = fake_embeddings()
+    db = make_store(emb, _docs())
+    monkeypatch.setattr(rerank_module, '_get_embeddings', lambda: emb)
+    candidates = [d for d, _ in db.similarity_search_with_score('sardines huile', k=3)]
+    calls_before = len(emb.documents)
+    top, scored = rerank_module.rerank_documents('sardines huile', candidates, top_n=2, vectordb=db)
+    assert len(emb.documents) == calls_before  # aucun ré-encodage des chunks
+    assert len(top) == 2
+    assert all('Sardines' in d.page_content for d in top)
+
+
+def test_rerank_synthetic_boost_and_fallback_embedding(monkeypatch, fake_embeddings, make_store):
+    emb = fake_embeddings()
+    db = make_store(emb, _docs())
+    monkeypatch.setattr(rerank_module, '_get_embeddings', lambda: emb)
+    monkeypatch.setattr(settings, 'RERANK_SYNTHETIC_BOOST', 1.0, raising=False)
+    candidates = [d for d, _ in db.similarity_search_with_score('sardines', k=3)]
+    outsider = Document(page_content='Barre avoine', metadata={'source': 'x', 'type': 'html'})
+    calls_before = len(emb.documents)
+    top, _ = rerank_module.rerank_documents('sardines', candidates + [outsider], top_n=1, vectordb=db,
+                                            product_id='sardineshuileolive')
+    assert len(emb.documents) == calls_before + 1  # seul le doc hors index est encodé
+    assert top[0].metadata.get('synthetic') is True
@@ -0,0 +1,57 @@
+import os
+import sys
+import random
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from core.scoring import batched_cosine, norm_tokens, overlap_ratio, source_token_hashes, top_k
+from rag.rerank import _cosine
+
+
+def test_batched_cosine_matches_scalar_reference():
+    rng = random.Random(0)
+    q = [rng.uniform(-1, 1) for _ in range(384)]
+    docs = [[rng.uniform(-1, 1) for _ in range(384)] for _ in range(20)] + [[0.0] * 384]
+    vec = batched_cosine(q, docs)
+    ref = [_cosine(q, d) for d in docs]
+    assert np.allclose(vec, ref, atol=1e-5)
+    assert vec[-1] == 0.0
+
+
+def test_top_k_orders_descending():
+    scores = np.array([0.1, 0.9, 0.3, 0.9, 0.5])
+    assert list(top_k(scores, 3)) == [1, 3, 4]
+    assert list(top_k(scores, 10)) == [1, 3, 4, 2, 0]
+    assert top_k(scores, 0).size == 0
+
+
+def test_overlap_ratio_matches_set_implementation():
+    answer = "Les sardines à l'huile d'olive ont une empreinte carbone modérée".lower().split()
+    sources = ["empreinte carbone des sardines en conserve", "huile d'olive vierge"]
+    expected_common = set(answer) & set(" ".join(sources).split())
+    expected = round(len(expected_common) / len(set(answer)), 4)
+    assert overlap_ratio(answer, [source_token_hashes(s) for s in sources]) == expected
+    assert overlap_ratio([], [source_token_hashes("a")]) == 0.0
+    # normalisation: accents, ponctuation interne, longueur min
+    assert norm_tokens("Émballage l'huile, de", min_len=3, stop={"de"}) == ["emballage", "lhuile"]
+
+
+def test_vectorized_scoring_matches_python_references():
+    """Same inputs as rag/scripts/scoring_benchmark.py (timings are reported there, not asserted)."""
+    rng = np.random.default_rng(0)
+    q = rng.standard_normal(384).astype(np.float32)
+    mat = rng.standard_normal((200, 384)).astype(np.float32)
+    ref = [_cosine(q.tolist(), row) for row in mat.tolist()]
+    assert np.allclose(batched_cosine(q, mat), ref, atol=1e-4)
+
+    words = [f"mot{i}" for i in range(3000)]
+    src = [" ".join(random.Random(i).choices(words, k=2000)) for i in range(10)]
+    ans = " ".join(random.Random(99).choices(words, k=150))
+    a_set = set(ans.split())
+    s_set = set(" ".join(src).split())
+    ref_ratio = round(len(a_set & s_set) / len(a_set), 4)
+    # Premier appel (tokenisation + hash) puis appel servi par le cache des chunks
+    assert overlap_ratio(ans.split(), [source_token_hashes(s) for s in src]) == ref_ratio
+    assert overlap_ratio(ans.split(), [source_token_hashes(s) for s in src]) == ref_ratio